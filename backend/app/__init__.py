@@ -1,13 +1,14 @@
-from flask import Flask
+from flask import Flask, request, make_response
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 import redis
 from config import config
+from app.utils.db_routing import RoutingSession
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 jwt = JWTManager()
 redis_client = None
@@ -19,8 +20,26 @@ def create_app(config_name='default'):
     # Load configuration
     app.config.from_object(config[config_name])
     
+    # Pool settings for the primary and each replica (SQLite keeps the defaults)
+    from app.utils.pools import engine_options, get_pool_stats, instrument_engine, redis_pool
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **engine_options(app.config, app.config['SQLALCHEMY_DATABASE_URI']),
+        **(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    }
+    
+    # Read replicas are extra binds that RoutingSession uses for @read_only views
+    from app.utils.db_routing import replica_binds
+    app.config['SQLALCHEMY_BINDS'] = {
+        **(app.config.get('SQLALCHEMY_BINDS') or {}),
+        **{key: {'url': url, **engine_options(app.config, url)}
+           for key, url in replica_binds(app.config.get('DATABASE_REPLICA_URLS', [])).items()}
+    }
+    
     # Initialize extensions with app
     db.init_app(app)
+    with app.app_context():
+        for key, engine in db.engines.items():
+            instrument_engine(engine, key or 'primary')
     migrate.init_app(app, db)
     jwt.init_app(app)
     
@@ -32,8 +51,8 @@ def create_app(config_name='default'):
          resources={r"/api/*": {
              "origins": ["http://localhost:3000"],
              "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-             "allow_headers": ["Content-Type", "Authorization", "Accept"],
-             "expose_headers": ["Content-Type", "Authorization"],
+             "allow_headers": ["Content-Type", "Authorization", "Accept", "Idempotency-Key"],
+             "expose_headers": ["Content-Type", "Authorization", "Idempotent-Replayed"],
              "max_age": 3600
          }})
     
@@ -44,14 +63,25 @@ def create_app(config_name='default'):
             response = make_response()
             response.status_code = 200
         response.headers.add('Access-Control-Allow-Origin', 'http://localhost:3000')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,Accept')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,Accept,Idempotency-Key')
         response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
         response.headers.add('Access-Control-Allow-Credentials', 'true')
         return response
     
-    # Initialize Redis
+    # Initialize Redis and the cache backend
     global redis_client
-    redis_client = redis.from_url(app.config['REDIS_URL'])
+    redis_client = redis.Redis(connection_pool=redis_pool(app.config))
+    
+    from app.utils.cache_backends import create_cache_backend
+    app.extensions['cache_backend'] = create_cache_backend(app.config, redis_client)
+    
+    # Reject logged-out tokens and tokens of users whose tokens were all revoked
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(jwt_header, jwt_payload):
+        from app.utils.redis_helper import RedisHelper
+        redis_helper = RedisHelper()
+        return redis_helper.is_token_blacklisted(jwt_payload['jti']) or \
+            redis_helper.are_user_tokens_revoked(jwt_payload['sub'], jwt_payload['iat'])
     
     # Register blueprints
     from app.routes.auth import auth_bp
@@ -66,9 +96,75 @@ def create_app(config_name='default'):
     from app.utils.error_handlers import register_error_handlers
     register_error_handlers(app)
     
+    # Register CLI commands
+    from app.commands import register_commands
+    register_commands(app)
+    
+    # Background tasks run per worker process and are started on first request
+    from app.utils.background import PeriodicTask
+    app.extensions['background_tasks'] = {}
+    
+    from app.services.history_writer import HistoryWriter
+    history_writer = HistoryWriter(app)
+    app.extensions['history_writer'] = history_writer
+    app.extensions['background_tasks']['history_writer'] = history_writer.task
+    
+    from app.services.autocomplete import Autocomplete
+    autocomplete = Autocomplete(app)
+    app.extensions['autocomplete'] = autocomplete
+    app.extensions['background_tasks']['autocomplete'] = autocomplete.task
+    
+    from app.services.trending import TrendingTracker
+    app.extensions['background_tasks']['trending_trim'] = PeriodicTask(
+        app, 'trending-trim', app.config.get('TRENDING_TRIM_INTERVAL', 60), TrendingTracker.run_scheduled
+    )
+    
+    from app.services.password_hasher import PasswordHasher
+    app.extensions['password_hasher'] = PasswordHasher(app)
+    
+    from app.services.google_verifier import GoogleTokenVerifier
+    google_verifier = GoogleTokenVerifier(app)
+    app.extensions['google_verifier'] = google_verifier
+    app.extensions['background_tasks']['google_certs'] = google_verifier.task
+    
+    from app.services.account_deletion import AccountDeletion
+    app.extensions['background_tasks']['account_purge'] = PeriodicTask(
+        app, 'account-purge', app.config.get('ACCOUNT_PURGE_INTERVAL', 60), AccountDeletion.run_scheduled
+    )
+    
+    from app.services.history_partitions import HistoryPartitionManager
+    app.extensions['background_tasks']['history_partitions'] = PeriodicTask(
+        app, 'history-partitions', app.config.get('HISTORY_PARTITION_INTERVAL', 3600),
+        HistoryPartitionManager.run_scheduled
+    )
+    
+    from app.utils.db_routing import ReplicaRouter, record_user_write
+    replica_router = ReplicaRouter(app)
+    app.extensions['replica_router'] = replica_router
+    if replica_router.binds:
+        app.extensions['background_tasks']['replica_lag'] = replica_router.task
+    app.after_request(record_user_write)
+    
+    if app.config.get('CACHE_WARMUP_INTERVAL'):
+        from app.services.cache_warmer import CacheWarmer
+        app.extensions['background_tasks']['cache_warmup'] = PeriodicTask(
+            app, 'cache-warmup', app.config['CACHE_WARMUP_INTERVAL'], CacheWarmer.run_scheduled
+        )
+    
+    @app.before_request
+    def start_background_tasks():
+        for task in app.extensions['background_tasks'].values():
+            task.ensure_started()
+    
     # Health check endpoint
     @app.route('/api/health')
     def health_check():
         return {'status': 'healthy', 'message': 'Sankat Mochan API is running'}
     
-    return app 
\ No newline at end of file
+    # Connection pool metrics of the worker process serving the request
+    if app.config.get('POOL_STATS_ENABLED'):
+        @app.route('/api/health/pools')
+        def pool_stats():
+            return {'pools': get_pool_stats()}
+    
+    return app
@@ -0,0 +1,221 @@
+import signal
+import threading
+
+import click
+
+def register_commands(app):
+    """Register CLI commands for the Flask application."""
+    
+    @app.cli.command('warm-cache')
+    @click.option('--top-n', type=int, default=None, help='Number of top historical queries to warm.')
+    @click.option('--max-calls', type=int, default=None, help='Maximum number of LLM calls (spend budget).')
+    @click.option('--concurrency', type=int, default=None, help='Number of concurrent LLM calls.')
+    def warm_cache(top_n, max_calls, concurrency):
+        """Refresh cached results for suggestions and top queries."""
+        from app.services.cache_warmer import CacheWarmer
+        
+        warmer = CacheWarmer(top_n=top_n, max_calls=max_calls, concurrency=concurrency)
+        report = warmer.run()
+        
+        click.echo(
+            f"Considered {report['considered']} queries: {report['refreshed']} refreshed, "
+            f"{report['fresh']} fresh, {report['over_budget']} over budget, {report['failed']} failed"
+        )
+    
+    @app.cli.command('search-worker')
+    @click.option('--concurrency', type=int, default=None, help='Number of worker threads.')
+    def search_worker(concurrency):
+        """Run a worker pool consuming asynchronous search jobs."""
+        from app.services.search_jobs import SearchJobWorker
+        
+        concurrency = concurrency or app.config.get('SEARCH_WORKER_CONCURRENCY', 4)
+        stop_event = threading.Event()
+        
+        def handle_signal(signum, frame):
+            click.echo('Stopping search workers after in-flight jobs...')
+            stop_event.set()
+        
+        signal.signal(signal.SIGTERM, handle_signal)
+        signal.signal(signal.SIGINT, handle_signal)
+        
+        workers = []
+        for index in range(concurrency):
+            worker = SearchJobWorker(app, consumer_name=f"{SearchJobWorker.default_consumer_name()}-{index}")
+            thread = threading.Thread(target=worker.run, args=(stop_event,), daemon=True)
+            thread.start()
+            workers.append(thread)
+        
+        click.echo(f"Started {concurrency} search workers")
+        while any(thread.is_alive() for thread in workers):
+            for thread in workers:
+                thread.join(timeout=1)
+    
+    @app.cli.command('reconcile-user-counters')
+    @click.option('--batch-size', type=int, default=500, help='Users processed per transaction.')
+    def reconcile_user_counters(batch_size):
+        """Recompute denormalized user counters from search history."""
+        from app.services.user_counters import UserCounters
+        
+        corrected = UserCounters.reconcile(batch_size=batch_size)
+        click.echo(f"Corrected counters for {corrected} users")
+    
+    @app.cli.command('backfill-user-stats')
+    @click.option('--batch-size', type=int, default=200, help='Users processed per transaction.')
+    def backfill_user_stats(batch_size):
+        """Rebuild per-user statistics rollups from search history."""
+        from app.services.user_stats import UserStatsRollup
+        
+        processed = UserStatsRollup().backfill(batch_size=batch_size)
+        click.echo(f"Rebuilt statistics for {processed} users")
+    
+    @app.cli.command('purge-deleted-accounts')
+    def purge_deleted_accounts():
+        """Purge every account pending deletion now."""
+        from app.models.user import User
+        from app.services.account_deletion import AccountDeletion
+        from app import db
+        
+        deletion = AccountDeletion()
+        user_ids = [row.id for row in db.session.query(User.id).filter(User.deletion_requested_at.isnot(None))]
+        for user_id in user_ids:
+            click.echo(f"User {user_id}: deleted {deletion.purge(user_id)} history rows")
+        click.echo(f"Purged {len(user_ids)} accounts")
+    
+    @app.cli.command('manage-history-partitions')
+    @click.option('--archive/--no-archive', default=True, help='Archive partitions past HISTORY_RETENTION_MONTHS.')
+    def manage_history_partitions(archive):
+        """Create upcoming search_history partitions and archive expired ones."""
+        from app.services.history_partitions import HistoryPartitionManager
+        
+        manager = HistoryPartitionManager()
+        if not manager.is_partitioned():
+            click.echo('search_history is not a partitioned PostgreSQL table; nothing to do')
+            return
+        click.echo(f"Partitions ready: {', '.join(manager.ensure_partitions())}")
+        if archive:
+            for name, rows in manager.archive_expired().items():
+                click.echo(f"Archived {rows} rows from {name}")
+    
+    @app.cli.command('dedupe-result-blobs')
+    @click.option('--batch-size', type=int, default=500, help='History rows migrated per transaction.')
+    def dedupe_result_blobs(batch_size):
+        """Move inline search results into shared content-addressed blobs."""
+        from app.services.result_blobs import ResultBlobStore
+        
+        report = ResultBlobStore().migrate_inline(batch_size=batch_size)
+        click.echo(
+            f"Migrated {report['rows']} rows: {report['inline_bytes']} inline bytes stored as "
+            f"{report['blob_bytes_added']} blob bytes ({report['bytes_saved']} bytes saved)"
+        )
+    
+    @app.cli.command('benchmark-result-blobs')
+    @click.option('--rows', type=int, default=2000, help='Searches written per storage layout.')
+    @click.option('--distinct', type=int, default=100, help='Distinct result sets among them.')
+    @click.option('--reads', type=int, default=300, help='Requests timed per read kind and layout.')
+    def benchmark_result_blobs(rows, distinct, reads):
+        """Compare storage and read latency of inline results and shared result blobs."""
+        from app.utils.blob_benchmark import run_blob_benchmark
+        
+        report = run_blob_benchmark(app, rows=rows, distinct=distinct, reads=reads)
+        click.echo(f"{rows} searches over {distinct} distinct result sets, {reads} reads per kind")
+        click.echo(f"{'layout':>7} {'stored bytes':>13} {'write s':>8} {'detail p50/p95 ms':>18} "
+                   f"{'page p50/p95 ms':>16}")
+        for layout, stats in report.items():
+            click.echo(
+                f"{layout:>7} {stats['stored_bytes']:>13} {stats['write_seconds']:>8.2f} "
+                f"{stats['detail_p50_ms']:>9.1f}/{stats['detail_p95_ms']:<8.1f} "
+                f"{stats['page_p50_ms']:>7.1f}/{stats['page_p95_ms']:<8.1f}"
+            )
+    
+    @app.cli.command('gc-result-blobs')
+    @click.option('--recount', is_flag=True, help='Recompute refcounts from search history first.')
+    def gc_result_blobs(recount):
+        """Delete search result blobs no longer referenced by any history row."""
+        from app.services.result_blobs import ResultBlobStore
+        
+        store = ResultBlobStore()
+        if recount:
+            click.echo(f"Corrected refcounts of {store.recount()} blobs")
+        click.echo(f"Deleted {store.collect_garbage()} unreferenced blobs")
+    
+    @app.cli.command('compact-search-history')
+    @click.option('--batch-size', type=int, default=200, help='Users compacted per transaction.')
+    def compact_search_history(batch_size):
+        """Merge repeated searches into one history row each (for HISTORY_DEDUPE)."""
+        from app.services.history_dedupe import HistoryDeduper
+        from app.services.user_counters import UserCounters
+        from app.services.user_stats import UserStatsRollup
+        
+        report = HistoryDeduper().compact(batch_size=batch_size)
+        click.echo(
+            f"Compacted history of {report['users']} users: keyed {report['rows_keyed']} rows, "
+            f"removed {report['rows_removed']} duplicates"
+        )
+        if report['rows_removed']:
+            # Merged runs now count on their first run's day; recount rather than trust the deltas
+            click.echo(f"Corrected counters of {UserCounters.reconcile()} users")
+            click.echo(f"Rebuilt search stats of {UserStatsRollup().backfill()} users")
+    
+    @app.cli.command('import-profile')
+    @click.option('--config', 'config_name', default='testing', help='Configuration passed to create_app.')
+    @click.option('--top', type=int, default=15, help='Number of slowest top-level imports to list.')
+    @click.option('--budget-ms', type=float, default=None, help='Fail if startup takes longer (default IMPORT_TIME_BUDGET_MS).')
+    def import_profile(config_name, top, budget_ms):
+        """Profile importing the app and create_app (python -X importtime); exit 1 if over budget."""
+        from app.utils.import_profile import profile_imports
+        
+        budget_ms = budget_ms if budget_ms is not None else app.config.get('IMPORT_TIME_BUDGET_MS', 1000)
+        report = profile_imports(config_name)
+        
+        click.echo(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        top_level = [module for module in report['modules'] if module['depth'] == 0]
+        for module in sorted(top_level, key=lambda module: -module['cumulative_ms'])[:top]:
+            click.echo(f"{module['cumulative_ms']:>14.1f} {module['self_ms']:>9.1f}  {module['name']}")
+        click.echo(f"Imports and create_app: {report['total_ms']:.0f} ms (budget {budget_ms:.0f} ms)")
+        
+        failed = False
+        if report['eager_lazy_modules']:
+            click.echo(f"Lazily loaded modules imported at startup: {', '.join(report['eager_lazy_modules'])}")
+            failed = True
+        if report['total_ms'] > budget_ms:
+            click.echo('Over the import time budget')
+            failed = True
+        if failed:
+            raise SystemExit(1)
+    
+    @app.cli.command('benchmark-logins')
+    @click.option('--duration', type=float, default=10, help='Seconds of load per run.')
+    @click.option('--login-threads', type=int, default=4, help='Threads logging in.')
+    @click.option('--search-threads', type=int, default=8, help='Threads running cached searches.')
+    @click.option('--compare-inline/--no-compare-inline', default=True,
+                  help='Also run with hashing on the request threads (PASSWORD_HASH_WORKERS=0).')
+    def benchmark_logins(duration, login_threads, search_threads, compare_inline):
+        """Measure logins/s and search latency under mixed load, with and without the hashing pool."""
+        from app.utils.login_benchmark import run_login_benchmark
+        
+        runs = [None] + ([0] if compare_inline and app.config.get('PASSWORD_HASH_WORKERS', 2) else [])
+        click.echo(f"{login_threads} login and {search_threads} search threads, {duration:g} s per run")
+        click.echo(f"{'hash workers':>12} {'logins/s':>9} {'login p50/p95 ms':>17} {'searches/s':>11} "
+                   f"{'search p50/p95 ms':>18}  errors")
+        for workers in runs:
+            report = run_login_benchmark(app, duration=duration, login_threads=login_threads,
+                                         search_threads=search_threads, workers=workers)
+            latency = {
+                kind: f"{report[f'{kind}_p50_ms'] or 0:.0f}/{report[f'{kind}_p95_ms'] or 0:.0f}"
+                for kind in ('login', 'search')
+            }
+            click.echo(
+                f"{report['workers'] or 'inline':>12} {report['logins_per_second']:>9.1f} {latency['login']:>17} "
+                f"{report['searches_per_second']:>11.1f} {latency['search']:>18}  {report['errors'] or '-'}"
+            )
+        click.echo(f"PBKDF2 iterations: {report['iterations']}")
+    
+    @app.cli.command('build-autocomplete')
+    @click.option('--include-resources/--no-include-resources', default=False,
+                  help='Also index resource names from stored search results.')
+    def build_autocomplete(include_resources):
+        """Rebuild autocomplete popularity from search history."""
+        from app.services.autocomplete import get_autocomplete
+        
+        indexed = get_autocomplete().rebuild_from_history(include_resources=include_resources)
+        click.echo(f"Indexed {indexed} autocomplete terms")
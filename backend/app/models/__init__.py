@@ -2,5 +2,7 @@
 
 from .user import User
 from .search_history import SearchHistory
+from .user_search_stats import UserSearchStats
+from .search_result_blob import SearchResultBlob
 
-__all__ = ['User', 'SearchHistory'] 
\ No newline at end of file
+__all__ = ['User', 'SearchHistory', 'UserSearchStats', 'SearchResultBlob'] 
\ No newline at end of file
@@ -1,21 +1,48 @@
 from datetime import datetime
 import json
+import re
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
 from app import db
+from app.utils.pagination import decode_cursor, encode_cursor
+
+class search_document(FunctionElement):
+    """The indexed form of a query: a tsvector on PostgreSQL, lowercased text elsewhere."""
+    type = db.Text()
+    inherit_cache = True
+
+@compiles(search_document)
+def _compile_search_document(element, compiler, **kw):
+    return f"lower({compiler.process(element.clauses, **kw)})"
+
+@compiles(search_document, 'postgresql')
+def _compile_search_document_pg(element, compiler, **kw):
+    return f"to_tsvector('simple', {compiler.process(element.clauses, **kw)})"
 
 class SearchHistory(db.Model):
-    """Search history model to track user searches and results."""
+    """
+    Search history model to track user searches and results.
+    
+    The `query` column shadows Flask-SQLAlchemy's `Model.query`, so ORM
+    queries go through `db.session.query(SearchHistory)`.
+    """
     
     __tablename__ = 'search_history'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # Nullable for guest searches
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=True)  # Nullable for guest searches
     
     # Search parameters
     query = db.Column(db.Text, nullable=False)
     filters = db.Column(db.JSON, nullable=True)  # Store filters as JSON
     
-    # Search results (cached)
-    results = db.Column(db.JSON, nullable=True)  # Store results as JSON
+    # Search results, stored once per distinct content in search_result_blobs.
+    # Rows written before blobs existed keep them inline (deferred, so listings
+    # don't load the JSON) until `flask dedupe-result-blobs` moves them.
+    results_inline = db.deferred(db.Column('results', db.JSON(none_as_null=True), nullable=True))
+    results_hash = db.Column(db.String(64), db.ForeignKey('search_result_blobs.hash'), nullable=True, index=True)
+    result_blob = db.relationship('SearchResultBlob', lazy='select')
     result_count = db.Column(db.Integer, default=0)
     
     # Metadata
@@ -29,9 +56,44 @@ class SearchHistory(db.Model):
     # Favorites
     is_favorite = db.Column(db.Boolean, default=False)
     
+    # Repeated searches (HISTORY_DEDUPE): one row per (user, canonical query, filters)
+    dedupe_key = db.Column(db.String(64), nullable=True)
+    run_count = db.Column(db.Integer, default=1, nullable=False)
+    last_run_at = db.Column(db.DateTime, nullable=True)  # None means only run at created_at
+    
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
+    # Generated from query for ?q= history search (GIN-indexed on PostgreSQL)
+    search_vector = db.deferred(db.Column(
+        db.Text().with_variant(TSVECTOR(), 'postgresql'),
+        db.Computed(search_document(db.literal_column('query')), persisted=True)
+    ))
+    
+    # Most words of a ?q= search that are matched
+    MAX_SEARCH_TERMS = 8
+    
+    # Fields that can be requested with ?fields=, in serialization order
+    SERIALIZABLE_FIELDS = ('id', 'query', 'filters', 'results', 'result_count', 'search_type',
+                           'execution_time', 'is_favorite', 'run_count', 'last_run_at', 'created_at')
+    
+    __table_args__ = (
+        # Keyset pagination of a user's history, newest first
+        db.Index('ix_search_history_user_created', 'user_id', created_at.desc(), id.desc()),
+        db.Index('ix_search_history_user_favorites', 'user_id', created_at.desc(), id.desc(),
+                 postgresql_where=is_favorite.is_(True), sqlite_where=is_favorite.is_(True)),
+        # The same, ordered by when a search last ran (HISTORY_DEDUPE)
+        db.Index('ix_search_history_user_last_run', 'user_id',
+                 db.func.coalesce(last_run_at, created_at).desc(), id.desc()),
+        db.Index('ix_search_history_user_favorites_last_run', 'user_id',
+                 db.func.coalesce(last_run_at, created_at).desc(), id.desc(),
+                 postgresql_where=is_favorite.is_(True), sqlite_where=is_favorite.is_(True)),
+        db.Index('ux_search_history_dedupe', 'user_id', 'dedupe_key', unique=True,
+                 postgresql_where=dedupe_key.isnot(None), sqlite_where=dedupe_key.isnot(None)),
+        db.Index('ix_search_history_search_vector', search_vector,
+                 postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
+    
     def __init__(self, query, user_id=None, session_id=None, ip_address=None, 
                  filters=None, results=None):
         self.query = query
@@ -42,6 +104,18 @@ class SearchHistory(db.Model):
         self.results = results or []
         self.result_count = len(results) if results else 0
     
+    @property
+    def results(self):
+        """Search results, from the shared blob or the legacy inline column."""
+        if self.results_hash:
+            return self.result_blob.get_results()
+        return self.results_inline
+    
+    @results.setter
+    def results(self, value):
+        self.results_hash = None
+        self.results_inline = value
+    
     def set_results(self, results, execution_time=None):
         """Set search results and metadata."""
         self.results = results
@@ -51,36 +125,81 @@ class SearchHistory(db.Model):
     
     def add_to_favorites(self):
         """Mark search as favorite."""
+        if not self.is_favorite:
+            self._adjust_favorites_count(1)
         self.is_favorite = True
         db.session.commit()
     
     def remove_from_favorites(self):
         """Remove search from favorites."""
+        if self.is_favorite:
+            self._adjust_favorites_count(-1)
         self.is_favorite = False
         db.session.commit()
     
-    def to_dict(self, include_results=True):
-        """Convert search history object to dictionary."""
-        data = {
-            'id': self.id,
-            'query': self.query,
-            'filters': self.filters,
-            'result_count': self.result_count,
-            'search_type': self.search_type,
-            'execution_time': self.execution_time,
-            'is_favorite': self.is_favorite,
-            'created_at': self.created_at.isoformat()
-        }
+    def _adjust_favorites_count(self, delta):
+        """Keep the owner's denormalized favorites count in step."""
+        from app.services.user_counters import UserCounters
+        UserCounters.adjust(self.user_id, favorites=delta)
+    
+    def to_dict(self, include_results=True, fields=None):
+        """
+        Convert search history object to dictionary.
         
-        if include_results:
-            data['results'] = self.results
+        Args:
+            include_results: Include the results JSON (ignored when fields is given)
+            fields: Names from SERIALIZABLE_FIELDS to include (default: all)
+        """
+        if fields is None:
+            fields = [name for name in self.SERIALIZABLE_FIELDS if include_results or name != 'results']
         
+        data = {}
+        for name in fields:
+            value = getattr(self, name)
+            data[name] = value.isoformat() if isinstance(value, datetime) else value
         return data
     
+    @classmethod
+    def parse_fields(cls, value, default):
+        """
+        Parse a comma-separated ?fields= projection.
+        
+        Args:
+            value: Raw parameter value (None or empty for the default)
+            default: Fields to use when no projection is requested
+        
+        Returns:
+            list: Field names in serialization order
+        
+        Raises:
+            ValueError: If an unknown field is requested
+        """
+        if not value:
+            return list(default)
+        requested = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = requested - set(cls.SERIALIZABLE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        return [name for name in cls.SERIALIZABLE_FIELDS if name in requested]
+    
+    @classmethod
+    def load_fields(cls, fields):
+        """Loader options selecting only the columns behind `fields` (plus the keyset columns)."""
+        columns = [cls.id, cls.created_at, cls.last_run_at]
+        options = []
+        for name in fields:
+            if name == 'results':
+                columns += [cls.results_inline, cls.results_hash]
+                options.append(db.selectinload(cls.result_blob))
+            elif name not in ('id', 'created_at', 'last_run_at'):
+                columns.append(getattr(cls, name))
+        return [db.load_only(*columns)] + options
+    
     @classmethod
     def get_user_search_count(cls, user_id=None, session_id=None):
         """Get search count for user or session."""
-        query = cls.query
+        # Deduplicated rows stand for run_count searches
+        query = db.session.query(db.func.coalesce(db.func.sum(cls.run_count), 0))
         
         if user_id:
             query = query.filter_by(user_id=user_id)
@@ -89,22 +208,108 @@ class SearchHistory(db.Model):
         else:
             return 0
         
-        return query.count()
+        return query.scalar()
     
     @classmethod
     def get_recent_searches(cls, user_id, limit=10):
         """Get recent searches for a user."""
-        return cls.query.filter_by(user_id=user_id)\
+        return db.session.query(cls).filter_by(user_id=user_id)\
                        .order_by(cls.created_at.desc())\
                        .limit(limit)\
                        .all()
     
+    @classmethod
+    def search_terms(cls, text):
+        """Split a ?q= search into lowercase words (at most MAX_SEARCH_TERMS)."""
+        return re.findall(r'[^\W_]+', (text or '').lower())[:cls.MAX_SEARCH_TERMS]
+    
+    @classmethod
+    def text_search_filter(cls, text, fuzzy=False):
+        """
+        Criterion matching searches whose query contains every word of `text`.
+        
+        On PostgreSQL each word is a prefix match against the GIN-indexed
+        tsvector; with `fuzzy`, queries within pg_trgm's word similarity
+        threshold also match, so typos still find the search. Other databases
+        fall back to substring LIKEs on the lowercased query.
+        
+        Raises:
+            ValueError: If `text` contains no words
+        """
+        terms = cls.search_terms(text)
+        if not terms:
+            raise ValueError('q must contain at least one word')
+        
+        if db.session.get_bind().dialect.name == 'postgresql':
+            tsquery = db.func.to_tsquery('simple', ' & '.join(f"{term}:*" for term in terms))
+            criterion = cls.search_vector.op('@@')(tsquery)
+            if fuzzy:
+                criterion = db.or_(criterion, db.literal(' '.join(terms)).op('<%')(cls.query))
+            return criterion
+        return db.and_(*(cls.search_vector.like(f"%{term}%") for term in terms))
+    
+    @classmethod
+    def order_key(cls, by_last_run=False):
+        """
+        The timestamp history listings are ordered by (then id).
+        
+        With HISTORY_DEDUPE a repeat keeps its row's created_at, so listings
+        order by when a search last ran to bring repeated searches back to the
+        top.
+        """
+        return db.func.coalesce(cls.last_run_at, cls.created_at) if by_last_run else cls.created_at
+    
+    def position(self, by_last_run=False):
+        """This row's (timestamp, id) position in the `order_key` order."""
+        return (self.last_run_at or self.created_at) if by_last_run else self.created_at, self.id
+    
+    @classmethod
+    def keyset_page(cls, user_id, limit, cursor=None, favorites_only=False, fields=None, search=None,
+                    fuzzy=False, by_last_run=False):
+        """
+        Get one page of a user's searches, newest first, using keyset pagination.
+        
+        Args:
+            user_id: Owner of the searches
+            limit: Page size
+            cursor: Opaque cursor from the previous page (None for the first page)
+            favorites_only: Only return favorite searches
+            fields: Only load the columns behind these fields
+            search: Only return searches matching this text (see `text_search_filter`)
+            fuzzy: Also match similar queries when searching
+            by_last_run: Order by when searches last ran rather than first ran (see `order_key`)
+        
+        Returns:
+            tuple: (searches, next_cursor) where next_cursor is None on the last page
+        
+        Raises:
+            ValueError: If the cursor or search is malformed
+        """
+        order_key = cls.order_key(by_last_run)
+        query = db.session.query(cls).filter(cls.user_id == user_id)
+        if favorites_only:
+            query = query.filter(cls.is_favorite.is_(True))
+        if search is not None:
+            query = query.filter(cls.text_search_filter(search, fuzzy=fuzzy))
+        if fields is not None:
+            query = query.options(*cls.load_fields(fields))
+        if cursor:
+            ordered_at, last_id = decode_cursor(cursor)
+            query = query.filter(db.tuple_(order_key, cls.id) < (ordered_at, last_id))
+        
+        # Fetch one extra row to know whether there is a next page
+        searches = query.order_by(order_key.desc(), cls.id.desc()).limit(limit + 1).all()
+        if len(searches) <= limit:
+            return searches, None
+        searches = searches[:limit]
+        return searches, encode_cursor(*searches[-1].position(by_last_run))
+    
     @classmethod
     def get_favorites(cls, user_id):
         """Get favorite searches for a user."""
-        return cls.query.filter_by(user_id=user_id, is_favorite=True)\
+        return db.session.query(cls).filter_by(user_id=user_id, is_favorite=True)\
                        .order_by(cls.created_at.desc())\
                        .all()
     
     def __repr__(self):
-        return f'<SearchHistory {self.query[:50]}...>' 
\ No newline at end of file
+        return f'<SearchHistory {self.query[:50]}...>'
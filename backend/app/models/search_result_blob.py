@@ -0,0 +1,59 @@
+import hashlib
+import json
+import zlib
+from datetime import datetime
+from app import db
+
+class SearchResultBlob(db.Model):
+    """
+    Search results stored once per distinct content.
+    
+    History rows reference a blob by the SHA-256 of its canonical JSON, so
+    users running the same popular query share one copy. `refcount` counts
+    referencing history rows; blobs that drop to zero are removed by
+    ResultBlobStore.collect_garbage.
+    """
+    
+    __tablename__ = 'search_result_blobs'
+    
+    hash = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+    compression = db.Column(db.String(10), nullable=False, default='none')  # none, zlib
+    size = db.Column(db.Integer, nullable=False)  # Uncompressed bytes
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    @staticmethod
+    def encode(results, compression='zlib', compress_min_bytes=512):
+        """
+        Serialize results into blob column values.
+        
+        Args:
+            results: Search results (JSON serializable)
+            compression: 'zlib' or 'none'
+            compress_min_bytes: Smaller payloads are stored uncompressed
+        
+        Returns:
+            dict with hash, data, compression and size
+        """
+        raw = json.dumps(results, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        digest = hashlib.sha256(raw).hexdigest()
+        
+        if compression == 'zlib' and len(raw) >= compress_min_bytes:
+            data = zlib.compress(raw)
+            if len(data) < len(raw):
+                return {'hash': digest, 'data': data, 'compression': 'zlib', 'size': len(raw)}
+        return {'hash': digest, 'data': raw, 'compression': 'none', 'size': len(raw)}
+    
+    @staticmethod
+    def decode(data, compression):
+        """Decode blob column values back into results."""
+        raw = zlib.decompress(data) if compression == 'zlib' else data
+        return json.loads(raw.decode('utf-8'))
+    
+    def get_results(self):
+        """Decode the stored results."""
+        return self.decode(self.data, self.compression)
+    
+    def __repr__(self):
+        return f'<SearchResultBlob {self.hash[:12]} refs={self.refcount}>'
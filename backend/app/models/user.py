@@ -1,7 +1,7 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
+from app.services.password_hasher import get_password_hasher
 
 class User(db.Model):
     """User model for authentication and profile management."""
@@ -28,25 +28,41 @@ class User(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     last_login = db.Column(db.DateTime, nullable=True)
     
-    # Relationships
-    search_history = db.relationship('SearchHistory', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+    # Denormalized counters, maintained as history is written (see UserCounters)
+    search_count = db.Column(db.Integer, default=0, nullable=False)
+    favorites_count = db.Column(db.Integer, default=0, nullable=False)
+    last_search_at = db.Column(db.DateTime, nullable=True)
+    
+    # Pending asynchronous deletion (see AccountDeletion)
+    deletion_requested_at = db.Column(db.DateTime, nullable=True)
+    deletion_id = db.Column(db.String(32), nullable=True, unique=True)
+    
+    # Relationships (history rows are removed by the database's ON DELETE CASCADE)
+    search_history = db.relationship('SearchHistory', backref='user', lazy='dynamic',
+                                     cascade='all, delete-orphan', passive_deletes=True)
     
     def __init__(self, email, password=None, name=None, google_id=None):
         self.email = email
         self.name = name
         self.google_id = google_id
+        self.search_count = 0
+        self.favorites_count = 0
         if password:
             self.set_password(password)
     
     def set_password(self, password):
-        """Hash and set password."""
-        self.password_hash = generate_password_hash(password)
+        """Hash and set password (in the password hashing pool, see PasswordHasher)."""
+        self.password_hash = get_password_hasher().hash(password)
     
     def check_password(self, password):
         """Check if provided password matches hash."""
         if not self.password_hash:
             return False
-        return check_password_hash(self.password_hash, password)
+        return get_password_hasher().verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """Whether the stored hash predates the configured hashing parameters."""
+        return bool(self.password_hash) and get_password_hasher().needs_rehash(self.password_hash)
     
     def update_last_login(self):
         """Update last login timestamp."""
@@ -64,7 +80,9 @@ class User(db.Model):
             'is_verified': self.is_verified,
             'created_at': self.created_at.isoformat(),
             'last_login': self.last_login.isoformat() if self.last_login else None,
-            'search_count': self.search_history.count()
+            'search_count': self.search_count or 0,
+            'favorites_count': self.favorites_count or 0,
+            'last_search_at': self.last_search_at.isoformat() if self.last_search_at else None
         }
     
     def __repr__(self):
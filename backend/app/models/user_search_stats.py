@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+from app import db
+
+class UserSearchStats(db.Model):
+    """Incrementally maintained rollup of a user's search history."""
+    
+    __tablename__ = 'user_search_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    
+    # Searches per day, keyed by ISO date ('2024-01-31')
+    daily_counts = db.Column(db.JSON, nullable=False, default=dict)
+    
+    # Searches per search_type
+    type_counts = db.Column(db.JSON, nullable=False, default=dict)
+    
+    # Bounded top-K of queries (space-saving counts, may overestimate)
+    top_queries = db.Column(db.JSON, nullable=False, default=dict)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.daily_counts = {}
+        self.type_counts = {}
+        self.top_queries = {}
+    
+    def add_searches(self, searches, top_k=50, retention_days=90):
+        """
+        Merge new searches into the rollup.
+        
+        Args:
+            searches: Iterable of (query, search_type, created_at) tuples
+            top_k: Number of distinct queries to track
+            retention_days: Number of daily buckets to keep
+        """
+        daily_counts = dict(self.daily_counts or {})
+        type_counts = dict(self.type_counts or {})
+        top_queries = dict(self.top_queries or {})
+        
+        for query, search_type, created_at in searches:
+            day = created_at.date().isoformat()
+            daily_counts[day] = daily_counts.get(day, 0) + 1
+            
+            search_type = search_type or 'ai_powered'
+            type_counts[search_type] = type_counts.get(search_type, 0) + 1
+            
+            if query in top_queries:
+                top_queries[query] += 1
+            elif len(top_queries) < top_k:
+                top_queries[query] = 1
+            else:
+                # Space-saving: replace the least frequent query
+                evicted = min(top_queries, key=top_queries.get)
+                top_queries[query] = top_queries.pop(evicted) + 1
+        
+        cutoff = (datetime.utcnow() - timedelta(days=retention_days)).date().isoformat()
+        self.daily_counts = {day: n for day, n in daily_counts.items() if day >= cutoff}
+        self.type_counts = type_counts
+        self.top_queries = top_queries
+    
+    def remove_searches(self, searches):
+        """
+        Subtract deleted searches from the rollup.
+        
+        Args:
+            searches: Iterable of (query, search_type, created_at) tuples
+        """
+        daily_counts = dict(self.daily_counts or {})
+        type_counts = dict(self.type_counts or {})
+        top_queries = dict(self.top_queries or {})
+        
+        for query, search_type, created_at in searches:
+            day = created_at.date().isoformat()
+            if day in daily_counts:
+                daily_counts[day] -= 1
+                if daily_counts[day] <= 0:
+                    del daily_counts[day]
+            
+            search_type = search_type or 'ai_powered'
+            if search_type in type_counts:
+                type_counts[search_type] -= 1
+                if type_counts[search_type] <= 0:
+                    del type_counts[search_type]
+            
+            if query in top_queries:
+                top_queries[query] -= 1
+                if top_queries[query] <= 0:
+                    del top_queries[query]
+        
+        self.daily_counts = daily_counts
+        self.type_counts = type_counts
+        self.top_queries = top_queries
+    
+    def count_since(self, days):
+        """Count searches in the last `days` days."""
+        cutoff = (datetime.utcnow() - timedelta(days=days - 1)).date().isoformat()
+        return sum(n for day, n in (self.daily_counts or {}).items() if day >= cutoff)
+    
+    def get_top_queries(self, limit=10):
+        """Get the most frequent queries, highest count first."""
+        ranked = sorted((self.top_queries or {}).items(), key=lambda item: (-item[1], item[0]))
+        return [{'query': query, 'count': count} for query, count in ranked[:limit]]
+    
+    def __repr__(self):
+        return f'<UserSearchStats {self.user_id}>'
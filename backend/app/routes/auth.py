@@ -4,12 +4,12 @@ from flask_jwt_extended import (
     jwt_required, get_jwt_identity, get_jwt
 )
 from werkzeug.exceptions import BadRequest
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
 import re
 
 from app import db
 from app.models.user import User
+from app.services.google_verifier import get_google_verifier
+from app.services.password_hasher import PasswordHasherBusy
 from app.utils.validators import validate_email, validate_password
 from app.utils.redis_helper import RedisHelper
 
@@ -61,6 +61,10 @@ def register():
             'refresh_token': refresh_token
         }), 201
         
+    except PasswordHasherBusy as e:
+        db.session.rollback()
+        current_app.logger.warning(f"Registration rejected: {str(e)}")
+        return jsonify({'error': 'Too many requests in progress, please retry shortly'}), 503
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Registration error: {str(e)}")
@@ -87,6 +91,11 @@ def login():
         if not user.is_active:
             return jsonify({'error': 'Account is deactivated'}), 401
         
+        # Upgrade hashes made with older parameters while the plaintext is at hand
+        # (committed with the last login update below)
+        if user.password_needs_rehash():
+            user.set_password(password)
+        
         # Create tokens
         access_token = create_access_token(identity=user.id)
         refresh_token = create_refresh_token(identity=user.id)
@@ -101,6 +110,9 @@ def login():
             'refresh_token': refresh_token
         }), 200
         
+    except PasswordHasherBusy as e:
+        current_app.logger.warning(f"Login rejected: {str(e)}")
+        return jsonify({'error': 'Too many requests in progress, please retry shortly'}), 503
     except Exception as e:
         current_app.logger.error(f"Login error: {str(e)}")
         return jsonify({'error': 'Login failed'}), 500
@@ -116,12 +128,9 @@ def google_login():
         
         token = data['token']
         
-        # Verify Google token
+        # Verify Google token against the cached signing certs
         try:
-            idinfo = id_token.verify_oauth2_token(
-                token, google_requests.Request(), 
-                current_app.config['GOOGLE_CLIENT_ID']
-            )
+            idinfo = get_google_verifier().verify(token, current_app.config['GOOGLE_CLIENT_ID'])
         except ValueError:
             return jsonify({'error': 'Invalid Google token'}), 401
         
@@ -1,18 +1,31 @@
-from flask import Blueprint, request, jsonify, current_app, make_response
+from flask import Blueprint, Response, request, jsonify, current_app, make_response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
+import hmac
 import time
-import hashlib
 import json
+import redis
 
 from app import db
 from app.models.user import User
 from app.models.search_history import SearchHistory
-from app.services.ai_service import AIService
 from app.services.rate_limiter import RateLimiter
+from app.services.search_service import SearchService, PREDEFINED_SUGGESTIONS
+from app.services.idempotency import IdempotencyStore, IdempotencyClaim
+from app.services.search_jobs import SearchJobQueue
+from app.services.history_bulk import HistoryBulkOperations, HistorySelection
+from app.services.trending import TrendingTracker
+from app.services.history_partitions import HistoryArchive, archived_position
+from app.services.autocomplete import get_autocomplete
+from app.utils.cache_backends import CacheBackendError, get_cache_backend
+from app.utils.db_routing import read_only
+from app.utils.pagination import decode_cursor, encode_cursor
 from app.utils.redis_helper import RedisHelper
 
 search_bp = Blueprint('search', __name__)
 
+# History listings leave out the results JSON unless it is asked for
+HISTORY_LIST_FIELDS = [name for name in SearchHistory.SERIALIZABLE_FIELDS if name != 'results']
+
 @search_bp.route('/search', methods=['OPTIONS'])
 def handle_options():
     """Handle OPTIONS request for CORS preflight"""
@@ -47,132 +60,335 @@ def search():
         except:
             pass  # User is not authenticated
         
-        # Rate limiting check
-        rate_limiter = RateLimiter()
-        can_search, remaining_searches = rate_limiter.can_search(
-            user_id=user_id, 
-            session_id=session_id
-        )
-        
-        if not can_search:
-            return jsonify({
-                'error': 'Search limit exceeded. Please sign up to continue searching.',
-                'code': 'RATE_LIMIT_EXCEEDED',
-                'remaining_searches': 0
-            }), 429
+        # Job mode: {"async": true} or "Prefer: respond-async"
+        async_mode = bool(data.get('async')) or \
+            'respond-async' in request.headers.get('Prefer', '')
         
-        # Check cache first
-        cache_key = _generate_cache_key(query, filters)
-        redis_helper = RedisHelper()
-        cached_results = redis_helper.get_cached_search(cache_key)
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if not idempotency_key:
+            payload, status_code = _execute_search(
+                query, filters, user_id, session_id, ip_address, start_time, async_mode
+            )
+            return jsonify(payload), status_code
         
-        if cached_results:
-            return jsonify(cached_results), 200
+        if len(idempotency_key) > 255:
+            return jsonify({'error': 'Idempotency-Key is too long'}), 400
         
-        # Perform search
-        ai_service = AIService()
-        results = ai_service.search_resources(query, filters)
+        # Retries with the same key wait for or replay the original request
+        scope = f"user:{user_id}" if user_id else f"session:{session_id or ip_address}"
+        store = IdempotencyStore()
+        claim = store.claim(scope, idempotency_key, {'query': query, 'filters': filters})
         
-        # Cache results
-        redis_helper.cache_search(cache_key, results)
+        if claim.state == IdempotencyClaim.REPLAY:
+            response = jsonify(claim.response)
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response, claim.status_code
         
-        # Log search if user is authenticated
-        if user_id:
-            search_history = SearchHistory(
-                user_id=user_id,
-                query=query,
-                filters=json.dumps(filters),
-                results_count=len(results)
-            )
-            db.session.add(search_history)
-            db.session.commit()
+        if claim.state == IdempotencyClaim.MISMATCH:
+            return jsonify({
+                'error': 'Idempotency-Key was already used for a different search',
+                'code': 'IDEMPOTENCY_KEY_REUSED'
+            }), 422
         
-        return jsonify({
-            'results': results,
-            'remaining_searches': remaining_searches,
-            'execution_time': time.time() - start_time
-        }), 200
+        if claim.state == IdempotencyClaim.IN_PROGRESS:
+            return jsonify({
+                'error': 'The original request is still in progress',
+                'code': 'IDEMPOTENCY_IN_PROGRESS'
+            }), 409
         
+        try:
+            payload, status_code = _execute_search(
+                query, filters, user_id, session_id, ip_address, start_time, async_mode
+            )
+        except Exception:
+            if claim.state == IdempotencyClaim.CLAIMED:
+                store.release(claim)
+            raise
+        
+        if claim.state == IdempotencyClaim.CLAIMED:
+            # Only successes are final; after a 429 or a server error a retry must run the search again
+            if 200 <= status_code < 300:
+                store.complete(claim, payload, status_code)
+            else:
+                store.release(claim)
+        
+        return jsonify(payload), status_code
+    
     except Exception as e:
         current_app.logger.error(f"Search error: {str(e)}")
         return jsonify({'error': 'Search failed'}), 500
 
+def _record_popularity(query):
+    """Count a search for trending and autocomplete in one cache round trip. Failures are logged."""
+    increments = TrendingTracker().increments(query) + get_autocomplete().query_increments(query)
+    try:
+        get_cache_backend().zincrby_many(increments)
+    except CacheBackendError as e:
+        current_app.logger.error(f"Popularity update error: {str(e)}")
+
+def _execute_search(query, filters, user_id, session_id, ip_address, start_time,
+                    async_mode=False):
+    """
+    Run a rate-limited, cached search.
+    
+    In async mode a cache miss is queued as a search job instead of being
+    run in the request thread.
+    
+    Returns:
+        tuple: (response payload, status code)
+    """
+    # Rate limiting check
+    rate_limiter = RateLimiter()
+    can_search, remaining_searches = rate_limiter.can_search(
+        user_id=user_id, 
+        session_id=session_id
+    )
+    
+    if not can_search:
+        return {
+            'error': 'Search limit exceeded. Please sign up to continue searching.',
+            'code': 'RATE_LIMIT_EXCEEDED',
+            'remaining_searches': 0
+        }, 429
+    
+    _record_popularity(query)
+    
+    # Check cache first
+    search_service = SearchService()
+    cached_results = search_service.get_cached(query, filters)
+    
+    if cached_results is not None:
+        return {
+            'results': cached_results['results'],
+            'remaining_searches': remaining_searches,
+            'execution_time': time.time() - start_time,
+            'cached': True
+        }, 200
+    
+    # In job mode, hand the search to the worker pool and return at once
+    if async_mode:
+        try:
+            job_id = SearchJobQueue().enqueue(
+                query, filters, user_id=user_id, session_id=session_id
+            )
+        except redis.RedisError as e:
+            current_app.logger.error(f"Search job enqueue error: {str(e)}")
+            return {'error': 'Search jobs are unavailable'}, 503
+        response = {
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': f"/api/search/jobs/{job_id}",
+            'remaining_searches': remaining_searches
+        }
+        if not user_id:
+            # Guests prove they own the job with their session ID
+            response['status_url'] += f"?session_id={session_id}"
+        return response, 202
+    
+    # Perform search and cache results
+    results, provenance = search_service.run(query, filters)
+    if provenance == 'ai':
+        get_autocomplete().record_resources(results)
+    
+    # Log search if user is authenticated (written behind, in batches)
+    if user_id:
+        search_service.record_history(
+            query, filters, results, user_id=user_id, session_id=session_id,
+            ip_address=ip_address, execution_time=time.time() - start_time
+        )
+    
+    return {
+        'results': results,
+        'remaining_searches': remaining_searches,
+        'execution_time': time.time() - start_time
+    }, 200
+
+@search_bp.route('/search/jobs/<job_id>', methods=['GET'])
+def get_search_job(job_id):
+    """
+    Get an asynchronous search job, long-polling up to ?wait= seconds.
+    
+    Guests pass the job's ?session_id= (returned when it was created).
+    """
+    try:
+        wait = min(request.args.get('wait', 0, type=float),
+                   current_app.config.get('SEARCH_JOB_MAX_WAIT', 30))
+        
+        queue = SearchJobQueue()
+        job = queue.wait(job_id, wait) if wait > 0 else queue.get(job_id)
+        
+        if not job or not _owns_job(job):
+            return jsonify({'error': 'Search job not found'}), 404
+        
+        return jsonify({'job': _job_to_dict(job)}), 200
+    
+    except redis.RedisError as e:
+        current_app.logger.error(f"Search job error: {str(e)}")
+        return jsonify({'error': 'Search jobs are unavailable'}), 503
+
+@search_bp.route('/search/jobs/<job_id>/events', methods=['GET'])
+def stream_search_job(job_id):
+    """
+    Stream an asynchronous search job's status as server-sent events.
+    
+    A stream stays open at most SEARCH_JOB_STREAM_MAX_SECONDS so it doesn't
+    tie up a worker thread for the job's lifetime; the `retry` hint tells
+    EventSource clients to reconnect, and a new stream starts with the
+    current status.
+    """
+    try:
+        queue = SearchJobQueue()
+        job = queue.get(job_id)
+        
+        if not job or not _owns_job(job):
+            return jsonify({'error': 'Search job not found'}), 404
+    
+    except redis.RedisError as e:
+        current_app.logger.error(f"Search job error: {str(e)}")
+        return jsonify({'error': 'Search jobs are unavailable'}), 503
+    
+    config = current_app.config
+    max_wait = config.get('SEARCH_JOB_MAX_WAIT', 30)
+    max_seconds = config.get('SEARCH_JOB_STREAM_MAX_SECONDS', 55)
+    retry_ms = config.get('SEARCH_JOB_STREAM_RETRY_MS', 1000)
+    
+    def generate():
+        yield f"retry: {retry_ms}\n\n"
+        last_status = None
+        deadline = time.monotonic() + max_seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # The client reconnects after `retry` milliseconds
+                return
+            current = queue.wait(job_id, min(max_wait, remaining)) if last_status else queue.get(job_id)
+            if current is None:
+                yield "event: error\ndata: {\"error\": \"Search job expired\"}\n\n"
+                return
+            if current['status'] != last_status:
+                last_status = current['status']
+                yield f"event: status\ndata: {json.dumps(_job_to_dict(current))}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+            if last_status in ('completed', 'failed'):
+                return
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @search_bp.route('/search', methods=['OPTIONS'])
 def search_options():
     return '', 204
 
 @search_bp.route('/search/history', methods=['GET'])
 @jwt_required()
+@read_only
 def get_search_history():
-    """Get user search history."""
+    """
+    Get user search history, newest first (?limit=&cursor=&include_total=true&fields=).
+    
+    ?q= only returns searches whose query contains all of its words. With
+    ?include_archived=true, pages continue into archived months once the
+    hot history is exhausted.
+    """
     try:
         current_user_id = get_jwt_identity()
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
-        
-        # Validate pagination parameters
-        per_page = min(per_page, 50)  # Max 50 items per page
+        limit = _page_limit()
+        cursor = request.args.get('cursor')
+        search = request.args.get('q') or None
+        by_last_run = current_app.config.get('HISTORY_DEDUPE', False)
         
-        # Get paginated search history
-        pagination = SearchHistory.query.filter_by(user_id=current_user_id)\
-                                      .order_by(SearchHistory.created_at.desc())\
-                                      .paginate(
-                                          page=page,
-                                          per_page=per_page,
-                                          error_out=False
-                                      )
-        
-        searches = [search.to_dict(include_results=False) for search in pagination.items]
+        try:
+            fields = SearchHistory.parse_fields(request.args.get('fields'), default=HISTORY_LIST_FIELDS)
+            searches, next_cursor = SearchHistory.keyset_page(
+                current_user_id, limit, cursor=cursor, fields=fields, search=search,
+                fuzzy=current_app.config.get('HISTORY_SEARCH_TRIGRAM', False), by_last_run=by_last_run
+            )
+            position = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if searches:
+            position = searches[-1].position(by_last_run)
+        searches = [search.to_dict(fields=fields) for search in searches]
+        
+        # Archived months are all older than the hot table, so they continue the same keyset order
+        # (a repeat of an archived search is stored as a new hot row, not run against the archive)
+        include_archived = request.args.get('include_archived', 'false').lower() == 'true'
+        if include_archived and next_cursor is None:
+            remaining = limit - len(searches)
+            archived = HistoryArchive().read_page(
+                current_user_id, remaining + 1, before=position,
+                terms=SearchHistory.search_terms(search) if search is not None else None,
+                by_last_run=by_last_run
+            )
+            if len(archived) > remaining:
+                archived = archived[:remaining]
+                if archived:
+                    position = archived_position(archived[-1], by_last_run)
+                next_cursor = encode_cursor(*position)
+            searches += [{name: row.get(name) for name in fields} for row in archived]
         
         return jsonify({
             'searches': searches,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': _page_info(limit, next_cursor, None if search is not None else
+                                     lambda: _history_total(current_user_id, include_archived))
         }), 200
-        
+    
     except Exception as e:
         current_app.logger.error(f"Search history error: {str(e)}")
         return jsonify({'error': 'Failed to fetch search history'}), 500
 
 @search_bp.route('/search/history/<int:search_id>', methods=['GET'])
 @jwt_required()
+@read_only
 def get_search_details(search_id):
     """Get detailed search results by ID."""
     try:
         current_user_id = get_jwt_identity()
         
-        search = SearchHistory.query.filter_by(
-            id=search_id,
-            user_id=current_user_id
-        ).first()
+        search = db.session.query(SearchHistory)\
+                           .options(*SearchHistory.load_fields(SearchHistory.SERIALIZABLE_FIELDS))\
+                           .filter_by(id=search_id, user_id=current_user_id)\
+                           .first()
         
         if not search:
             return jsonify({'error': 'Search not found'}), 404
         
         return jsonify({'search': search.to_dict()}), 200
-        
+    
     except Exception as e:
         current_app.logger.error(f"Search details error: {str(e)}")
         return jsonify({'error': 'Failed to fetch search details'}), 500
 
 @search_bp.route('/search/favorites', methods=['GET'])
 @jwt_required()
+@read_only
 def get_favorites():
-    """Get user's favorite searches."""
+    """Get user's favorite searches, newest first (?limit=&cursor=&include_total=true&fields=&q=)."""
     try:
         current_user_id = get_jwt_identity()
+        limit = _page_limit()
+        search = request.args.get('q') or None
         
-        favorites = SearchHistory.get_favorites(current_user_id)
-        favorite_searches = [search.to_dict() for search in favorites]
-        
-        return jsonify({'favorites': favorite_searches}), 200
+        try:
+            fields = SearchHistory.parse_fields(request.args.get('fields'),
+                                                default=SearchHistory.SERIALIZABLE_FIELDS)
+            favorites, next_cursor = SearchHistory.keyset_page(
+                current_user_id, limit, cursor=request.args.get('cursor'),
+                favorites_only=True, fields=fields, search=search,
+                fuzzy=current_app.config.get('HISTORY_SEARCH_TRIGRAM', False),
+                by_last_run=current_app.config.get('HISTORY_DEDUPE', False)
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
+        return jsonify({
+            'favorites': [search.to_dict(fields=fields) for search in favorites],
+            'pagination': _page_info(limit, next_cursor, None if search is not None else
+                                     lambda: _user_counter(current_user_id, 'favorites_count'))
+        }), 200
+    
     except Exception as e:
         current_app.logger.error(f"Favorites error: {str(e)}")
         return jsonify({'error': 'Failed to fetch favorites'}), 500
@@ -184,7 +400,7 @@ def add_to_favorites(search_id):
     try:
         current_user_id = get_jwt_identity()
         
-        search = SearchHistory.query.filter_by(
+        search = db.session.query(SearchHistory).filter_by(
             id=search_id,
             user_id=current_user_id
         ).first()
@@ -198,7 +414,7 @@ def add_to_favorites(search_id):
             'message': 'Added to favorites',
             'search': search.to_dict()
         }), 200
-        
+    
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Add to favorites error: {str(e)}")
@@ -211,7 +427,7 @@ def remove_from_favorites(search_id):
     try:
         current_user_id = get_jwt_identity()
         
-        search = SearchHistory.query.filter_by(
+        search = db.session.query(SearchHistory).filter_by(
             id=search_id,
             user_id=current_user_id
         ).first()
@@ -225,45 +441,126 @@ def remove_from_favorites(search_id):
             'message': 'Removed from favorites',
             'search': search.to_dict()
         }), 200
-        
+    
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Remove from favorites error: {str(e)}")
         return jsonify({'error': 'Failed to remove from favorites'}), 500
 
+@search_bp.route('/search/history', methods=['DELETE'])
+@jwt_required()
+def clear_search_history():
+    """Clear search history, optionally only ?before= / ?after= a timestamp or ?ids=1,2,3."""
+    try:
+        current_user_id = get_jwt_identity()
+        params = dict(request.args)
+        params.update(request.get_json(silent=True) or {})
+        
+        try:
+            selection = HistorySelection.from_params(current_user_id, params, require_selector=False)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        deleted = HistoryBulkOperations().delete(selection)
+        
+        return jsonify({'message': 'Search history cleared', 'deleted': deleted}), 200
+    
+    except Exception as e:
+        current_app.logger.error(f"Clear history error: {str(e)}")
+        return jsonify({'error': 'Failed to clear search history'}), 500
+
+@search_bp.route('/search/history/bulk', methods=['POST'])
+@jwt_required()
+def bulk_update_history():
+    """
+    Favorite, unfavorite or delete many searches at once.
+    
+    Body: {"action": "favorite" | "unfavorite" | "delete", "ids": [...],
+    "before": ts, "after": ts, "favorites_only": bool, "all": bool}
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        data = request.get_json() or {}
+        
+        action = data.get('action')
+        if action not in ('favorite', 'unfavorite', 'delete'):
+            return jsonify({'error': 'action must be favorite, unfavorite or delete'}), 400
+        
+        try:
+            selection = HistorySelection.from_params(current_user_id, data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        operations = HistoryBulkOperations()
+        if action == 'delete':
+            return jsonify({'action': action, 'deleted': operations.delete(selection)}), 200
+        
+        updated = operations.set_favorite(selection, action == 'favorite')
+        return jsonify({'action': action, 'updated': updated}), 200
+    
+    except Exception as e:
+        current_app.logger.error(f"Bulk history error: {str(e)}")
+        return jsonify({'error': 'Bulk operation failed'}), 500
+
 @search_bp.route('/search/suggestions', methods=['GET'])
+@read_only
 def get_search_suggestions():
-    """Get search suggestions based on popular queries."""
+    """Get search suggestions from trending queries (?window=1h|24h|7d)."""
     try:
-        # Get popular search terms from recent searches
-        suggestions = db.session.query(SearchHistory.query)\
-                               .distinct()\
-                               .order_by(db.func.count(SearchHistory.query).desc())\
-                               .limit(10)\
-                               .all()
-        
-        popular_queries = [s.query for s in suggestions]
-        
-        # Add some predefined suggestions
-        predefined_suggestions = [
-            "AI tools for coding",
-            "Python programming courses",
-            "React tutorials YouTube",
-            "Machine learning resources",
-            "Web development bootcamp",
-            "Data science tools",
-            "JavaScript frameworks",
-            "DevOps learning path"
+        window = request.args.get('window')
+        limit = min(request.args.get('limit', 10, type=int), 50)
+        
+        try:
+            trending = TrendingTracker().top(window, limit=limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Fill up with predefined suggestions, keeping trending order first
+        popular_queries = [item['query'] for item in trending]
+        seen = set(popular_queries)
+        all_suggestions = popular_queries + [
+            s for s in PREDEFINED_SUGGESTIONS if s.lower() not in seen
         ]
         
-        # Combine and deduplicate
-        all_suggestions = list(set(popular_queries + predefined_suggestions))
+        return jsonify({
+            'suggestions': all_suggestions[:15],
+            'trending': trending,
+            'window': window or current_app.config.get('TRENDING_DEFAULT_WINDOW', '24h')
+        }), 200
+    
+    except Exception as e:
+        current_app.logger.error(f"Suggestions error: {str(e)}")
+        return jsonify({'suggestions': PREDEFINED_SUGGESTIONS}), 200
+
+@search_bp.route('/search/autocomplete', methods=['GET'])
+def autocomplete():
+    """Get type-ahead completions for ?prefix=, most popular first."""
+    try:
+        prefix = request.args.get('prefix', '')
+        limit = request.args.get('limit', type=int)
         
-        return jsonify({'suggestions': all_suggestions[:15]}), 200
+        if len(prefix) > 100:
+            return jsonify({'error': 'Prefix is too long'}), 400
         
+        return jsonify({
+            'prefix': prefix,
+            'suggestions': get_autocomplete().suggest(prefix, limit=limit)
+        }), 200
+    
     except Exception as e:
-        current_app.logger.error(f"Suggestions error: {str(e)}")
-        return jsonify({'suggestions': []}), 200
+        current_app.logger.error(f"Autocomplete error: {str(e)}")
+        return jsonify({'prefix': request.args.get('prefix', ''), 'suggestions': []}), 200
+
+@search_bp.route('/search/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Get search cache hit counts by result provenance."""
+    try:
+        redis_helper = RedisHelper()
+        return jsonify({'cache': redis_helper.get_cache_stats()}), 200
+    
+    except Exception as e:
+        current_app.logger.error(f"Cache stats error: {str(e)}")
+        return jsonify({'error': 'Failed to get cache stats'}), 500
 
 @search_bp.route('/search/rate-limit/status', methods=['GET'])
 def get_rate_limit_status():
@@ -290,15 +587,72 @@ def get_rate_limit_status():
             'remaining_searches': remaining_searches,
             'is_authenticated': user_id is not None
         }), 200
-        
+    
     except Exception as e:
         current_app.logger.error(f"Rate limit status error: {str(e)}")
         return jsonify({'error': 'Failed to get rate limit status'}), 500
 
-def _generate_cache_key(query, filters):
-    """Generate a unique cache key for the search query and filters."""
-    key_data = {
-        'query': query.lower().strip(),
-        'filters': sorted(filters.items()) if filters else {}
+def _page_limit():
+    """Page size from ?limit= (or the older ?per_page=), capped at 50."""
+    limit = request.args.get('limit', request.args.get('per_page', 10, type=int), type=int)
+    return max(1, min(limit, 50))
+
+def _page_info(limit, next_cursor, total=None):
+    """Pagination metadata; `total` computes the ?include_total=true total (None: no total)."""
+    info = {
+        'limit': limit,
+        'next_cursor': next_cursor,
+        'has_next': next_cursor is not None
+    }
+    if total is not None and request.args.get('include_total', 'false').lower() == 'true':
+        info['total'] = total()
+    return info
+
+def _user_counter(user_id, counter):
+    """A user's denormalized counter."""
+    user = db.session.get(User, user_id)
+    return getattr(user, counter, 0) if user else 0
+
+def _history_total(user_id, include_archived):
+    """
+    Number of rows /search/history paginates over.
+    
+    users.search_count counts runs, archived ones included. Without
+    HISTORY_DEDUPE each run is one row, so it is the total unless archived
+    rows are left out (rows merged while dedupe was on still count all their
+    runs); otherwise the hot rows (and archived rows, if included) are
+    counted.
+    """
+    archive = HistoryArchive()
+    months = archive.months()
+    if not current_app.config.get('HISTORY_DEDUPE', False) and (include_archived or not months):
+        return _user_counter(user_id, 'search_count')
+    
+    total = db.session.query(db.func.count(SearchHistory.id)).filter(SearchHistory.user_id == user_id).scalar()
+    if include_archived:
+        total += sum(len(archive.read_user(month, user_id)) for month in months)
+    return total
+
+def _owns_job(job):
+    """Check that the current requester created the search job (guests by its ?session_id=)."""
+    if job['user_id']:
+        try:
+            verify_jwt_in_request(optional=True)
+            return str(get_jwt_identity()) == job['user_id']
+        except:
+            return False
+    session_id = request.args.get('session_id') or ''
+    return bool(job['session_id']) and hmac.compare_digest(session_id, job['session_id'])
+
+def _job_to_dict(job):
+    """Convert a search job to its API representation."""
+    data = {
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'query': job['query']
     }
-    return hashlib.md5(json.dumps(key_data, sort_keys=True).encode()).hexdigest() 
\ No newline at end of file
+    if job['status'] == 'completed':
+        data['results'] = job['results']
+    if job['status'] == 'failed':
+        data['error'] = job.get('error', 'Search failed')
+    return data
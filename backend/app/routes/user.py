@@ -1,15 +1,21 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from app import db
 from app.models.user import User
 from app.models.search_history import SearchHistory
+from app.models.user_search_stats import UserSearchStats
+from app.services.account_deletion import AccountDeletion
+from app.services.data_export import DataExport, gzip_stream
+from app.services.password_hasher import PasswordHasherBusy
+from app.utils.db_routing import read_only
 from app.utils.validators import validate_name, validate_email
 
 user_bp = Blueprint('user', __name__)
 
 @user_bp.route('/profile', methods=['GET'])
 @jwt_required()
+@read_only
 def get_profile():
     """Get user profile information."""
     try:
@@ -19,19 +25,14 @@ def get_profile():
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Get additional statistics
-        total_searches = SearchHistory.get_user_search_count(current_user_id)
+        # Get additional statistics (counts are denormalized on the user row)
         recent_searches = SearchHistory.get_recent_searches(current_user_id, limit=5)
-        favorites_count = SearchHistory.query.filter_by(
-            user_id=current_user_id, 
-            is_favorite=True
-        ).count()
         
         profile_data = user.to_dict()
         profile_data.update({
             'statistics': {
-                'total_searches': total_searches,
-                'favorites_count': favorites_count,
+                'total_searches': user.search_count,
+                'favorites_count': user.favorites_count,
                 'recent_searches': [search.to_dict(include_results=False) 
                                   for search in recent_searches]
             }
@@ -84,60 +85,30 @@ def update_profile():
 
 @user_bp.route('/statistics', methods=['GET'])
 @jwt_required()
+@read_only
 def get_statistics():
     """Get user statistics and analytics."""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
         
-        if not user:
+        # Single primary-key read of the user and their statistics rollup
+        row = db.session.query(User, UserSearchStats)\
+                        .outerjoin(UserSearchStats, UserSearchStats.user_id == User.id)\
+                        .filter(User.id == current_user_id)\
+                        .first()
+        
+        if not row:
             return jsonify({'error': 'User not found'}), 404
         
-        # Get comprehensive statistics
-        total_searches = SearchHistory.get_user_search_count(current_user_id)
-        favorites_count = SearchHistory.query.filter_by(
-            user_id=current_user_id, 
-            is_favorite=True
-        ).count()
-        
-        # Get search statistics by type
-        search_stats = db.session.query(
-            SearchHistory.search_type,
-            db.func.count(SearchHistory.id).label('count')
-        ).filter_by(user_id=current_user_id)\
-         .group_by(SearchHistory.search_type)\
-         .all()
-        
-        search_type_stats = {stat.search_type: stat.count for stat in search_stats}
-        
-        # Get recent activity (last 30 days)
-        from datetime import datetime, timedelta
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        
-        recent_searches = SearchHistory.query.filter(
-            SearchHistory.user_id == current_user_id,
-            SearchHistory.created_at >= thirty_days_ago
-        ).count()
-        
-        # Get popular search terms for this user
-        popular_queries = db.session.query(
-            SearchHistory.query,
-            db.func.count(SearchHistory.id).label('count')
-        ).filter_by(user_id=current_user_id)\
-         .group_by(SearchHistory.query)\
-         .order_by(db.func.count(SearchHistory.id).desc())\
-         .limit(10)\
-         .all()
+        user, stats = row
+        stats = stats or UserSearchStats(user.id)
         
         statistics = {
-            'total_searches': total_searches,
-            'favorites_count': favorites_count,
-            'recent_searches_30_days': recent_searches,
-            'search_type_breakdown': search_type_stats,
-            'popular_queries': [
-                {'query': query.query, 'count': query.count} 
-                for query in popular_queries
-            ],
+            'total_searches': user.search_count,
+            'favorites_count': user.favorites_count,
+            'recent_searches_30_days': stats.count_since(30),
+            'search_type_breakdown': stats.type_counts or {},
+            'popular_queries': stats.get_top_queries(limit=10),
             'member_since': user.created_at.isoformat(),
             'last_login': user.last_login.isoformat() if user.last_login else None
         }
@@ -182,6 +153,10 @@ def change_password():
         
         return jsonify({'message': 'Password changed successfully'}), 200
         
+    except PasswordHasherBusy as e:
+        db.session.rollback()
+        current_app.logger.warning(f"Password change rejected: {str(e)}")
+        return jsonify({'error': 'Too many requests in progress, please retry shortly'}), 503
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Password change error: {str(e)}")
@@ -190,7 +165,7 @@ def change_password():
 @user_bp.route('/delete-account', methods=['DELETE'])
 @jwt_required()
 def delete_account():
-    """Delete user account and all associated data."""
+    """Deactivate the account now and delete all associated data in the background."""
     try:
         current_user_id = get_jwt_identity()
         user = User.query.get(current_user_id)
@@ -208,21 +183,49 @@ def delete_account():
         if not user.check_password(password):
             return jsonify({'error': 'Password is incorrect'}), 401
         
-        # Delete user (cascade will handle search history)
-        db.session.delete(user)
-        db.session.commit()
+        # Deactivate and revoke tokens now; history is purged in chunks by a background task
+        deletion_id = AccountDeletion().request(user)
         
-        return jsonify({'message': 'Account deleted successfully'}), 200
+        return jsonify({
+            'message': 'Account deletion scheduled',
+            'deletion_id': deletion_id,
+            'status_url': f"/api/user/deletions/{deletion_id}"
+        }), 202
         
+    except PasswordHasherBusy as e:
+        db.session.rollback()
+        current_app.logger.warning(f"Account deletion rejected: {str(e)}")
+        return jsonify({'error': 'Too many requests in progress, please retry shortly'}), 503
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Account deletion error: {str(e)}")
         return jsonify({'error': 'Failed to delete account'}), 500
 
+@user_bp.route('/deletions/<deletion_id>', methods=['GET'])
+def get_deletion_status(deletion_id):
+    """Get the progress of an account deletion (the unguessable ID is the credential)."""
+    try:
+        progress = AccountDeletion().get_progress(deletion_id)
+        if not progress:
+            return jsonify({'error': 'Deletion not found'}), 404
+        
+        return jsonify({'deletion': dict(progress, deletion_id=deletion_id)}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Deletion status error: {str(e)}")
+        return jsonify({'error': 'Failed to get deletion status'}), 500
+
 @user_bp.route('/export-data', methods=['GET'])
 @jwt_required()
+@read_only
 def export_data():
-    """Export user data for GDPR compliance."""
+    """
+    Export user data for GDPR compliance, streamed.
+    
+    ?format=json (default) streams the original {"data": {...}} document;
+    ?format=ndjson streams one record per line. ?fields= limits the search
+    history fields. The body is gzipped on the fly if the client accepts it.
+    """
     try:
         current_user_id = get_jwt_identity()
         user = User.query.get(current_user_id)
@@ -230,20 +233,28 @@ def export_data():
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Get all user data
-        search_history = SearchHistory.query.filter_by(user_id=current_user_id)\
-                                          .order_by(SearchHistory.created_at.desc())\
-                                          .all()
+        fmt = request.args.get('format', 'json')
+        if fmt not in DataExport.FORMATS:
+            return jsonify({'error': f"Unsupported format: {fmt}"}), 400
+        
+        try:
+            fields = SearchHistory.parse_fields(request.args.get('fields'),
+                                                default=SearchHistory.SERIALIZABLE_FIELDS)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        export_data = {
-            'user_profile': user.to_dict(),
-            'search_history': [search.to_dict() for search in search_history],
-            'export_date': datetime.utcnow().isoformat(),
-            'total_searches': len(search_history)
+        chunks = DataExport(user, fields).iter_format(fmt)
+        headers = {
+            'Content-Disposition': f'attachment; filename="sankat-mochan-export.{fmt}"',
+            'Vary': 'Accept-Encoding'
         }
+        if request.accept_encodings['gzip']:
+            chunks = gzip_stream(chunks)
+            headers['Content-Encoding'] = 'gzip'
         
-        return jsonify({'data': export_data}), 200
+        mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+        return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
         
     except Exception as e:
         current_app.logger.error(f"Data export error: {str(e)}")
-        return jsonify({'error': 'Failed to export data'}), 500 
\ No newline at end of file
+        return jsonify({'error': 'Failed to export data'}), 500
@@ -0,0 +1,161 @@
+import json
+import uuid
+from datetime import datetime
+
+from flask import current_app
+
+from app import db
+from app.models.search_history import SearchHistory
+from app.models.user import User
+from app.models.user_search_stats import UserSearchStats
+from app.services.history_partitions import HistoryArchive
+from app.services.result_blobs import ResultBlobStore
+from app.utils.cache_backends import CacheBackendError, get_cache_backend
+from app.utils.redis_helper import RedisHelper
+
+class AccountDeletion:
+    """
+    Asynchronous, set-based account deletion.
+    
+    A deletion request only deactivates the account, revokes its tokens and
+    clears its cache entries. The account-purge background task then deletes
+    the user's history in chunks of ACCOUNT_PURGE_CHUNK_SIZE rows, one short
+    transaction each, then their rows in the HistoryArchive, and finally the user row itself (remaining dependent
+    rows go with the database's ON DELETE CASCADE). Pending deletions are
+    recorded on the user row, so a purge interrupted by a restart resumes
+    on the next sweep. Progress is kept in the cache under the deletion ID.
+    """
+    
+    LOCK_KEY = 'account_purge:lock'
+    
+    def __init__(self):
+        config = current_app.config
+        self.cache = get_cache_backend()
+        self.chunk_size = config.get('ACCOUNT_PURGE_CHUNK_SIZE', 1000)
+        self.progress_ttl = config.get('ACCOUNT_DELETION_PROGRESS_TTL', 7 * 86400)
+    
+    @staticmethod
+    def progress_key(deletion_id):
+        return f"account_deletion:{deletion_id}"
+    
+    def request(self, user):
+        """
+        Deactivate a user and schedule their data for purging.
+        
+        Returns:
+            str: Deletion ID for tracking progress
+        """
+        if user.deletion_id:
+            return user.deletion_id
+        
+        user.is_active = False
+        user.deletion_requested_at = datetime.utcnow()
+        user.deletion_id = uuid.uuid4().hex
+        db.session.commit()
+        
+        # Tokens live at most as long as the longest token lifetime
+        config = current_app.config
+        token_lifetime = max(config['JWT_ACCESS_TOKEN_EXPIRES'], config['JWT_REFRESH_TOKEN_EXPIRES'])
+        redis_helper = RedisHelper()
+        redis_helper.revoke_user_tokens(user.id, ttl=int(token_lifetime.total_seconds()))
+        redis_helper.delete_user_session(user.id)
+        
+        self._set_progress(user.deletion_id, {
+            'status': 'pending',
+            'deleted_searches': 0,
+            'total_searches': user.search_count,
+            'requested_at': user.deletion_requested_at.isoformat()
+        })
+        
+        purge_task = current_app.extensions['background_tasks'].get('account_purge')
+        if purge_task:
+            purge_task.ensure_started()
+            purge_task.wake()
+        
+        return user.deletion_id
+    
+    def get_progress(self, deletion_id):
+        """Get a deletion's progress, or None if unknown or expired."""
+        try:
+            progress = self.cache.get(self.progress_key(deletion_id))
+        except CacheBackendError:
+            return None
+        return json.loads(progress) if progress else None
+    
+    def _set_progress(self, deletion_id, progress):
+        try:
+            self.cache.set(self.progress_key(deletion_id), json.dumps(progress), ttl=self.progress_ttl)
+        except CacheBackendError as e:
+            current_app.logger.error(f"Failed to record deletion progress {deletion_id}: {str(e)}")
+    
+    def purge(self, user_id):
+        """
+        Delete a user scheduled for deletion and all of their history.
+        
+        Returns:
+            int: Number of search history rows deleted
+        """
+        user = db.session.get(User, user_id)
+        if not user or not user.deletion_id:
+            return 0
+        deletion_id = user.deletion_id
+        progress = self.get_progress(deletion_id) or {'total_searches': user.search_count, 'deleted_searches': 0}
+        progress['status'] = 'purging'
+        blob_store = ResultBlobStore()
+        deleted = 0
+        
+        while True:
+            rows = db.session.query(SearchHistory.id, SearchHistory.results_hash)\
+                .filter(SearchHistory.user_id == user_id)\
+                .order_by(SearchHistory.id)\
+                .limit(self.chunk_size)\
+                .all()
+            if not rows:
+                break
+            db.session.query(SearchHistory)\
+                .filter(SearchHistory.id.in_([row.id for row in rows]))\
+                .delete(synchronize_session=False)
+            blob_store.release(row.results_hash for row in rows)
+            db.session.commit()
+            
+            deleted += len(rows)
+            progress['deleted_searches'] = progress.get('deleted_searches', 0) + len(rows)
+            self._set_progress(deletion_id, progress)
+        
+        archived = len(HistoryArchive().remove_rows(user_id))
+        if archived:
+            deleted += archived
+            progress['deleted_searches'] = progress.get('deleted_searches', 0) + archived
+            self._set_progress(deletion_id, progress)
+        
+        db.session.query(UserSearchStats).filter(UserSearchStats.user_id == user_id)\
+            .delete(synchronize_session=False)
+        db.session.execute(User.__table__.delete().where(User.__table__.c.id == user_id))
+        db.session.commit()
+        
+        progress.update({'status': 'completed', 'completed_at': datetime.utcnow().isoformat()})
+        self._set_progress(deletion_id, progress)
+        return deleted
+    
+    @classmethod
+    def run_scheduled(cls):
+        """Purge every account pending deletion; only one process sweeps at a time."""
+        deletion = cls()
+        try:
+            if not deletion.cache.add(cls.LOCK_KEY, '1', ttl=600):
+                return
+        except CacheBackendError:
+            return
+        
+        try:
+            user_ids = [row.id for row in db.session.query(User.id)
+                        .filter(User.deletion_requested_at.isnot(None))
+                        .order_by(User.deletion_requested_at)]
+            for user_id in user_ids:
+                try:
+                    deletion.purge(user_id)
+                except Exception as e:
+                    db.session.rollback()
+                    current_app.logger.error(f"Account purge failed for user {user_id}: {str(e)}")
+        finally:
+            deletion.cache.delete(cls.LOCK_KEY)
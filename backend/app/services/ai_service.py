@@ -1,14 +1,62 @@
-import openai
 import json
+import threading
+import time
+from contextlib import contextmanager
 from flask import current_app
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+
+# Provenance of a result set, recorded alongside cached entries so that
+# degraded results can be expired sooner than real recommendations.
+PROVENANCE_AI = 'ai'
+PROVENANCE_EMPTY = 'empty'
+PROVENANCE_PARSE_ERROR = 'parse_error'
+PROVENANCE_FALLBACK = 'fallback'
+
+class InFlightCalls:
+    """Count of OpenAI calls in progress in this process, so shutdown can wait for them."""
+    
+    def __init__(self):
+        self._count = 0
+        self._idle = threading.Condition()
+    
+    @property
+    def count(self):
+        return self._count
+    
+    @contextmanager
+    def track(self):
+        with self._idle:
+            self._count += 1
+        try:
+            yield
+        finally:
+            with self._idle:
+                self._count -= 1
+                if not self._count:
+                    self._idle.notify_all()
+    
+    def wait_idle(self, timeout):
+        """Wait until no call is in flight; returns False if calls were still running after `timeout` seconds."""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+in_flight_calls = InFlightCalls()
 
 class AIService:
     """Service for AI-powered resource recommendations using OpenAI."""
     
     def __init__(self):
+        # Imported on first use: openai is slow to import and only search paths need it
+        import openai
         self.client = openai
         self.client.api_key = current_app.config.get('OPENAI_API_KEY')
+        self.request_timeout = current_app.config.get('OPENAI_REQUEST_TIMEOUT', 60)
     
     def search_resources(self, query: str, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
         """
@@ -21,43 +69,67 @@ class AIService:
         Returns:
             List of resource recommendations
         """
+        results, _ = self.search_resources_with_provenance(query, filters)
+        return results
+    
+    def search_resources_with_provenance(self, query: str, 
+                                         filters: Dict[str, Any] = None) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        Generate resource recommendations and report where they came from.
+        
+        Args:
+            query: User search query
+            filters: Search filters (type, difficulty, pricing)
+            
+        Returns:
+            tuple: (resources, provenance) where provenance is one of
+            'ai', 'empty', 'parse_error' or 'fallback'
+        """
         if not self.client.api_key:
             current_app.logger.warning("OpenAI API key not configured, using fallback results")
-            return self._get_fallback_results(query, filters)
+            return self._get_fallback_results(query, filters), PROVENANCE_FALLBACK
         
         try:
             # Build the prompt based on query and filters
             prompt = self._build_search_prompt(query, filters)
             
-            # Call OpenAI API
-            response = self.client.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert AI assistant that helps students and developers find the best learning resources. You specialize in recommending AI tools, YouTube channels, online courses, and educational websites. Always provide accurate, up-to-date, and relevant recommendations."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                max_tokens=2000,
-                temperature=0.7
-            )
+            # Call OpenAI API (bounded, so worker shutdown can drain in-flight calls)
+            with in_flight_calls.track():
+                response = self.client.ChatCompletion.create(
+                    model="gpt-3.5-turbo",
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": "You are an expert AI assistant that helps students and developers find the best learning resources. You specialize in recommending AI tools, YouTube channels, online courses, and educational websites. Always provide accurate, up-to-date, and relevant recommendations."
+                        },
+                        {
+                            "role": "user",
+                            "content": prompt
+                        }
+                    ],
+                    max_tokens=2000,
+                    temperature=0.7,
+                    request_timeout=self.request_timeout
+                )
             
             # Parse the response
             ai_response = response.choices[0].message.content
             resources = self._parse_ai_response(ai_response)
             
+            if resources is None:
+                return [], PROVENANCE_PARSE_ERROR
+            
             # Add metadata and validate results
             validated_resources = self._validate_and_enhance_resources(resources, query, filters)
             
-            return validated_resources
+            if not validated_resources:
+                return [], PROVENANCE_EMPTY
+            
+            return validated_resources, PROVENANCE_AI
             
         except Exception as e:
             current_app.logger.error(f"OpenAI API error: {str(e)}")
-            return self._get_fallback_results(query, filters)
+            return self._get_fallback_results(query, filters), PROVENANCE_FALLBACK
     
     def _build_search_prompt(self, query: str, filters: Dict[str, Any] = None) -> str:
         """Build the search prompt for OpenAI."""
@@ -103,8 +175,8 @@ Make sure all URLs are real and working. Focus on popular, well-known resources
         
         return prompt
     
-    def _parse_ai_response(self, response: str) -> List[Dict[str, Any]]:
-        """Parse AI response and extract resource data."""
+    def _parse_ai_response(self, response: str) -> Optional[List[Dict[str, Any]]]:
+        """Parse AI response and extract resource data (None if unparseable)."""
         try:
             # Try to find JSON in the response
             start_idx = response.find('{')
@@ -119,9 +191,9 @@ Make sure all URLs are real and working. Focus on popular, well-known resources
                 data = json.loads(response)
                 return data.get('resources', [])
                 
-        except (json.JSONDecodeError, KeyError) as e:
+        except (json.JSONDecodeError, KeyError, AttributeError) as e:
             current_app.logger.error(f"Failed to parse AI response: {str(e)}")
-            return []
+            return None
     
     def _validate_and_enhance_resources(self, resources: List[Dict[str, Any]], 
                                        query: str, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
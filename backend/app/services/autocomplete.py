@@ -0,0 +1,219 @@
+import heapq
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from flask import current_app
+
+from app import db
+from app.models.search_history import SearchHistory
+from app.models.search_result_blob import SearchResultBlob
+from app.services.search_service import canonicalize_query, PREDEFINED_SUGGESTIONS
+from app.utils.background import PeriodicTask
+from app.utils.cache_backends import CacheBackendError, get_cache_backend
+
+class PrefixIndex:
+    """
+    Immutable lexicographic index of scored terms.
+    
+    Terms are kept sorted so a prefix maps to a contiguous range found by
+    bisection. Short prefixes match large ranges, so their top results are
+    precomputed; longer prefixes rank their (small) range on the fly.
+    """
+    
+    SHORT_PREFIX_LENGTH = 3
+    
+    def __init__(self, scored_terms, limit=10):
+        self.scores = {}
+        for term, score in scored_terms:
+            self.scores[term] = max(self.scores.get(term, 0.0), score)
+        self.terms = sorted(self.scores)
+        self.limit = limit
+        
+        by_prefix = defaultdict(list)
+        for term in self.terms:
+            for length in range(1, min(len(term), self.SHORT_PREFIX_LENGTH) + 1):
+                by_prefix[term[:length]].append(term)
+        self._short_prefixes = {
+            prefix: heapq.nsmallest(limit, terms, key=self._rank)
+            for prefix, terms in by_prefix.items()
+        }
+    
+    def __len__(self):
+        return len(self.terms)
+    
+    def _rank(self, term):
+        return -self.scores[term], term
+    
+    def search(self, prefix, limit=None):
+        """
+        Get the most popular terms starting with `prefix`.
+        
+        Returns:
+            list of (term, score) tuples, most popular first
+        """
+        limit = min(limit or self.limit, self.limit)
+        if len(prefix) <= self.SHORT_PREFIX_LENGTH:
+            matches = self._short_prefixes.get(prefix, [])[:limit]
+        else:
+            start = bisect_left(self.terms, prefix)
+            end = bisect_left(self.terms, prefix + '\U0010ffff', lo=start)
+            matches = heapq.nsmallest(limit, self.terms[start:end], key=self._rank)
+        return [(term, self.scores[term]) for term in matches]
+
+class Autocomplete:
+    """
+    Type-ahead suggestions for GET /api/search/autocomplete.
+    
+    Popularity lives in a sorted set in the cache backend: every search adds
+    1 to its canonicalized query and AUTOCOMPLETE_RESOURCE_WEIGHT to the
+    names of the resources it returned. Each process serves lookups from an
+    in-memory PrefixIndex of the top AUTOCOMPLETE_MAX_TERMS terms, rebuilt
+    every AUTOCOMPLETE_REFRESH_INTERVAL seconds, so a keystroke never waits
+    on Redis or the database. Recording only increments; the set is trimmed
+    back to AUTOCOMPLETE_MAX_TERMS by one process per refresh interval.
+    """
+    
+    POPULARITY_KEY = 'autocomplete:popularity'
+    TRIM_LOCK_KEY = 'autocomplete:trim-lock'
+    MAX_TERM_LENGTH = 100
+    
+    def __init__(self, app):
+        self.app = app
+        config = app.config
+        self.max_terms = config.get('AUTOCOMPLETE_MAX_TERMS', 20000)
+        self.resource_weight = config.get('AUTOCOMPLETE_RESOURCE_WEIGHT', 0.2)
+        self.max_results = config.get('AUTOCOMPLETE_MAX_RESULTS', 10)
+        self.refresh_interval = config.get('AUTOCOMPLETE_REFRESH_INTERVAL', 60)
+        self._index = None
+        self._refresh_lock = threading.Lock()
+        self.task = PeriodicTask(app, 'autocomplete-refresh',
+                                 self.refresh_interval, self.refresh)
+    
+    def _add(self, increments):
+        try:
+            get_cache_backend().zincrby_many(increments)
+        except CacheBackendError as e:
+            current_app.logger.error(f"Autocomplete update error: {str(e)}")
+    
+    def _canonical_terms(self, texts):
+        terms = set()
+        for text in texts:
+            term = canonicalize_query(text or '')
+            if term and len(term) <= self.MAX_TERM_LENGTH:
+                terms.add(term)
+        return terms
+    
+    def query_increments(self, query):
+        """
+        The popularity increments that count a search of `query`.
+        
+        Returns:
+            list of (key, amount, member, ttl) tuples for `CacheBackend.zincrby_many`
+        """
+        return [(self.POPULARITY_KEY, 1, term, None) for term in self._canonical_terms([query])]
+    
+    def record_query(self, query):
+        """Count a search of `query`. Failures are logged, never raised."""
+        self._add(self.query_increments(query))
+    
+    def record_resources(self, resources):
+        """Add the names of resources returned by a search."""
+        terms = self._canonical_terms(r.get('name') for r in resources or [])
+        self._add([(self.POPULARITY_KEY, self.resource_weight, term, None) for term in terms])
+    
+    def trim(self):
+        """
+        Trim the popularity set to AUTOCOMPLETE_MAX_TERMS, once per refresh interval across processes.
+        
+        Returns:
+            int: Number of terms removed
+        """
+        cache = get_cache_backend()
+        if not cache.add(self.TRIM_LOCK_KEY, '1', ttl=self.refresh_interval):
+            return 0
+        return cache.zremrangebyrank(self.POPULARITY_KEY, 0, -(self.max_terms + 1))
+    
+    def refresh(self):
+        """Rebuild this process's prefix index from the popularity set."""
+        with self._refresh_lock:
+            try:
+                self.trim()
+                scored_terms = get_cache_backend().zrevrange(self.POPULARITY_KEY, 0, self.max_terms - 1)
+            except CacheBackendError as e:
+                current_app.logger.error(f"Autocomplete refresh error: {str(e)}")
+                if self._index is not None:
+                    return len(self._index)
+                scored_terms = []
+            
+            # Predefined suggestions are always available, ranked below anything searched
+            scored_terms = list(scored_terms) + [
+                (term, 0.0) for term in self._canonical_terms(PREDEFINED_SUGGESTIONS)
+            ]
+            self._index = PrefixIndex(scored_terms, limit=self.max_results)
+            return len(self._index)
+    
+    def suggest(self, prefix, limit=None):
+        """
+        Get the most popular terms starting with `prefix`.
+        
+        Returns:
+            list of {'text', 'score'} dicts, most popular first
+        """
+        if self._index is None:
+            self.refresh()
+        prefix = canonicalize_query(prefix)
+        if not prefix:
+            return []
+        return [
+            {'text': term, 'score': round(score, 3)}
+            for term, score in self._index.search(prefix, limit)
+        ]
+    
+    def rebuild_from_history(self, include_resources=False, batch_size=1000):
+        """
+        Rebuild the popularity set from search_history.
+        
+        Args:
+            include_resources: Also index resource names from stored results
+            batch_size: Rows fetched per round trip when scanning results
+        
+        Returns:
+            int: Number of distinct terms indexed
+        """
+        popularity = defaultdict(float)
+        for row in db.session.query(
+            SearchHistory.query, db.func.sum(SearchHistory.run_count).label('count')
+        ).group_by(SearchHistory.query):
+            for term in self._canonical_terms([row.query]):
+                popularity[term] += row.count
+        
+        if include_resources:
+            inline = db.session.query(SearchHistory.results_inline)\
+                .filter(SearchHistory.results_inline.isnot(None))\
+                .execution_options(yield_per=batch_size)
+            for (results,) in inline:
+                for term in self._canonical_terms(r.get('name') for r in results or []):
+                    popularity[term] += self.resource_weight
+            
+            # Shared result blobs count once per referencing history row
+            blobs = db.session.query(SearchResultBlob.data, SearchResultBlob.compression,
+                                     SearchResultBlob.refcount)\
+                .filter(SearchResultBlob.refcount > 0)\
+                .execution_options(yield_per=batch_size)
+            for data, compression, refcount in blobs:
+                results = SearchResultBlob.decode(data, compression)
+                for term in self._canonical_terms(r.get('name') for r in results or []):
+                    popularity[term] += self.resource_weight * refcount
+        
+        top_terms = heapq.nlargest(self.max_terms, popularity.items(), key=lambda item: item[1])
+        cache = get_cache_backend()
+        cache.delete(self.POPULARITY_KEY)
+        cache.zincrby_many((self.POPULARITY_KEY, score, term, None) for term, score in top_terms)
+        
+        self.refresh()
+        return len(top_terms)
+
+def get_autocomplete():
+    """Get the autocomplete service for the current application."""
+    return current_app.extensions['autocomplete']
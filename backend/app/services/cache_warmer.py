@@ -0,0 +1,122 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import threading
+
+from flask import current_app
+
+from app import db
+from app.models.search_history import SearchHistory
+from app.services.search_service import SearchService, PREDEFINED_SUGGESTIONS
+from app.utils.cache_backends import CacheBackendError, get_cache_backend
+
+class CacheWarmer:
+    """
+    Service for refreshing cached results of popular searches before they expire.
+    
+    Candidates are the predefined suggestions plus the top historical queries.
+    A query is refreshed when its cache entry is missing, degraded (fallback,
+    empty or unparseable) or about to expire. The number of LLM calls per run
+    is capped by a spend budget and executed with bounded concurrency.
+    """
+    
+    LOCK_KEY = 'cache_warmup:lock'
+    
+    def __init__(self, top_n=None, max_calls=None, concurrency=None, refresh_before=None):
+        config = current_app.config
+        self.app = current_app._get_current_object()
+        self.top_n = top_n if top_n is not None else config.get('CACHE_WARMUP_TOP_N', 50)
+        self.max_calls = max_calls if max_calls is not None else config.get('CACHE_WARMUP_MAX_CALLS', 100)
+        self.concurrency = concurrency or config.get('CACHE_WARMUP_CONCURRENCY', 4)
+        self.refresh_before = refresh_before if refresh_before is not None else \
+            config.get('CACHE_WARMUP_REFRESH_BEFORE', 600)
+        self.history_days = config.get('CACHE_WARMUP_HISTORY_DAYS', 7)
+    
+    def get_candidate_queries(self):
+        """
+        Get queries to keep warm, most valuable first.
+        
+        Returns:
+            list: Predefined suggestions followed by top historical queries
+        """
+        since = datetime.utcnow() - timedelta(days=self.history_days)
+        top_queries = []
+        
+        if self.top_n:
+            rows = db.session.query(
+                SearchHistory.query,
+                db.func.sum(SearchHistory.run_count).label('count')
+            ).filter(SearchHistory.created_at >= since)\
+             .group_by(SearchHistory.query)\
+             .order_by(db.func.sum(SearchHistory.run_count).desc())\
+             .limit(self.top_n)\
+             .all()
+            top_queries = [row.query for row in rows]
+        
+        candidates = []
+        seen = set()
+        for query in PREDEFINED_SUGGESTIONS + top_queries:
+            normalized = query.lower().strip()
+            if normalized and normalized not in seen:
+                seen.add(normalized)
+                candidates.append(query)
+        
+        return candidates
+    
+    def needs_refresh(self, search_service, query):
+        """Check whether a query's cache entry is missing, degraded or expiring."""
+        ttl = search_service.get_cache_ttl(query)
+        if ttl == -2 or 0 <= ttl < self.refresh_before:
+            return True
+        
+        entry = search_service.get_cached(query, record_lookup=False)
+        return entry is None or entry.get('provenance') != 'ai'
+    
+    def run(self):
+        """
+        Refresh expiring cache entries.
+        
+        Returns:
+            dict: Counts of considered, refreshed, fresh, over-budget and failed queries
+        """
+        search_service = SearchService()
+        report = {'considered': 0, 'refreshed': 0, 'fresh': 0, 'over_budget': 0, 'failed': 0}
+        to_refresh = []
+        
+        for query in self.get_candidate_queries():
+            report['considered'] += 1
+            if not self.needs_refresh(search_service, query):
+                report['fresh'] += 1
+            elif len(to_refresh) >= self.max_calls:
+                report['over_budget'] += 1
+            else:
+                to_refresh.append(query)
+        
+        lock = threading.Lock()
+        
+        def refresh(query):
+            with self.app.app_context():
+                try:
+                    SearchService().run(query, {})
+                    outcome = 'refreshed'
+                except Exception as e:
+                    current_app.logger.error(f"Cache warm-up failed for '{query}': {str(e)}")
+                    outcome = 'failed'
+            with lock:
+                report[outcome] += 1
+        
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            list(executor.map(refresh, to_refresh))
+        
+        current_app.logger.info(f"Cache warm-up finished: {report}")
+        return report
+    
+    @classmethod
+    def run_scheduled(cls):
+        """Run a warm-up unless another worker holds the warm-up lock."""
+        interval = current_app.config.get('CACHE_WARMUP_INTERVAL', 0)
+        try:
+            if not get_cache_backend().add(cls.LOCK_KEY, '1', ttl=max(interval - 1, 1)):
+                return None
+        except CacheBackendError:
+            return None
+        return cls().run()
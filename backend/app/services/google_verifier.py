@@ -0,0 +1,111 @@
+import os
+import re
+import threading
+import time
+
+from flask import current_app
+
+from app.utils.background import PeriodicTask
+
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+
+MAX_AGE = re.compile(r'max-age=(\d+)')
+
+class GoogleTokenVerifier:
+    """
+    Verifies Google ID tokens against cached signing certificates.
+    
+    `id_token.verify_oauth2_token` fetches Google's certs over a new
+    connection on every call. Here the certs from GOOGLE_CERTS_URL are kept
+    in process for as long as their Cache-Control max-age allows, fetched
+    through one keep-alive session, and a background task refreshes them
+    GOOGLE_CERTS_REFRESH_MARGIN seconds before they expire, so logins
+    don't wait on Google. If a refresh fails the previous certs keep being
+    used; tokens signed by a key they lack fail verification.
+    
+    GOOGLE_CERTS_URL can point at a local endpoint serving
+    `{key id: certificate or public key PEM}` to verify locally signed
+    tokens.
+    """
+    
+    def __init__(self, app):
+        config = app.config
+        self.certs_url = config.get('GOOGLE_CERTS_URL', 'https://www.googleapis.com/oauth2/v1/certs')
+        self.default_max_age = config.get('GOOGLE_CERTS_DEFAULT_MAX_AGE', 300)
+        self.refresh_margin = config.get('GOOGLE_CERTS_REFRESH_MARGIN', 300)
+        self.timeout = config.get('GOOGLE_CERTS_TIMEOUT', 5)
+        self._certs = None
+        self._expires_at = 0.0
+        self._fetch_lock = threading.Lock()
+        self._session = None
+        self._pid = None
+        self.task = PeriodicTask(app, 'google-certs-refresh',
+                                 config.get('GOOGLE_CERTS_CHECK_INTERVAL', 60), self.refresh_if_expiring)
+    
+    def verify(self, token, audience):
+        """
+        Verify a Google ID token's signature, expiry, audience and issuer.
+        
+        Returns:
+            dict of the token's claims
+        
+        Raises:
+            ValueError: If the token is invalid or not issued by Google
+        """
+        # Imported on first use: google-auth is slow to import and most workers never need it
+        from google.auth import jwt
+        
+        claims = jwt.decode(token, certs=self.get_certs(), audience=audience)
+        if claims.get('iss') not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer: {claims.get('iss')}")
+        return claims
+    
+    def get_certs(self):
+        """Get the signing certificates, fetching them if missing or expired."""
+        if self._certs is not None and time.time() < self._expires_at:
+            return self._certs
+        with self._fetch_lock:
+            # Another thread may have refreshed them while this one waited
+            if self._certs is not None and time.time() < self._expires_at:
+                return self._certs
+            try:
+                self._fetch()
+            except Exception as e:
+                if self._certs is None:
+                    raise
+                current_app.logger.warning(f"Refreshing Google certs failed, using expired ones: {str(e)}")
+            return self._certs
+    
+    def refresh_if_expiring(self):
+        """Refresh the certs ahead of expiry (once a login has loaded them in this process)."""
+        if self._certs is None or time.time() < self._expires_at - self.refresh_margin:
+            return
+        with self._fetch_lock:
+            if time.time() < self._expires_at - self.refresh_margin:
+                return
+            self._fetch()
+    
+    def _fetch(self):
+        response = self._get_session().get(self.certs_url, timeout=self.timeout)
+        response.raise_for_status()
+        certs = response.json()
+        
+        max_age = MAX_AGE.search(response.headers.get('Cache-Control', ''))
+        ttl = int(max_age.group(1)) if max_age else self.default_max_age
+        # Age is how long a shared cache already held the response
+        ttl -= int(response.headers.get('Age', 0) or 0)
+        
+        self._certs = certs
+        self._expires_at = time.time() + max(ttl, 0)
+    
+    def _get_session(self):
+        # A forked worker must not share the keep-alive sockets of the process it was forked from
+        if self._session is None or self._pid != os.getpid():
+            import requests
+            self._session = requests.Session()
+            self._pid = os.getpid()
+        return self._session
+
+def get_google_verifier():
+    """Get the Google ID token verifier for the current application."""
+    return current_app.extensions['google_verifier']
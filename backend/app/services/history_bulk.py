@@ -0,0 +1,194 @@
+from datetime import datetime, timezone
+
+from flask import current_app
+
+from app import db
+from app.models.search_history import SearchHistory
+from app.services.history_partitions import HistoryArchive, archived_row_for_stats
+from app.services.result_blobs import ResultBlobStore
+from app.services.user_counters import UserCounters
+from app.services.user_stats import UserStatsRollup
+
+class HistorySelection:
+    """
+    A set of one user's search history rows, by IDs and/or a created_at range.
+    
+    Parsed from a request body or query string: `ids` (list of IDs),
+    `before` / `after` (ISO timestamps) and `favorites_only`, or `all`
+    to explicitly select the whole history.
+    """
+    
+    MAX_IDS = 10000
+    
+    def __init__(self, user_id, ids=None, before=None, after=None, favorites_only=False):
+        self.user_id = user_id
+        self.ids = ids
+        self.before = before
+        self.after = after
+        self.favorites_only = favorites_only
+    
+    @classmethod
+    def from_params(cls, user_id, params, require_selector=True):
+        """
+        Build a selection from request parameters.
+        
+        Raises:
+            ValueError: If the parameters are invalid
+        """
+        ids = params.get('ids')
+        if ids is not None:
+            if isinstance(ids, str):
+                ids = ids.split(',')
+            try:
+                ids = [int(search_id) for search_id in ids]
+            except (TypeError, ValueError):
+                raise ValueError('ids must be a list of integers')
+            if len(ids) > cls.MAX_IDS:
+                raise ValueError(f"At most {cls.MAX_IDS} ids per request")
+        
+        before = _parse_timestamp(params.get('before'), 'before')
+        after = _parse_timestamp(params.get('after'), 'after')
+        select_all = str(params.get('all', '')).lower() == 'true' or params.get('all') is True
+        if require_selector and ids is None and before is None and after is None and not select_all:
+            raise ValueError('Provide ids, before/after, or all=true')
+        
+        favorites_only = str(params.get('favorites_only', '')).lower() == 'true' \
+            or params.get('favorites_only') is True
+        return cls(user_id, ids=ids, before=before, after=after, favorites_only=favorites_only)
+    
+    def filters(self):
+        criteria = [SearchHistory.user_id == self.user_id]
+        if self.ids is not None:
+            criteria.append(SearchHistory.id.in_(self.ids))
+        if self.before is not None:
+            criteria.append(SearchHistory.created_at < self.before)
+        if self.after is not None:
+            criteria.append(SearchHistory.created_at >= self.after)
+        if self.favorites_only:
+            criteria.append(SearchHistory.is_favorite.is_(True))
+        return criteria
+    
+    def matches(self, row):
+        """Whether an archived row (dict) is selected, like `filters` for the table."""
+        if self.ids is not None and row['id'] not in self.ids:
+            return False
+        created_at = datetime.fromisoformat(row['created_at'])
+        if self.before is not None and created_at >= self.before:
+            return False
+        if self.after is not None and created_at < self.after:
+            return False
+        if self.favorites_only and not row.get('is_favorite'):
+            return False
+        return True
+
+class HistoryBulkOperations:
+    """
+    Set-based favorite, unfavorite and delete over a HistorySelection.
+    
+    Deletes also remove selected rows from the HistoryArchive. Each chunk of BULK_HISTORY_CHUNK_SIZE rows is one UPDATE or DELETE plus
+    the matching counter, rollup and result-blob bookkeeping, committed
+    together. Selections that fit in one chunk are therefore a single
+    transaction; larger ones commit per chunk so locks stay short.
+    """
+    
+    def __init__(self):
+        self.chunk_size = current_app.config.get('BULK_HISTORY_CHUNK_SIZE', 1000)
+    
+    def _chunks(self, selection, extra_criteria=(), columns=(SearchHistory.id,)):
+        """Yield successive chunks of selected rows in id order."""
+        last_id = 0
+        while True:
+            rows = db.session.query(*columns)\
+                .filter(*selection.filters(), *extra_criteria, SearchHistory.id > last_id)\
+                .order_by(SearchHistory.id)\
+                .limit(self.chunk_size)\
+                .all()
+            if not rows:
+                return
+            last_id = rows[-1].id
+            yield rows
+    
+    def set_favorite(self, selection, value):
+        """
+        Mark the selected searches as favorites (or not).
+        
+        Returns:
+            int: Number of searches changed
+        """
+        changed = 0
+        # Only rows that actually change, so the favorites counter stays exact
+        pending = (SearchHistory.is_favorite.isnot(True),) if value else (SearchHistory.is_favorite.is_(True),)
+        
+        try:
+            for rows in self._chunks(selection, pending):
+                # Re-checked in the UPDATE: a row flipped by another request since the SELECT is not counted twice
+                count = db.session.query(SearchHistory)\
+                    .filter(SearchHistory.id.in_([row.id for row in rows]), *pending)\
+                    .update({SearchHistory.is_favorite: value}, synchronize_session=False)
+                UserCounters.adjust(selection.user_id, favorites=count if value else -count)
+                db.session.commit()
+                changed += count
+        except Exception:
+            db.session.rollback()
+            raise
+        return changed
+    
+    def delete(self, selection):
+        """
+        Delete the selected searches.
+        
+        Returns:
+            int: Number of searches deleted
+        """
+        deleted = 0
+        columns = (SearchHistory.id, SearchHistory.user_id, SearchHistory.query, SearchHistory.search_type,
+                   SearchHistory.created_at, SearchHistory.is_favorite, SearchHistory.results_hash,
+                   SearchHistory.run_count)
+        
+        try:
+            for rows in self._chunks(selection, columns=columns):
+                db.session.query(SearchHistory)\
+                    .filter(SearchHistory.id.in_([row.id for row in rows]))\
+                    .delete(synchronize_session=False)
+                UserCounters.adjust(
+                    selection.user_id,
+                    searches=-sum(row.run_count or 1 for row in rows),
+                    favorites=-sum(1 for row in rows if row.is_favorite)
+                )
+                UserStatsRollup().remove_searches([row._asdict() for row in rows])
+                ResultBlobStore().release(row.results_hash for row in rows)
+                db.session.commit()
+                deleted += len(rows)
+            
+            # Archived rows hold their results inline, so there are no blobs to release
+            archived = [archived_row_for_stats(row)
+                        for row in HistoryArchive().remove_rows(selection.user_id, selection.matches)]
+            if archived:
+                UserCounters.adjust(
+                    selection.user_id,
+                    searches=-sum(row['run_count'] for row in archived),
+                    favorites=-sum(1 for row in archived if row.get('is_favorite'))
+                )
+                UserStatsRollup().remove_searches(archived)
+                db.session.commit()
+                deleted += len(archived)
+            
+            if deleted:
+                UserCounters.refresh_last_search_at(selection.user_id)
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return deleted
+
+def _parse_timestamp(value, name):
+    if value in (None, ''):
+        return None
+    try:
+        timestamp = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 timestamp")
+    # Stored timestamps are naive UTC
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
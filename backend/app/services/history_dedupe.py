@@ -0,0 +1,259 @@
+import hashlib
+import json
+from collections import Counter
+
+from sqlalchemy import bindparam, case
+
+from app import db
+from app.models.search_history import SearchHistory
+from app.models.user import User
+from app.services.result_blobs import ResultBlobStore
+from app.services.search_service import canonicalize_query
+from app.services.user_counters import UserCounters
+
+def dedupe_key(query, filters):
+    """Hash of the canonical query and its filters; equal for repeats of the same search."""
+    canonical = json.dumps(filters or {}, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(f"{canonicalize_query(query)}\n{canonical}".encode('utf-8')).hexdigest()
+
+class HistoryDeduper:
+    """
+    Store repeated searches as one history row per (user, query, filters).
+    
+    Used by the history writer when HISTORY_DEDUPE is enabled. A repeat bumps
+    the existing row's `run_count` and `last_run_at` and replaces its results
+    with the latest ones; `created_at` stays the time of the first run, so the
+    row keeps its partition, while listings order by `last_run_at` (see
+    `SearchHistory.order_key`). Guest searches are not deduplicated.
+    
+    On SQLite and unpartitioned PostgreSQL the write is a single
+    INSERT ... ON CONFLICT DO UPDATE against `ux_search_history_dedupe`. A
+    partitioned table cannot have that unique index (it would have to include
+    created_at), so there existing rows are locked and updated and new keys
+    inserted; concurrent writers can then race into duplicates, which
+    `compact` merges.
+    """
+    
+    def write(self, rows):
+        """
+        Upsert a batch of new history rows (inside the caller's transaction).
+        
+        Args:
+            rows: search_history column dicts, one per search run
+        """
+        merged = self.merge(rows)
+        keyed = [row for row in merged if row['dedupe_key']]
+        existing = self._lock_existing(keyed)
+        
+        blobs = ResultBlobStore()
+        blobs.store_rows(merged)
+        
+        table = SearchHistory.__table__
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite') and not self._is_partitioned():
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(table).values(merged)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['user_id', 'dedupe_key'],
+                index_where=table.c.dedupe_key.isnot(None),
+                set_={
+                    'run_count': table.c.run_count + stmt.excluded.run_count,
+                    'last_run_at': case(
+                        (table.c.last_run_at.is_(None), stmt.excluded.last_run_at),
+                        (table.c.last_run_at < stmt.excluded.last_run_at, stmt.excluded.last_run_at),
+                        else_=table.c.last_run_at
+                    ),
+                    'results_hash': stmt.excluded.results_hash,
+                    # A row written before blobs existed may still hold inline results
+                    'results': None,
+                    'result_count': stmt.excluded.result_count,
+                    'execution_time': stmt.excluded.execution_time
+                }
+            ))
+        else:
+            updates = [row for row in merged if (row['user_id'], row['dedupe_key']) in existing]
+            inserts = [row for row in merged if (row['user_id'], row['dedupe_key']) not in existing]
+            if updates:
+                db.session.execute(
+                    table.update()
+                    .where(table.c.id == bindparam('row_id'))
+                    .values(
+                        run_count=table.c.run_count + bindparam('runs'),
+                        last_run_at=case(
+                            (table.c.last_run_at.is_(None), bindparam('ran_at')),
+                            (table.c.last_run_at < bindparam('ran_at'), bindparam('ran_at')),
+                            else_=table.c.last_run_at
+                        ),
+                        results_hash=bindparam('digest'),
+                        results=None,
+                        result_count=bindparam('count'),
+                        execution_time=bindparam('elapsed')
+                    ),
+                    [{'row_id': existing[(row['user_id'], row['dedupe_key'])][0], 'runs': row['run_count'],
+                      'ran_at': row['last_run_at'], 'digest': row['results_hash'],
+                      'count': row.get('result_count'), 'elapsed': row.get('execution_time')}
+                     for row in updates]
+                )
+            if inserts:
+                db.session.execute(table.insert().values(inserts))
+        
+        # The updated rows no longer reference their previous results
+        blobs.release(digest for _, digest in existing.values())
+    
+    @staticmethod
+    def merge(rows):
+        """
+        Collapse repeats within a batch into one row per dedupe key.
+        
+        Returns:
+            list: Rows with dedupe_key, run_count and last_run_at set
+        """
+        merged = {}
+        for row in sorted(rows, key=lambda row: row['created_at']):
+            row = dict(row, run_count=1, last_run_at=row['created_at'])
+            row['dedupe_key'] = dedupe_key(row['query'], row.get('filters')) if row.get('user_id') else None
+            if row['dedupe_key'] is None:
+                merged[id(row)] = row
+                continue
+            group = (row['user_id'], row['dedupe_key'])
+            first = merged.get(group)
+            if first is None:
+                merged[group] = row
+            else:
+                # Keep the first run's created_at; everything else comes from the latest run
+                merged[group] = dict(row, created_at=first['created_at'],
+                                     run_count=first['run_count'] + 1)
+        return list(merged.values())
+    
+    @staticmethod
+    def _lock_existing(rows):
+        """Map (user_id, dedupe_key) -> (id, results_hash) for rows already stored, locked FOR UPDATE."""
+        if not rows:
+            return {}
+        result = db.session.query(
+            SearchHistory.id, SearchHistory.user_id, SearchHistory.dedupe_key, SearchHistory.results_hash
+        ).filter(
+            SearchHistory.user_id.in_({row['user_id'] for row in rows}),
+            SearchHistory.dedupe_key.in_({row['dedupe_key'] for row in rows})
+        ).order_by(SearchHistory.id)\
+         .with_for_update()\
+         .all()
+        wanted = {(row['user_id'], row['dedupe_key']) for row in rows}
+        return {(row.user_id, row.dedupe_key): (row.id, row.results_hash)
+                for row in result if (row.user_id, row.dedupe_key) in wanted}
+    
+    @staticmethod
+    def _is_partitioned():
+        from app.services.history_partitions import HistoryPartitionManager
+        return HistoryPartitionManager().is_partitioned()
+    
+    def compact(self, batch_size=200):
+        """
+        Key existing history and merge duplicate rows, a batch of users at a time.
+        
+        For each (user, query, filters) the earliest row is kept: it gets the
+        summed run_count, the latest run time and results (its blob, or its
+        inline results if `migrate_inline` has not moved them yet), and stays a
+        favorite if any duplicate was. Search totals are unchanged; favorites
+        counters and blob refcounts are adjusted in the same transaction.
+        
+        Returns:
+            dict with users processed, rows keyed and duplicate rows removed
+        """
+        report = {'users': 0, 'rows_keyed': 0, 'rows_removed': 0}
+        last_id = 0
+        table = SearchHistory.__table__
+        
+        while True:
+            user_ids = [row.id for row in db.session.query(User.id)
+                        .filter(User.id > last_id)
+                        .order_by(User.id)
+                        .limit(batch_size)
+                        .all()]
+            if not user_ids:
+                return report
+            last_id = user_ids[-1]
+            
+            groups = {}
+            for row in db.session.query(
+                SearchHistory.id, SearchHistory.user_id, SearchHistory.query, SearchHistory.filters,
+                SearchHistory.dedupe_key, SearchHistory.run_count, SearchHistory.last_run_at,
+                SearchHistory.created_at, SearchHistory.is_favorite, SearchHistory.results_hash,
+                SearchHistory.result_count, SearchHistory.execution_time
+            ).filter(SearchHistory.user_id.in_(user_ids))\
+             .order_by(SearchHistory.user_id, SearchHistory.created_at, SearchHistory.id)\
+             .yield_per(1000):
+                key = row.dedupe_key or dedupe_key(row.query, row.filters)
+                groups.setdefault((row.user_id, key), []).append(row)
+            
+            removed, keyed, merged, released = [], [], [], Counter()
+            favorites = Counter()
+            for (user_id, key), group in groups.items():
+                keep = group[0]
+                if len(group) == 1 and keep.dedupe_key == key:
+                    continue
+                latest = max(group, key=lambda row: (row.last_run_at or row.created_at, row.id))
+                is_favorite = any(row.is_favorite for row in group)
+                favorites[user_id] += int(is_favorite) - sum(1 for row in group if row.is_favorite)
+                released.update(row.results_hash for row in group if row.results_hash)
+                if latest.results_hash:
+                    released[latest.results_hash] -= 1
+                removed.extend(row.id for row in group[1:])
+                update = {
+                    'row_id': keep.id,
+                    'key': key,
+                    'runs': sum(row.run_count or 1 for row in group),
+                    'ran_at': latest.last_run_at or latest.created_at,
+                    'favorite': is_favorite,
+                    'digest': latest.results_hash,
+                    'count': latest.result_count,
+                    'elapsed': latest.execution_time
+                }
+                if latest.id == keep.id:
+                    keyed.append(update)
+                else:
+                    # The kept row takes the latest run's results, blob or inline, in place of its own
+                    update['latest_id'] = latest.id
+                    merged.append(update)
+            
+            # Rows migrate_inline has not moved to blobs yet keep their results inline
+            inline_ids = [update['latest_id'] for update in merged if not update['digest']]
+            inline = {}
+            for start in range(0, len(inline_ids), 1000):
+                inline.update(db.session.query(SearchHistory.id, SearchHistory.results_inline)
+                              .filter(SearchHistory.id.in_(inline_ids[start:start + 1000])))
+            for update in merged:
+                update['inline'] = inline.get(update.pop('latest_id'))
+            
+            try:
+                # Delete before keying the survivors so the unique index never sees two rows per key
+                for start in range(0, len(removed), 1000):
+                    db.session.execute(table.delete().where(table.c.id.in_(removed[start:start + 1000])))
+                values = dict(dedupe_key=bindparam('key'), run_count=bindparam('runs'),
+                              last_run_at=bindparam('ran_at'), is_favorite=bindparam('favorite'),
+                              results_hash=bindparam('digest'), result_count=bindparam('count'),
+                              execution_time=bindparam('elapsed'))
+                if keyed:
+                    db.session.execute(table.update().where(table.c.id == bindparam('row_id')).values(**values),
+                                       keyed)
+                if merged:
+                    db.session.execute(
+                        table.update()
+                        .where(table.c.id == bindparam('row_id'))
+                        .values(results=bindparam('inline'), **values),
+                        merged
+                    )
+                for user_id, delta in favorites.items():
+                    UserCounters.adjust(user_id, favorites=delta)
+                ResultBlobStore().release((+released).elements())
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            
+            report['users'] += len(user_ids)
+            report['rows_keyed'] += len(keyed) + len(merged)
+            report['rows_removed'] += len(removed)
@@ -0,0 +1,405 @@
+import fcntl
+import gzip
+import json
+import os
+import re
+import shutil
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from flask import current_app
+from sqlalchemy import text
+
+from app import db
+from app.models.search_result_blob import SearchResultBlob
+from app.services.result_blobs import ResultBlobStore
+from app.utils.cache_backends import CacheBackendError, get_cache_backend
+
+PARTITION_NAME = re.compile(r'^search_history_p(\d{4})_(\d{2})$')
+
+# Columns written to the archive, in order
+ARCHIVE_COLUMNS = ('id', 'user_id', 'query', 'filters', 'results', 'results_hash', 'result_count',
+                   'search_type', 'execution_time', 'session_id', 'ip_address', 'is_favorite', 'run_count',
+                   'last_run_at', 'created_at')
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month):
+    return f"search_history_p{month:%Y_%m}"
+
+class HistoryArchive:
+    """
+    Archived search history on local disk, one pair of files per month.
+    
+    `search_history_YYYY_MM.ndjson.gz` holds one gzip member per user with
+    that user's rows as NDJSON, newest first; the `.index.json` sidecar maps
+    user IDs to the byte range of their member, so reading one user's
+    archived history decompresses only their rows.
+    
+    Deleting a user's archived rows rewrites only their member (the rest of
+    the file is copied as is). An flock on the directory's `.lock` file
+    keeps readers from seeing a data file and index that don't match.
+    """
+    
+    def __init__(self, directory=None):
+        self.directory = directory or current_app.config.get('HISTORY_ARCHIVE_DIR', 'archive')
+    
+    def _path(self, month, suffix):
+        return os.path.join(self.directory, f"search_history_{month:%Y_%m}{suffix}")
+    
+    @contextmanager
+    def _locked(self, exclusive=False):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    
+    def months(self):
+        """Archived months, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        months = []
+        for name in os.listdir(self.directory):
+            match = re.match(r'^search_history_(\d{4})_(\d{2})\.index\.json$', name)
+            if match:
+                months.append(date(int(match.group(1)), int(match.group(2)), 1))
+        return sorted(months, reverse=True)
+    
+    def write(self, month, rows):
+        """
+        Write a month's rows, which must be ordered by user_id, then newest first.
+        
+        Returns:
+            int: Number of rows written
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        data_path = self._path(month, '.ndjson.gz')
+        index = {}
+        written = 0
+        current_user, member, start = object(), None, 0
+        
+        with open(data_path + '.tmp', 'wb') as out:
+            for row in rows:
+                if row['user_id'] != current_user:
+                    if member is not None:
+                        member.close()
+                        index[str(current_user)] = [start, out.tell() - start]
+                    current_user, start = row['user_id'], out.tell()
+                    member = gzip.GzipFile(fileobj=out, mode='wb')
+                member.write(_encode_row(row))
+                written += 1
+            if member is not None:
+                member.close()
+                index[str(current_user)] = [start, out.tell() - start]
+            out.flush()
+            os.fsync(out.fileno())
+        
+        self._replace(month, index)
+        return written
+    
+    def _replace(self, month, index):
+        """Swap in a month's `.tmp` data file with its index."""
+        with open(self._path(month, '.index.json.tmp'), 'w') as out:
+            json.dump(index, out)
+        with self._locked(exclusive=True):
+            os.replace(self._path(month, '.ndjson.gz.tmp'), self._path(month, '.ndjson.gz'))
+            # The index is written last: a month is only visible once both files are complete
+            os.replace(self._path(month, '.index.json.tmp'), self._path(month, '.index.json'))
+    
+    def read_user(self, month, user_id):
+        """Get a user's archived rows for a month, newest first."""
+        return self.read_users(month, [user_id]).get(user_id, [])
+    
+    def read_users(self, month, user_ids):
+        """Map each of `user_ids` with archived rows in a month to those rows, newest first."""
+        users = {}
+        with self._locked():
+            with open(self._path(month, '.index.json')) as f:
+                index = json.load(f)
+            entries = [(user_id, index[str(user_id)]) for user_id in user_ids if str(user_id) in index]
+            if not entries:
+                return users
+            with open(self._path(month, '.ndjson.gz'), 'rb') as f:
+                for user_id, (start, length) in sorted(entries, key=lambda entry: entry[1][0]):
+                    f.seek(start)
+                    users[user_id] = _decode_member(f.read(length))
+        return users
+    
+    def iter_user(self, user_id):
+        """Yield all of a user's archived rows, newest first."""
+        for month in self.months():
+            yield from self.read_user(month, user_id)
+    
+    def iter_users(self, user_ids):
+        """Yield the archived rows of a batch of users, month by month."""
+        for month in self.months():
+            for rows in self.read_users(month, user_ids).values():
+                yield from rows
+    
+    def remove_rows(self, user_id, predicate=None):
+        """
+        Delete a user's archived rows, rewriting each month that has any.
+        
+        Args:
+            user_id: Owner of the rows
+            predicate: Only delete rows (dicts) for which this returns True
+        
+        Returns:
+            list of the deleted row dicts
+        """
+        removed = []
+        for month in self.months():
+            # One rewrite of a month at a time, across processes; readers wait only for the swap
+            with self._locked(exclusive=True):
+                removed.extend(self._remove_from_month(month, user_id, predicate))
+        return removed
+    
+    def _remove_from_month(self, month, user_id, predicate):
+        data_path = self._path(month, '.ndjson.gz')
+        with open(self._path(month, '.index.json')) as f:
+            index = json.load(f)
+        entry = index.get(str(user_id))
+        if not entry:
+            return []
+        start, length = entry
+        
+        with open(data_path, 'rb') as src:
+            src.seek(start)
+            rows = _decode_member(src.read(length))
+            removed = [row for row in rows if predicate is None or predicate(row)]
+            if not removed:
+                return []
+            removed_ids = {row['id'] for row in removed}
+            kept = [row for row in rows if row['id'] not in removed_ids]
+            
+            with open(data_path + '.tmp', 'wb') as out:
+                src.seek(0)
+                _copy_bytes(src, out, start)
+                if kept:
+                    with gzip.GzipFile(fileobj=out, mode='wb') as member:
+                        for row in kept:
+                            member.write(_encode_row(row))
+                new_length = out.tell() - start
+                src.seek(start + length)
+                shutil.copyfileobj(src, out)
+                out.flush()
+                os.fsync(out.fileno())
+        
+        del index[str(user_id)]
+        for other in index.values():
+            if other[0] > start:
+                other[0] += new_length - length
+        if kept:
+            index[str(user_id)] = [start, new_length]
+        
+        if index:
+            with open(self._path(month, '.index.json.tmp'), 'w') as out:
+                json.dump(index, out)
+            os.replace(data_path + '.tmp', data_path)
+            os.replace(self._path(month, '.index.json.tmp'), self._path(month, '.index.json'))
+        else:
+            os.remove(self._path(month, '.index.json'))
+            os.remove(data_path)
+            os.remove(data_path + '.tmp')
+        return removed
+    
+    def read_page(self, user_id, limit, before=None, terms=None, by_last_run=False):
+        """
+        Get up to `limit` archived rows of a user older than a keyset position.
+        
+        Args:
+            user_id: Owner of the searches
+            limit: Maximum number of rows
+            before: (timestamp, id) position to continue after, or None
+            terms: Only rows whose query contains all of these lowercase words
+            by_last_run: Order by when rows last ran (see `SearchHistory.order_key`)
+        
+        Returns:
+            list of row dicts, newest first
+        """
+        rows = []
+        for month in self.months():
+            # Rows never ran before they were created, so later months are all past `before`
+            if before and month > before[0].date():
+                continue
+            for row in self.read_user(month, user_id):
+                if before and archived_position(row, by_last_run) >= tuple(before):
+                    continue
+                if terms and not all(term in row['query'].lower() for term in terms):
+                    continue
+                rows.append(row)
+                if len(rows) >= limit and not by_last_run:
+                    return rows
+        
+        # A repeat can have last run after rows created in later months, so sort all candidates
+        rows.sort(key=lambda row: archived_position(row, by_last_run), reverse=True)
+        return rows[:limit]
+
+def _encode_row(row):
+    return (json.dumps(row, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+
+def _decode_member(data):
+    return [json.loads(line) for line in gzip.decompress(data).decode('utf-8').splitlines()]
+
+def _copy_bytes(src, out, length, chunk_size=1024 * 1024):
+    while length > 0:
+        chunk = src.read(min(chunk_size, length))
+        if not chunk:
+            break
+        out.write(chunk)
+        length -= len(chunk)
+
+def archived_position(row, by_last_run=False):
+    """An archived row's (timestamp, id) position, as `SearchHistory.position` gives it."""
+    ordered_at = (by_last_run and row.get('last_run_at')) or row['created_at']
+    return datetime.fromisoformat(ordered_at), row['id']
+
+def archived_row_for_stats(row):
+    """An archived row in the shape UserCounters and UserStatsRollup take."""
+    return dict(row, created_at=datetime.fromisoformat(row['created_at']),
+                run_count=row.get('run_count') or 1)
+
+class HistoryPartitionManager:
+    """
+    Maintain monthly range partitions of search_history on PostgreSQL.
+    
+    Partitions are created HISTORY_PARTITION_PREMAKE_MONTHS ahead. With
+    HISTORY_RETENTION_MONTHS set, partitions older than that are detached,
+    written to the HistoryArchive and dropped; their result-blob references
+    are released since the archive holds the results inline. On other
+    databases, or if search_history is not partitioned (see init.sql),
+    every operation is a no-op.
+    """
+    
+    LOCK_KEY = 'history_partitions:lock'
+    
+    def __init__(self):
+        config = current_app.config
+        self.premake_months = config.get('HISTORY_PARTITION_PREMAKE_MONTHS', 3)
+        self.retention_months = config.get('HISTORY_RETENTION_MONTHS', 0)
+        self.batch_size = config.get('EXPORT_BATCH_SIZE', 500)
+    
+    def is_partitioned(self):
+        if db.session.get_bind().dialect.name != 'postgresql':
+            return False
+        return bool(db.session.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('search_history'))"
+        )).scalar())
+    
+    def ensure_partitions(self, today=None):
+        """
+        Create partitions for the current month and the months ahead.
+        
+        Returns:
+            list: Names of the partitions that now exist for that range
+        """
+        if not self.is_partitioned():
+            return []
+        month = (today or datetime.utcnow().date()).replace(day=1)
+        names = []
+        for offset in range(self.premake_months + 1):
+            start = _add_months(month, offset)
+            name = partition_name(start)
+            db.session.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF search_history "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{_add_months(start, 1).isoformat()}')"
+            ))
+            names.append(name)
+        db.session.commit()
+        return names
+    
+    def _partitions(self):
+        """Map month -> (name, attached) for monthly partitions, including detached leftovers."""
+        rows = db.session.execute(text(
+            "SELECT c.relname, EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid "
+            "AND i.inhparent = 'search_history'::regclass) AS attached "
+            "FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE c.relkind = 'r' AND n.nspname = current_schema() "
+            "AND c.relname ~ '^search_history_p[0-9]{4}_[0-9]{2}$'"
+        ))
+        partitions = {}
+        for name, attached in rows:
+            match = PARTITION_NAME.match(name)
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = (name, attached)
+        return partitions
+    
+    def archive_expired(self, today=None):
+        """
+        Archive and drop partitions older than the retention period.
+        
+        Returns:
+            dict: Partition name -> number of rows archived
+        """
+        if not self.retention_months or not self.is_partitioned():
+            return {}
+        cutoff = _add_months((today or datetime.utcnow().date()).replace(day=1), -self.retention_months)
+        archived = {}
+        for month, (name, attached) in sorted(self._partitions().items()):
+            if month < cutoff:
+                archived[name] = self._archive_partition(month, name, attached)
+        return archived
+    
+    def _archive_partition(self, month, name, attached):
+        if attached:
+            # Detaching first keeps the parent table locked only briefly
+            db.session.execute(text(f"ALTER TABLE search_history DETACH PARTITION {name}"))
+            db.session.commit()
+        
+        released = Counter()
+        blobs = {}
+        
+        def rows():
+            result = db.session.execute(
+                text(f"SELECT {', '.join(ARCHIVE_COLUMNS)} FROM {name} "
+                     f"ORDER BY user_id NULLS LAST, created_at DESC, id DESC"),
+                execution_options={'stream_results': True, 'yield_per': self.batch_size}
+            )
+            for row in result.mappings():
+                row = dict(row)
+                digest = row.pop('results_hash')
+                if digest:
+                    released[digest] += 1
+                    if digest not in blobs:
+                        if len(blobs) >= 1000:
+                            blobs.clear()
+                        blob = db.session.get(SearchResultBlob, digest)
+                        blobs[digest] = blob.get_results() if blob else None
+                    row['results'] = blobs[digest]
+                row['created_at'] = row['created_at'].isoformat()
+                if row['last_run_at'] is not None:
+                    row['last_run_at'] = row['last_run_at'].isoformat()
+                yield row
+        
+        written = HistoryArchive().write(month, rows())
+        
+        db.session.execute(text(f"DROP TABLE {name}"))
+        ResultBlobStore().release(released.elements())
+        db.session.commit()
+        current_app.logger.info(f"Archived {written} rows from {name}")
+        return written
+    
+    @classmethod
+    def run_scheduled(cls):
+        """Create upcoming partitions and archive expired ones; one process at a time."""
+        cache = get_cache_backend()
+        try:
+            if not cache.add(cls.LOCK_KEY, '1', ttl=3600):
+                return
+        except CacheBackendError:
+            return
+        
+        try:
+            manager = cls()
+            manager.ensure_partitions()
+            manager.archive_expired()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"History partition maintenance failed: {str(e)}")
+        finally:
+            cache.delete(cls.LOCK_KEY)
@@ -0,0 +1,257 @@
+import atexit
+import json
+import threading
+from collections import deque
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy.exc import DisconnectionError, InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+
+from app import db
+from app.models.search_history import SearchHistory
+from app.services.result_blobs import ResultBlobStore
+from app.services.user_counters import UserCounters
+from app.services.user_stats import UserStatsRollup
+from app.utils.background import PeriodicTask
+from app.utils.cache_backends import CacheBackendError, get_cache_backend
+
+class HistoryWriter:
+    """
+    Write-behind buffer for search history.
+    
+    Searches are appended to a buffer and flushed in bulk multi-row INSERTs
+    when HISTORY_FLUSH_SIZE rows are buffered or every HISTORY_FLUSH_INTERVAL
+    seconds, so recording history costs the request path nothing.
+    
+    HISTORY_BUFFER selects where rows wait for a flush:
+    - 'memory': in-process queue. A crash loses at most the rows buffered
+      since the last flush, and the queue is capped at HISTORY_BUFFER_MAX
+      rows (oldest dropped) if the database is unavailable.
+    - 'redis': a Redis list shared by all processes. Rows survive process
+      crashes; a crash between INSERT and trim can replay a batch.
+    - 'sync': insert immediately (tests and debugging).
+    
+    A batch the database rejects is split in halves until the rows that fail
+    on their own (e.g. a user purged since the search) are isolated; those
+    are dead-lettered so one bad row cannot block the buffer. Batches that
+    fail because the database is unreachable stay buffered and are retried.
+    Dead-lettered rows go to the DEAD_LETTER_KEY list in 'redis' mode and to
+    `dead_letters` otherwise, capped at HISTORY_DEAD_LETTER_MAX rows.
+    """
+    
+    REDIS_KEY = 'history_buffer'
+    FLUSH_LOCK_KEY = 'history_buffer:flush_lock'
+    DEAD_LETTER_KEY = 'history_buffer:dead'
+    
+    def __init__(self, app):
+        self.app = app
+        config = app.config
+        self.mode = config.get('HISTORY_BUFFER', 'memory')
+        self.flush_size = config.get('HISTORY_FLUSH_SIZE', 100)
+        self.max_buffered = config.get('HISTORY_BUFFER_MAX', 10000)
+        self.dropped = 0
+        self.dead_letter_max = config.get('HISTORY_DEAD_LETTER_MAX', 1000)
+        self.dead_lettered = 0
+        self.dead_letters = deque(maxlen=self.dead_letter_max)
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self.task = PeriodicTask(app, 'history-writer', config.get('HISTORY_FLUSH_INTERVAL', 2.0), self.flush)
+        atexit.register(self.shutdown)
+    
+    def append(self, row):
+        """
+        Queue a search history row for insertion.
+        
+        Args:
+            row: Column values for search_history (created_at is set if missing)
+        """
+        row.setdefault('created_at', datetime.utcnow())
+        
+        if self.mode == 'sync' or self._closed:
+            with self.app.app_context():
+                self._insert([row])
+            return
+        
+        if self.mode == 'redis':
+            from app import redis_client
+            try:
+                buffered = redis_client.rpush(self.REDIS_KEY, json.dumps(row, default=_json_default))
+            except Exception as e:
+                self.app.logger.error(f"Failed to buffer search history in Redis: {str(e)}")
+                with self.app.app_context():
+                    self._insert([row])
+                return
+        else:
+            with self._lock:
+                if len(self._buffer) >= self.max_buffered:
+                    self._buffer.popleft()
+                    self.dropped += 1
+                self._buffer.append(row)
+                buffered = len(self._buffer)
+        
+        self.task.ensure_started()
+        if buffered >= self.flush_size:
+            self.task.wake()
+    
+    def flush(self):
+        """
+        Flush buffered rows in batches of HISTORY_FLUSH_SIZE.
+        
+        Returns:
+            int: Number of rows written
+        """
+        with self._flush_lock:
+            if self.mode == 'redis':
+                return self._flush_redis()
+            return self._flush_memory()
+    
+    def _flush_memory(self):
+        written = 0
+        while True:
+            with self._lock:
+                batch = [self._buffer.popleft() for _ in range(min(self.flush_size, len(self._buffer)))]
+            if not batch:
+                return written
+            consumed, error = self._write(batch)
+            written += consumed
+            if error is not None:
+                # Put the unwritten rows back for the next flush, keeping the buffer bounded
+                with self._lock:
+                    self._buffer.extendleft(reversed(batch[consumed:]))
+                    while len(self._buffer) > self.max_buffered:
+                        self._buffer.popleft()
+                        self.dropped += 1
+                raise error
+    
+    def _flush_redis(self):
+        from app import redis_client
+        cache = get_cache_backend()
+        try:
+            # Only one process flushes the shared list at a time
+            if not cache.add(self.FLUSH_LOCK_KEY, '1', ttl=60):
+                return 0
+        except CacheBackendError:
+            return 0
+        
+        written = 0
+        try:
+            while True:
+                raw_rows = redis_client.lrange(self.REDIS_KEY, 0, self.flush_size - 1)
+                if not raw_rows:
+                    return written
+                batch = []
+                for raw in raw_rows:
+                    try:
+                        row = json.loads(raw)
+                        row['created_at'] = datetime.fromisoformat(row['created_at'])
+                    except (ValueError, TypeError, KeyError) as e:
+                        row = {'raw': raw if isinstance(raw, str) else raw.decode('utf-8', 'replace')}
+                        row['_error'] = f"Unreadable buffered row: {str(e)}"
+                    batch.append(row)
+                
+                consumed, error = self._write(batch)
+                # Written and dead-lettered rows leave the list; the rest are retried next flush
+                redis_client.ltrim(self.REDIS_KEY, consumed, -1)
+                written += consumed
+                if error is not None:
+                    raise error
+        finally:
+            cache.delete(self.FLUSH_LOCK_KEY)
+    
+    def _write(self, rows):
+        """
+        Insert a batch, dead-lettering the rows that fail on their own.
+        
+        Segments that fail are bisected, in order, so the rows handled always
+        form a prefix of the batch.
+        
+        Returns:
+            tuple of (rows written or dead-lettered, the transient error that
+            stopped the write or None)
+        """
+        segments = [rows]
+        consumed = 0
+        while segments:
+            segment = segments.pop()
+            if len(segment) == 1 and '_error' in segment[0]:
+                self._dead_letter(segment[0], segment[0]['_error'])
+                consumed += 1
+                continue
+            try:
+                self._insert(segment)
+            except Exception as e:
+                if _is_transient(e):
+                    return consumed, e
+                if len(segment) > 1:
+                    middle = len(segment) // 2
+                    segments.append(segment[middle:])
+                    segments.append(segment[:middle])
+                    continue
+                self._dead_letter(segment[0], str(e))
+            consumed += len(segment)
+        return consumed, None
+    
+    def _dead_letter(self, row, reason):
+        self.dead_lettered += 1
+        self.app.logger.error(f"Dead-lettered search history row of user {row.get('user_id')}: {reason}")
+        entry = {'row': row, 'reason': reason, 'failed_at': datetime.utcnow()}
+        if self.mode == 'redis':
+            from app import redis_client
+            try:
+                redis_client.rpush(self.DEAD_LETTER_KEY, json.dumps(entry, default=_json_default))
+                redis_client.ltrim(self.DEAD_LETTER_KEY, -self.dead_letter_max, -1)
+                return
+            except Exception as e:
+                self.app.logger.error(f"Failed to dead-letter search history row in Redis: {str(e)}")
+        self.dead_letters.append(entry)
+    
+    def _insert(self, rows):
+        """Insert rows with a single multi-row INSERT and update user counters and rollups in one transaction."""
+        # Writers fill in blob hashes and dedupe keys; work on copies so a rolled-back batch can be retried as is
+        rows = [dict(row) for row in rows]
+        try:
+            if self.app.config.get('HISTORY_DEDUPE'):
+                from app.services.history_dedupe import HistoryDeduper
+                HistoryDeduper().write(rows)
+            else:
+                ResultBlobStore().store_rows(rows)
+                db.session.execute(SearchHistory.__table__.insert().values(rows))
+            # Counters and rollups count runs, so they take every row either way
+            UserCounters.apply_searches(rows)
+            UserStatsRollup().apply_searches(rows)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.app.logger.error(f"Failed to write {len(rows)} search history rows: {str(e)}")
+            raise
+    
+    def shutdown(self, timeout=10):
+        """Stop the flusher and write out everything still buffered."""
+        if self._closed:
+            return
+        self._closed = True
+        self.task.stop(timeout)
+        with self.app.app_context():
+            try:
+                self.flush()
+            except Exception:
+                pass
+        if self.dropped:
+            self.app.logger.warning(f"Dropped {self.dropped} search history rows")
+
+def _is_transient(error):
+    """Whether a write failed because the database or cache was unreachable rather than because of the rows."""
+    if isinstance(error, (OperationalError, InterfaceError, DisconnectionError, PoolTimeoutError, CacheBackendError)):
+        return True
+    return bool(getattr(error, 'connection_invalidated', False))
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def get_history_writer():
+    """Get the history writer for the current application."""
+    return current_app.extensions['history_writer']
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import time
+
+from flask import current_app
+
+from app.utils.cache_backends import CacheBackendError, get_cache_backend
+
+class IdempotencyClaim:
+    """Outcome of claiming an idempotency key."""
+    
+    CLAIMED = 'claimed'        # Caller owns the key and must complete or release it
+    REPLAY = 'replay'          # A stored response is available
+    MISMATCH = 'mismatch'      # Key was reused with a different request body
+    IN_PROGRESS = 'in_progress'  # Original request did not finish within the wait timeout
+    UNAVAILABLE = 'unavailable'  # Cache backend is down; proceed without idempotency
+    
+    def __init__(self, state, record_key=None, fingerprint=None, response=None, status_code=None):
+        self.state = state
+        self.record_key = record_key
+        self.fingerprint = fingerprint
+        self.response = response
+        self.status_code = status_code
+
+class IdempotencyStore:
+    """
+    Short-lived records of in-flight and completed requests keyed by Idempotency-Key.
+    
+    A retry of a request that is still running waits for it to finish; a
+    retry of a finished request replays the stored response. Keys are scoped
+    so that different users or sessions never share records.
+    """
+    
+    def __init__(self):
+        config = current_app.config
+        self.cache = get_cache_backend()
+        self.ttl = config.get('IDEMPOTENCY_TTL', 600)
+        self.lock_ttl = config.get('IDEMPOTENCY_LOCK_TTL', 120)
+        self.wait_timeout = config.get('IDEMPOTENCY_WAIT_TIMEOUT', 30)
+        self.poll_interval = 0.1
+    
+    @staticmethod
+    def fingerprint(payload):
+        """Hash a request payload so reused keys with different bodies are detected."""
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+    
+    def claim(self, scope, idempotency_key, payload):
+        """
+        Claim an idempotency key, waiting for an in-flight original if needed.
+        
+        Args:
+            scope: Owner of the key, e.g. 'user:42' or 'session:abc'
+            idempotency_key: Client supplied Idempotency-Key header value
+            payload: Request payload used to fingerprint the request
+        
+        Returns:
+            IdempotencyClaim
+        """
+        key_hash = hashlib.sha256(idempotency_key.encode()).hexdigest()
+        record_key = f"idempotency:{scope}:{key_hash}"
+        fingerprint = self.fingerprint(payload)
+        in_progress = json.dumps({'state': 'in_progress', 'fingerprint': fingerprint})
+        deadline = time.monotonic() + self.wait_timeout
+        interval = self.poll_interval
+        
+        try:
+            while True:
+                if self.cache.add(record_key, in_progress, ttl=self.lock_ttl):
+                    return IdempotencyClaim(IdempotencyClaim.CLAIMED, record_key, fingerprint)
+                
+                raw = self.cache.get(record_key)
+                if raw is None:
+                    # Released or expired between add and get; try to claim again
+                    continue
+                
+                record = json.loads(raw)
+                if record.get('fingerprint') != fingerprint:
+                    return IdempotencyClaim(IdempotencyClaim.MISMATCH, record_key, fingerprint)
+                
+                if record.get('state') == 'completed':
+                    return IdempotencyClaim(
+                        IdempotencyClaim.REPLAY, record_key, fingerprint,
+                        response=record['response'], status_code=record['status_code']
+                    )
+                
+                if time.monotonic() >= deadline:
+                    return IdempotencyClaim(IdempotencyClaim.IN_PROGRESS, record_key, fingerprint)
+                
+                time.sleep(interval)
+                interval = min(interval * 2, 1.0)
+        
+        except (CacheBackendError, json.JSONDecodeError) as e:
+            current_app.logger.error(f"Idempotency store unavailable: {str(e)}")
+            return IdempotencyClaim(IdempotencyClaim.UNAVAILABLE)
+    
+    def complete(self, claim, response, status_code):
+        """Store the response of a claimed request for replay."""
+        try:
+            self.cache.set(claim.record_key, json.dumps({
+                'state': 'completed',
+                'fingerprint': claim.fingerprint,
+                'response': response,
+                'status_code': status_code
+            }), ttl=self.ttl)
+        except (CacheBackendError, TypeError):
+            current_app.logger.error(f"Failed to store idempotent response for {claim.record_key}")
+    
+    def release(self, claim):
+        """Release a claimed key so that a retry runs the request again."""
+        try:
+            self.cache.delete(claim.record_key)
+        except CacheBackendError:
+            current_app.logger.error(f"Failed to release idempotency key {claim.record_key}")
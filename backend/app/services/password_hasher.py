@@ -0,0 +1,122 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+class PasswordHasherBusy(Exception):
+    """Raised when password hashing is saturated or does not finish in time."""
+
+class PasswordHasher:
+    """
+    Password hashing and verification off the request threads.
+    
+    PBKDF2 is deliberately CPU-heavy and holds the GIL, so hashing inline
+    stalls every other request thread of the worker during a login burst.
+    Hashes are computed in a small process pool instead: request threads
+    only wait on a future. At most PASSWORD_HASH_MAX_PENDING hashes are
+    queued or running per worker process; a request that cannot get a slot,
+    or whose hash takes longer than PASSWORD_HASH_TIMEOUT seconds, gets
+    PasswordHasherBusy rather than piling up behind the burst.
+    
+    PASSWORD_HASH_ITERATIONS sets the PBKDF2 cost per environment. Hashes
+    made with other parameters still verify, and `needs_rehash` tells the
+    login route to store a fresh hash. PASSWORD_HASH_WORKERS = 0 hashes
+    inline (tests).
+    """
+    
+    def __init__(self, app):
+        config = app.config
+        self.iterations = config.get('PASSWORD_HASH_ITERATIONS', 600000)
+        self.workers = config.get('PASSWORD_HASH_WORKERS', 2)
+        self.timeout = config.get('PASSWORD_HASH_TIMEOUT', 5)
+        self._slots = threading.BoundedSemaphore(config.get('PASSWORD_HASH_MAX_PENDING', 16))
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+    
+    @property
+    def method(self):
+        """werkzeug hashing method for the configured cost."""
+        return f"pbkdf2:sha256:{self.iterations}"
+    
+    def hash(self, password):
+        """Hash a password with the configured parameters."""
+        return self._run(generate_password_hash, password, self.method)
+    
+    def verify(self, password_hash, password):
+        """Check a password against a stored hash of any supported method."""
+        return self._run(check_password_hash, password_hash, password)
+    
+    def needs_rehash(self, password_hash):
+        """Whether a stored hash was made with parameters other than the configured ones."""
+        return password_hash.split('$', 1)[0] != self.method
+    
+    def warm(self):
+        """Start the pool's processes so the first logins don't pay for spawning them."""
+        if not self.workers:
+            return
+        executor = self._get_executor()
+        futures = [executor.submit(check_password_hash, '', '') for _ in range(self.workers)]
+        for future in futures:
+            future.result(timeout=30)
+    
+    def shutdown(self):
+        """Stop the pool after the hashes in progress finish."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    def _get_executor(self):
+        with self._lock:
+            # A forked worker must not use the pool of the process it was forked from
+            if self._executor is None or self._pid != os.getpid():
+                # Spawned rather than forked: forking a threaded worker can copy held locks
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+                self._pid = os.getpid()
+            return self._executor
+    
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        
+        deadline = time.monotonic() + self.timeout
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PasswordHasherBusy('Too many password hashes in progress')
+        
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._reset()
+            raise PasswordHasherBusy('Password hashing pool failed')
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot stays taken until the hash actually finishes, even if the caller gives up
+        future.add_done_callback(lambda _: self._slots.release())
+        
+        try:
+            return future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeoutError:
+            future.cancel()
+            raise PasswordHasherBusy('Password hashing timed out')
+        except BrokenProcessPool:
+            self._reset()
+            raise PasswordHasherBusy('Password hashing pool failed')
+    
+    def _reset(self):
+        # A pool whose process died rejects all further work; the next call starts a new one
+        with self._lock:
+            self._executor = None
+
+def get_password_hasher():
+    """Get the password hasher for the current application."""
+    return current_app.extensions['password_hasher']
@@ -0,0 +1,179 @@
+import json
+from collections import Counter
+
+from flask import current_app
+from sqlalchemy import bindparam
+
+from app import db
+from app.models.search_history import SearchHistory
+from app.models.search_result_blob import SearchResultBlob
+
+class ResultBlobStore:
+    """
+    Content-addressed storage of search results.
+    
+    Writers replace each row's results with the hash of a shared blob and
+    bump the blob's refcount in the same transaction; deleting history rows
+    must `release` their hashes. `collect_garbage` removes unreferenced
+    blobs and `recount` repairs refcounts after deletes that bypassed
+    `release` (e.g. ON DELETE CASCADE).
+    """
+    
+    def __init__(self):
+        config = current_app.config
+        self.compression = config.get('RESULT_BLOB_COMPRESSION', 'zlib')
+        self.compress_min_bytes = config.get('RESULT_BLOB_COMPRESS_MIN_BYTES', 512)
+    
+    def store_rows(self, rows):
+        """
+        Move the results of rows about to be inserted into blobs.
+        
+        Sets each row's `results_hash` and clears its inline `results`. Must be
+        called inside the transaction that inserts the rows, before the INSERT.
+        
+        Args:
+            rows: search_history column dicts
+        """
+        blobs = {}
+        refs = Counter()
+        for row in rows:
+            results = row.get('results')
+            if results is None:
+                row['results_hash'] = None
+                continue
+            blob = SearchResultBlob.encode(results, self.compression, self.compress_min_bytes)
+            blobs[blob['hash']] = blob
+            refs[blob['hash']] += 1
+            row['results_hash'] = blob['hash']
+            row['results'] = None
+        
+        if blobs:
+            self._add_refs(blobs, refs)
+    
+    def _add_refs(self, blobs, refs):
+        """Insert missing blobs and add `refs` to the refcounts, in hash order to avoid deadlocks."""
+        table = SearchResultBlob.__table__
+        values = [dict(blobs[digest], refcount=refs[digest]) for digest in sorted(blobs)]
+        dialect = db.session.get_bind().dialect.name
+        
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(table).values(values)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['hash'],
+                set_={'refcount': table.c.refcount + stmt.excluded.refcount}
+            ))
+            return
+        
+        existing = {row.hash for row in db.session.query(SearchResultBlob.hash)
+                    .filter(SearchResultBlob.hash.in_(list(blobs)))}
+        missing = [value for value in values if value['hash'] not in existing]
+        if missing:
+            db.session.execute(table.insert().values(missing))
+        if existing:
+            self._change_refcounts({digest: refs[digest] for digest in existing})
+    
+    def release(self, hashes):
+        """
+        Drop one reference per hash (inside the transaction deleting the rows).
+        
+        Args:
+            hashes: results_hash values of deleted history rows (None is ignored)
+        """
+        refs = Counter(digest for digest in hashes if digest)
+        if refs:
+            self._change_refcounts({digest: -count for digest, count in refs.items()})
+    
+    @staticmethod
+    def _change_refcounts(deltas):
+        table = SearchResultBlob.__table__
+        db.session.execute(
+            table.update()
+            .where(table.c.hash == bindparam('digest'))
+            .values(refcount=table.c.refcount + bindparam('delta')),
+            [{'digest': digest, 'delta': delta} for digest, delta in sorted(deltas.items())]
+        )
+    
+    def collect_garbage(self):
+        """
+        Delete blobs no history row references.
+        
+        Returns:
+            int: Number of blobs deleted
+        """
+        referenced = db.session.query(SearchHistory.id)\
+            .filter(SearchHistory.results_hash == SearchResultBlob.hash)\
+            .exists()
+        deleted = db.session.query(SearchResultBlob)\
+            .filter(SearchResultBlob.refcount <= 0, ~referenced)\
+            .delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+    
+    def recount(self):
+        """
+        Recompute every blob's refcount from search_history.
+        
+        Returns:
+            int: Number of blobs whose refcount changed
+        """
+        actual = db.session.query(db.func.count(SearchHistory.id))\
+            .filter(SearchHistory.results_hash == SearchResultBlob.hash)\
+            .scalar_subquery()
+        changed = db.session.query(SearchResultBlob)\
+            .filter(SearchResultBlob.refcount != actual)\
+            .update({SearchResultBlob.refcount: actual}, synchronize_session=False)
+        db.session.commit()
+        return changed
+    
+    def migrate_inline(self, batch_size=500):
+        """
+        Move inline results of existing history rows into shared blobs.
+        
+        Returns:
+            dict with rows migrated, inline bytes moved and blob bytes added
+        """
+        blob_bytes_before = self._stored_bytes()
+        report = {'rows': 0, 'inline_bytes': 0}
+        last_id = 0
+        
+        while True:
+            rows = db.session.query(SearchHistory.id, SearchHistory.results_inline)\
+                .filter(SearchHistory.id > last_id,
+                        SearchHistory.results_hash.is_(None),
+                        SearchHistory.results_inline.isnot(None))\
+                .order_by(SearchHistory.id)\
+                .limit(batch_size)\
+                .all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            
+            batch = [{'id': row.id, 'results': row.results_inline} for row in rows]
+            report['inline_bytes'] += sum(
+                len(json.dumps(row['results'], separators=(',', ':')).encode('utf-8')) for row in batch
+            )
+            self.store_rows(batch)
+            
+            table = SearchHistory.__table__
+            db.session.execute(
+                table.update()
+                .where(table.c.id == bindparam('row_id'))
+                .values(results=None, results_hash=bindparam('digest')),
+                [{'row_id': row['id'], 'digest': row['results_hash']} for row in batch]
+            )
+            db.session.commit()
+            report['rows'] += len(batch)
+        
+        report['blob_bytes_added'] = self._stored_bytes() - blob_bytes_before
+        report['bytes_saved'] = report['inline_bytes'] - report['blob_bytes_added']
+        return report
+    
+    @staticmethod
+    def _stored_bytes():
+        return db.session.query(
+            db.func.coalesce(db.func.sum(db.func.length(SearchResultBlob.data)), 0)
+        ).scalar()
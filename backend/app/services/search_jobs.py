@@ -0,0 +1,258 @@
+import json
+import os
+import socket
+import time
+import uuid
+
+import redis
+from flask import current_app
+
+from app.services.autocomplete import get_autocomplete
+from app.services.search_service import SearchService
+
+class SearchJobQueue:
+    """
+    Redis Streams queue of asynchronous search jobs.
+    
+    Jobs from authenticated users and guests go to separate streams so that
+    workers always drain the high priority stream first. Job state (status,
+    results, attempts) lives in a hash per job that expires after SEARCH_JOB_TTL.
+    """
+    
+    PRIORITIES = ('high', 'low')
+    GROUP = 'search_workers'
+    
+    def __init__(self):
+        from app import redis_client
+        config = current_app.config
+        self.redis = redis_client
+        self.job_ttl = config.get('SEARCH_JOB_TTL', 3600)
+        self.stream_maxlen = config.get('SEARCH_JOB_STREAM_MAXLEN', 10000)
+    
+    @staticmethod
+    def stream_key(priority):
+        return f"search_jobs:{priority}"
+    
+    @staticmethod
+    def job_key(job_id):
+        return f"search_job:{job_id}"
+    
+    def ensure_groups(self):
+        """Create the consumer group on every priority stream."""
+        for priority in self.PRIORITIES:
+            try:
+                self.redis.xgroup_create(self.stream_key(priority), self.GROUP, id='0', mkstream=True)
+            except redis.ResponseError as e:
+                if 'BUSYGROUP' not in str(e):
+                    raise
+    
+    def enqueue(self, query, filters=None, user_id=None, session_id=None):
+        """
+        Queue a search job.
+        
+        Args:
+            query: User search query
+            filters: Search filters
+            user_id: Authenticated user ID (None for guests)
+            session_id: Session ID for guest users
+        
+        Returns:
+            str: Job ID
+        """
+        job_id = uuid.uuid4().hex
+        priority = 'high' if user_id else 'low'
+        
+        pipe = self.redis.pipeline()
+        pipe.hset(self.job_key(job_id), mapping={
+            'status': 'queued',
+            'query': query,
+            'filters': json.dumps(filters or {}),
+            'user_id': user_id or '',
+            'session_id': session_id or '',
+            'priority': priority,
+            'attempts': 0,
+            'created_at': time.time()
+        })
+        pipe.expire(self.job_key(job_id), self.job_ttl)
+        pipe.xadd(self.stream_key(priority), {'job_id': job_id},
+                  maxlen=self.stream_maxlen, approximate=True)
+        pipe.execute()
+        
+        return job_id
+    
+    def get(self, job_id):
+        """
+        Get a job's state.
+        
+        Returns:
+            dict with status (queued, running, completed, failed) and results, or None
+        """
+        data = self.redis.hgetall(self.job_key(job_id))
+        if not data:
+            return None
+        
+        job = {k.decode(): v.decode() for k, v in data.items()}
+        result = {
+            'job_id': job_id,
+            'status': job['status'],
+            'query': job['query'],
+            'filters': json.loads(job.get('filters') or '{}'),
+            'attempts': int(job.get('attempts', 0)),
+            'user_id': job.get('user_id') or None,
+            'session_id': job.get('session_id') or None
+        }
+        if 'results' in job:
+            result['results'] = json.loads(job['results'])
+            result['provenance'] = job.get('provenance')
+        if 'error' in job:
+            result['error'] = job['error']
+        return result
+    
+    def wait(self, job_id, timeout, poll_interval=0.25):
+        """Long-poll a job until it finishes or the timeout elapses."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job['status'] in ('completed', 'failed'):
+                return job
+            if time.monotonic() >= deadline:
+                return job
+            time.sleep(poll_interval)
+
+class SearchJobWorker:
+    """
+    Worker consuming search jobs from the priority streams.
+    
+    Messages stay in the consumer group's pending list until the job is
+    acknowledged. A message left pending for longer than the visibility
+    timeout (e.g. because its worker crashed) is claimed by another worker
+    and retried, up to SEARCH_JOB_MAX_ATTEMPTS attempts.
+    """
+    
+    def __init__(self, app, consumer_name=None):
+        self.app = app
+        config = app.config
+        self.consumer_name = consumer_name or self.default_consumer_name()
+        self.visibility_timeout = config.get('SEARCH_JOB_VISIBILITY_TIMEOUT', 120)
+        self.max_attempts = config.get('SEARCH_JOB_MAX_ATTEMPTS', 3)
+        self.block_ms = config.get('SEARCH_JOB_BLOCK_MS', 5000)
+    
+    @staticmethod
+    def default_consumer_name():
+        return f"{socket.gethostname()}-{os.getpid()}"
+    
+    def run(self, stop_event):
+        """Process jobs until stop_event is set."""
+        with self.app.app_context():
+            SearchJobQueue().ensure_groups()
+        
+        while not stop_event.is_set():
+            try:
+                with self.app.app_context():
+                    self.run_once()
+            except redis.RedisError as e:
+                self.app.logger.error(f"Search worker Redis error: {str(e)}")
+                stop_event.wait(1)
+    
+    def run_once(self):
+        """Claim or read one job and process it. Returns True if a job was handled."""
+        queue = SearchJobQueue()
+        
+        message = self._claim_stale(queue) or self._read(queue, block=False) \
+            or self._read(queue, block=True)
+        if not message:
+            return False
+        
+        stream, message_id, job_id = message
+        self._process(queue, stream, message_id, job_id)
+        return True
+    
+    def _claim_stale(self, queue):
+        """Claim a message whose worker exceeded the visibility timeout."""
+        for priority in SearchJobQueue.PRIORITIES:
+            stream = queue.stream_key(priority)
+            result = queue.redis.xautoclaim(
+                stream, SearchJobQueue.GROUP, self.consumer_name,
+                min_idle_time=self.visibility_timeout * 1000, start_id='0-0', count=1
+            )
+            for message_id, fields in result[1]:
+                if fields:
+                    return stream, message_id, fields[b'job_id'].decode()
+                # Entry trimmed from the stream; nothing left to retry
+                queue.redis.xack(stream, SearchJobQueue.GROUP, message_id)
+        return None
+    
+    def _read(self, queue, block):
+        """Read a new message, high priority stream first."""
+        if block:
+            streams = {queue.stream_key(p): '>' for p in SearchJobQueue.PRIORITIES}
+            response = queue.redis.xreadgroup(
+                SearchJobQueue.GROUP, self.consumer_name, streams, count=1, block=self.block_ms
+            )
+        else:
+            response = None
+            for priority in SearchJobQueue.PRIORITIES:
+                response = queue.redis.xreadgroup(
+                    SearchJobQueue.GROUP, self.consumer_name,
+                    {queue.stream_key(priority): '>'}, count=1
+                )
+                if response:
+                    break
+        
+        for stream, messages in response or []:
+            for message_id, fields in messages:
+                return stream.decode(), message_id, fields[b'job_id'].decode()
+        return None
+    
+    def _process(self, queue, stream, message_id, job_id):
+        job_key = queue.job_key(job_id)
+        if not queue.redis.exists(job_key):
+            queue.redis.xack(stream, SearchJobQueue.GROUP, message_id)
+            return
+        
+        attempts = queue.redis.hincrby(job_key, 'attempts', 1)
+        if attempts > self.max_attempts:
+            queue.redis.hset(job_key, mapping={'status': 'failed', 'error': 'Too many attempts'})
+            queue.redis.xack(stream, SearchJobQueue.GROUP, message_id)
+            return
+        
+        queue.redis.hset(job_key, mapping={
+            'status': 'running',
+            'worker': self.consumer_name,
+            'started_at': time.time()
+        })
+        
+        job = queue.get(job_id)
+        filters = job['filters']
+        
+        try:
+            search_service = SearchService()
+            cached = search_service.get_cached(job['query'], filters)
+            if cached is not None:
+                results, provenance = cached['results'], cached['provenance']
+            else:
+                started = time.time()
+                results, provenance = search_service.run(job['query'], filters)
+                if provenance == 'ai':
+                    get_autocomplete().record_resources(results)
+                if job['user_id']:
+                    search_service.record_history(
+                        job['query'], filters, results, user_id=int(job['user_id']),
+                        session_id=job['session_id'], execution_time=time.time() - started
+                    )
+        except Exception as e:
+            # Leave the message pending; it is retried after the visibility timeout
+            current_app.logger.error(f"Search job {job_id} failed: {str(e)}")
+            queue.redis.hset(job_key, mapping={'status': 'queued', 'error': str(e)})
+            return
+        
+        pipe = queue.redis.pipeline()
+        pipe.hset(job_key, mapping={
+            'status': 'completed',
+            'results': json.dumps(results),
+            'provenance': provenance,
+            'finished_at': time.time()
+        })
+        pipe.hdel(job_key, 'error')
+        pipe.xack(stream, SearchJobQueue.GROUP, message_id)
+        pipe.execute()
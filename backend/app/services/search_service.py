@@ -0,0 +1,98 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+from app.services.ai_service import AIService
+from app.services.history_writer import get_history_writer
+from app.utils.redis_helper import RedisHelper
+
+# Suggestions shown to every new user; kept warm by the cache warmer
+PREDEFINED_SUGGESTIONS = [
+    "AI tools for coding",
+    "Python programming courses",
+    "React tutorials YouTube",
+    "Machine learning resources",
+    "Web development bootcamp",
+    "Data science tools",
+    "JavaScript frameworks",
+    "DevOps learning path"
+]
+
+def canonicalize_query(query):
+    """Canonical form of a query for popularity tracking (lowercase, single spaces)."""
+    return ' '.join(query.lower().split())
+
+def generate_cache_key(query, filters):
+    """Generate a unique cache key for the search query and filters."""
+    key_data = {
+        'query': query.lower().strip(),
+        'filters': sorted(filters.items()) if filters else {}
+    }
+    return hashlib.md5(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+
+class SearchService:
+    """Service for cached AI-powered searches."""
+    
+    def __init__(self):
+        self.redis_helper = RedisHelper()
+    
+    def get_cached(self, query: str, filters: Dict[str, Any] = None,
+                   record_lookup: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached search.
+        
+        Args:
+            query: User search query
+            filters: Search filters
+            record_lookup: Count the lookup in the cache hit statistics
+        
+        Returns:
+            Cache entry with 'results' and 'provenance', or None on a miss
+        """
+        return self.redis_helper.get_cached_search(
+            generate_cache_key(query, filters), record_lookup=record_lookup
+        )
+    
+    def run(self, query: str, filters: Dict[str, Any] = None) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        Run a search against the AI service and cache the results.
+        
+        Args:
+            query: User search query
+            filters: Search filters
+        
+        Returns:
+            tuple: (results, provenance)
+        """
+        ai_service = AIService()
+        results, provenance = ai_service.search_resources_with_provenance(query, filters)
+        
+        # Degraded results are cached with a short TTL
+        self.redis_helper.cache_search_results(
+            generate_cache_key(query, filters), results, provenance=provenance
+        )
+        
+        return results, provenance
+    
+    def get_cache_ttl(self, query: str, filters: Dict[str, Any] = None) -> int:
+        """Get the remaining cache TTL for a search (-2 if not cached)."""
+        return self.redis_helper.get_search_cache_ttl(generate_cache_key(query, filters))
+    
+    def record_history(self, query: str, filters: Dict[str, Any], results: List[Dict[str, Any]],
+                       user_id: int = None, session_id: str = None, ip_address: str = None,
+                       execution_time: float = None, search_type: str = 'ai_powered') -> None:
+        """Queue a search for write-behind logging in the search history."""
+        get_history_writer().append({
+            'user_id': user_id,
+            'query': query,
+            'filters': filters or {},
+            'results': results,
+            'result_count': len(results) if results else 0,
+            'search_type': search_type,
+            'execution_time': execution_time,
+            'session_id': session_id,
+            'ip_address': ip_address,
+            'is_favorite': False,
+            'created_at': datetime.utcnow()
+        })
@@ -0,0 +1,133 @@
+import math
+import time
+
+from flask import current_app
+
+from app.services.search_service import canonicalize_query
+from app.utils.cache_backends import CacheBackendError, get_cache_backend
+
+class TrendingTracker:
+    """
+    Track globally trending queries with exponentially decayed counts.
+    
+    Each window is a sorted set scored with forward decay: a search at time t
+    adds 2 ** ((t - base) / half_life), so old searches never need to be
+    rescored and reading the top K is a single ZREVRANGE. To keep scores in
+    float range the base is moved forward every GENERATION_HALF_LIVES half
+    lives by starting a new sorted set (`trending:{window}:{generation}`);
+    reads merge the current and previous generation. A search's increments
+    for all windows go to the cache in one round trip; every
+    TRENDING_TRIM_INTERVAL seconds one process trims the sets back to
+    TRENDING_MAX_ENTRIES members, so memory stays bounded and only the long
+    tail of rare queries is lost.
+    """
+    
+    KEY_PREFIX = 'trending'
+    TRIM_LOCK_KEY = 'trending:trim-lock'
+    GENERATION_HALF_LIVES = 16
+    MAX_QUERY_LENGTH = 200
+    
+    def __init__(self):
+        config = current_app.config
+        self.cache = get_cache_backend()
+        self.windows = config.get('TRENDING_WINDOWS', {'24h': 86400})
+        self.default_window = config.get('TRENDING_DEFAULT_WINDOW', '24h')
+        self.max_entries = config.get('TRENDING_MAX_ENTRIES', 1000)
+        self.min_score = config.get('TRENDING_MIN_SCORE', 0.5)
+        self.trim_interval = config.get('TRENDING_TRIM_INTERVAL', 60)
+    
+    def _generation(self, half_life, now):
+        span = half_life * self.GENERATION_HALF_LIVES
+        generation = int(now // span)
+        return generation, generation * span
+    
+    def _key(self, window, generation):
+        return f"{self.KEY_PREFIX}:{window}:{generation}"
+    
+    def increments(self, query, now=None):
+        """
+        The sorted set increments that count one search of `query` in every window.
+        
+        Returns:
+            list of (key, amount, member, ttl) tuples for `CacheBackend.zincrby_many`
+        """
+        query = canonicalize_query(query)
+        if not query or len(query) > self.MAX_QUERY_LENGTH:
+            return []
+        now = now or time.time()
+        
+        increments = []
+        for window, half_life in self.windows.items():
+            generation, base = self._generation(half_life, now)
+            span = half_life * self.GENERATION_HALF_LIVES
+            # The set is read for one generation after its own, then expires
+            increments.append((self._key(window, generation), 2 ** ((now - base) / half_life), query,
+                               math.ceil(2 * span)))
+        return increments
+    
+    def record(self, query, now=None):
+        """Count one search of `query` in every window. Failures are logged, never raised."""
+        try:
+            self.cache.zincrby_many(self.increments(query, now=now))
+        except CacheBackendError as e:
+            current_app.logger.error(f"Trending update error: {str(e)}")
+    
+    def trim(self, now=None):
+        """
+        Trim the current and previous generation of every window to TRENDING_MAX_ENTRIES.
+        
+        Returns:
+            int: Number of members removed
+        """
+        now = now or time.time()
+        removed = 0
+        for window, half_life in self.windows.items():
+            generation, _ = self._generation(half_life, now)
+            for gen in (generation - 1, generation):
+                removed += self.cache.zremrangebyrank(self._key(window, gen), 0, -(self.max_entries + 1))
+        return removed
+    
+    @classmethod
+    def run_scheduled(cls):
+        """Trim the trending sets; only one process trims per TRENDING_TRIM_INTERVAL."""
+        tracker = cls()
+        try:
+            if tracker.cache.add(cls.TRIM_LOCK_KEY, '1', ttl=tracker.trim_interval):
+                tracker.trim()
+        except CacheBackendError as e:
+            current_app.logger.error(f"Trending trim error: {str(e)}")
+    
+    def top(self, window=None, limit=10, now=None):
+        """
+        Get the trending queries of a window.
+        
+        Args:
+            window: Window name from TRENDING_WINDOWS (default TRENDING_DEFAULT_WINDOW)
+            limit: Maximum number of queries
+        
+        Returns:
+            list of {'query', 'score'} dicts, highest decayed score first
+        
+        Raises:
+            ValueError: If the window is not configured
+        """
+        window = window or self.default_window
+        if window not in self.windows:
+            raise ValueError(f"Unknown trending window: {window}")
+        half_life = self.windows[window]
+        now = now or time.time()
+        generation, base = self._generation(half_life, now)
+        span = half_life * self.GENERATION_HALF_LIVES
+        
+        scores = {}
+        for gen in (generation - 1, generation):
+            # Scale stored scores to decayed counts as of now
+            scale = 2 ** -((now - (base - (generation - gen) * span)) / half_life)
+            for query, score in self.cache.zrevrange(self._key(window, gen), 0, limit * 2 - 1):
+                scores[query] = scores.get(query, 0.0) + score * scale
+        
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [
+            {'query': query, 'score': round(score, 3)}
+            for query, score in ranked[:limit] if score >= self.min_score
+        ]
@@ -0,0 +1,153 @@
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import bindparam, case
+
+from app import db
+from app.models.search_history import SearchHistory
+from app.models.user import User
+from app.services.history_partitions import HistoryArchive, archived_row_for_stats
+
+class UserCounters:
+    """
+    Maintain the denormalized per-user counters on `users`.
+    
+    Counters are updated in the same transaction as the history write that
+    changes them. Anything that bypasses these helpers (manual SQL, replayed
+    write-behind batches) is corrected by `reconcile`.
+    """
+    
+    @staticmethod
+    def apply_searches(rows):
+        """
+        Add newly written history rows to their users' counters.
+        
+        Must be called inside the transaction that inserts the rows.
+        
+        Args:
+            rows: Inserted search history rows (dicts with user_id and created_at)
+        """
+        per_user = defaultdict(lambda: {'count': 0, 'last_search_at': None})
+        for row in rows:
+            if not row.get('user_id'):
+                continue
+            entry = per_user[row['user_id']]
+            entry['count'] += 1
+            if entry['last_search_at'] is None or row['created_at'] > entry['last_search_at']:
+                entry['last_search_at'] = row['created_at']
+        
+        if not per_user:
+            return
+        
+        users = User.__table__
+        stmt = users.update()\
+            .where(users.c.id == bindparam('uid'))\
+            .values(
+                search_count=users.c.search_count + bindparam('count'),
+                last_search_at=case(
+                    (users.c.last_search_at.is_(None), bindparam('searched_at')),
+                    (users.c.last_search_at < bindparam('searched_at'), bindparam('searched_at')),
+                    else_=users.c.last_search_at
+                )
+            )
+        db.session.execute(stmt, [
+            {'uid': user_id, 'count': entry['count'], 'searched_at': entry['last_search_at']}
+            for user_id, entry in per_user.items()
+        ])
+    
+    @staticmethod
+    def adjust(user_id, searches=0, favorites=0):
+        """Adjust a user's counters by the given deltas (inside the caller's transaction)."""
+        if not user_id or not (searches or favorites):
+            return
+        users = User.__table__
+        db.session.execute(
+            users.update()
+            .where(users.c.id == user_id)
+            .values(
+                search_count=users.c.search_count + searches,
+                favorites_count=users.c.favorites_count + favorites
+            )
+        )
+    
+    @staticmethod
+    def refresh_last_search_at(user_id):
+        """Recompute a user's last_search_at after history was deleted (inside the caller's transaction)."""
+        users = User.__table__
+        latest = db.session.query(db.func.max(db.func.coalesce(SearchHistory.last_run_at, SearchHistory.created_at)))\
+            .filter(SearchHistory.user_id == user_id)\
+            .scalar()
+        if latest is None:
+            # Everything left is archived (and older than any live row)
+            for row in HistoryArchive().iter_user(user_id):
+                searched_at = datetime.fromisoformat(row.get('last_run_at') or row['created_at'])
+                latest = max(latest or searched_at, searched_at)
+        db.session.execute(users.update().where(users.c.id == user_id).values(last_search_at=latest))
+    
+    @staticmethod
+    def reconcile(batch_size=500):
+        """
+        Recompute counters from search_history and fix users that drifted.
+        
+        Archived history counts too: archiving moves rows out of the table
+        without touching the counters.
+        
+        Returns:
+            int: Number of users whose counters were corrected
+        """
+        corrected = 0
+        last_id = 0
+        
+        while True:
+            users = db.session.query(
+                User.id, User.search_count, User.favorites_count, User.last_search_at
+            ).filter(User.id > last_id)\
+             .order_by(User.id)\
+             .limit(batch_size)\
+             .all()
+            if not users:
+                return corrected
+            last_id = users[-1].id
+            
+            user_ids = [user.id for user in users]
+            actual = defaultdict(lambda: [0, 0, None])
+            for row in db.session.query(
+                SearchHistory.user_id,
+                db.func.sum(SearchHistory.run_count).label('search_count'),
+                db.func.sum(case((SearchHistory.is_favorite.is_(True), 1), else_=0)).label('favorites_count'),
+                db.func.max(db.func.coalesce(SearchHistory.last_run_at, SearchHistory.created_at)).label('last_search_at')
+            ).filter(SearchHistory.user_id.in_(user_ids)).group_by(SearchHistory.user_id):
+                actual[row.user_id] = [int(row.search_count or 0), int(row.favorites_count or 0), row.last_search_at]
+            
+            for row in HistoryArchive().iter_users(user_ids):
+                row = archived_row_for_stats(row)
+                entry = actual[row['user_id']]
+                entry[0] += row['run_count']
+                entry[1] += 1 if row.get('is_favorite') else 0
+                searched_at = datetime.fromisoformat(row['last_run_at']) if row.get('last_run_at') else row['created_at']
+                if entry[2] is None or searched_at > entry[2]:
+                    entry[2] = searched_at
+            
+            updates = []
+            for user in users:
+                expected = tuple(actual[user.id])
+                if (user.search_count, user.favorites_count, user.last_search_at) != expected:
+                    updates.append({
+                        'uid': user.id,
+                        'expected_searches': expected[0],
+                        'expected_favorites': expected[1],
+                        'expected_last_search_at': expected[2]
+                    })
+            
+            if updates:
+                table = User.__table__
+                db.session.execute(
+                    table.update().where(table.c.id == bindparam('uid')).values(
+                        search_count=bindparam('expected_searches'),
+                        favorites_count=bindparam('expected_favorites'),
+                        last_search_at=bindparam('expected_last_search_at')
+                    ),
+                    updates
+                )
+                corrected += len(updates)
+            db.session.commit()
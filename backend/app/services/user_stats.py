@@ -0,0 +1,156 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from app.models.search_history import SearchHistory
+from app.models.user import User
+from app.models.user_search_stats import UserSearchStats
+from app.services.history_partitions import HistoryArchive, archived_row_for_stats
+
+class UserStatsRollup:
+    """
+    Maintain the `user_search_stats` rollup behind GET /api/user/statistics.
+    
+    The rollup is updated in the same transaction as the history write, so
+    reading statistics is a single primary-key lookup regardless of how
+    much history a user has.
+    """
+    
+    def __init__(self):
+        self.top_k = current_app.config.get('STATS_TOP_QUERIES_K', 50)
+        self.retention_days = current_app.config.get('STATS_DAILY_RETENTION_DAYS', 90)
+    
+    def apply_searches(self, rows):
+        """
+        Add newly written history rows to their users' rollups.
+        
+        Must be called inside the transaction that inserts the rows.
+        """
+        per_user = self._group_by_user(rows)
+        if not per_user:
+            return
+        for stats in self._lock_rows(per_user.keys()):
+            stats.add_searches(per_user[stats.user_id], top_k=self.top_k,
+                               retention_days=self.retention_days)
+    
+    def remove_searches(self, rows):
+        """
+        Subtract deleted history rows from their users' rollups.
+        
+        Must be called inside the transaction that deletes the rows.
+        """
+        per_user = self._group_by_user(rows)
+        if not per_user:
+            return
+        for stats in self._lock_rows(per_user.keys()):
+            stats.remove_searches(per_user[stats.user_id])
+    
+    def backfill(self, batch_size=200):
+        """
+        Rebuild rollups for all users from search_history and its archive.
+        
+        Returns:
+            int: Number of users processed
+        """
+        since = datetime.utcnow() - timedelta(days=self.retention_days)
+        processed = 0
+        last_id = 0
+        
+        while True:
+            user_ids = [row.id for row in db.session.query(User.id)
+                        .filter(User.id > last_id)
+                        .order_by(User.id)
+                        .limit(batch_size)
+                        .all()]
+            if not user_ids:
+                return processed
+            last_id = user_ids[-1]
+            
+            rollups = {user_id: UserSearchStats(user_id) for user_id in user_ids}
+            in_batch = SearchHistory.user_id.in_(user_ids)
+            day = db.func.date(SearchHistory.created_at)
+            
+            for row in db.session.query(
+                SearchHistory.user_id, day.label('day'), db.func.sum(SearchHistory.run_count).label('count')
+            ).filter(in_batch, SearchHistory.created_at >= since).group_by(SearchHistory.user_id, day):
+                rollups[row.user_id].daily_counts[str(row.day)] = int(row.count)
+            
+            for row in db.session.query(
+                SearchHistory.user_id, SearchHistory.search_type, db.func.sum(SearchHistory.run_count).label('count')
+            ).filter(in_batch).group_by(SearchHistory.user_id, SearchHistory.search_type):
+                rollups[row.user_id].type_counts[row.search_type or 'ai_powered'] = int(row.count)
+            
+            query_counts = defaultdict(lambda: defaultdict(int))
+            for row in db.session.query(
+                SearchHistory.user_id, SearchHistory.query, db.func.sum(SearchHistory.run_count).label('count')
+            ).filter(in_batch).group_by(SearchHistory.user_id, SearchHistory.query):
+                query_counts[row.user_id][row.query] += int(row.count)
+            
+            # Archiving moves rows out of search_history; they still count
+            for row in HistoryArchive().iter_users(user_ids):
+                row = archived_row_for_stats(row)
+                rollup = rollups[row['user_id']]
+                if row['created_at'] >= since:
+                    day = row['created_at'].date().isoformat()
+                    rollup.daily_counts[day] = rollup.daily_counts.get(day, 0) + row['run_count']
+                search_type = row.get('search_type') or 'ai_powered'
+                rollup.type_counts[search_type] = rollup.type_counts.get(search_type, 0) + row['run_count']
+                query_counts[row['user_id']][row['query']] += row['run_count']
+            
+            for user_id, counts in query_counts.items():
+                top = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:self.top_k]
+                rollups[user_id].top_queries = dict(top)
+            
+            db.session.query(UserSearchStats)\
+                .filter(UserSearchStats.user_id.in_(user_ids))\
+                .delete(synchronize_session=False)
+            db.session.add_all(rollups.values())
+            db.session.commit()
+            processed += len(user_ids)
+    
+    @staticmethod
+    def _group_by_user(rows):
+        per_user = defaultdict(list)
+        for row in rows:
+            if row.get('user_id'):
+                # A deduplicated row stands for run_count searches
+                per_user[row['user_id']].extend(
+                    [(row['query'], row.get('search_type'), row['created_at'])] * (row.get('run_count') or 1)
+                )
+        return per_user
+    
+    @staticmethod
+    def _lock_rows(user_ids):
+        """Create missing rollup rows, then load all of them FOR UPDATE."""
+        user_ids = sorted(user_ids)
+        table = UserSearchStats.__table__
+        dialect = db.session.get_bind().dialect.name
+        values = [
+            {'user_id': user_id, 'daily_counts': {}, 'type_counts': {}, 'top_queries': {},
+             'updated_at': datetime.utcnow()}
+            for user_id in user_ids
+        ]
+        
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            db.session.execute(
+                insert(table).values(values).on_conflict_do_nothing(index_elements=['user_id'])
+            )
+        else:
+            existing = {row.user_id for row in db.session.query(UserSearchStats.user_id)
+                        .filter(UserSearchStats.user_id.in_(user_ids))}
+            missing = [value for value in values if value['user_id'] not in existing]
+            if missing:
+                db.session.execute(table.insert().values(missing))
+        
+        return db.session.query(UserSearchStats)\
+            .filter(UserSearchStats.user_id.in_(user_ids))\
+            .order_by(UserSearchStats.user_id)\
+            .with_for_update()\
+            .populate_existing()\
+            .all()
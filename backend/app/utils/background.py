@@ -0,0 +1,57 @@
+import os
+import threading
+
+class PeriodicTask:
+    """
+    Run a function periodically on a daemon thread inside an app context.
+    
+    The thread is started lazily and is fork-aware: a worker forked from a
+    preloaded master starts its own thread on first use instead of relying
+    on one that did not survive the fork.
+    """
+    
+    def __init__(self, app, name, interval, func):
+        self.app = app
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self._pid = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+    
+    def ensure_started(self):
+        """Start the task thread in this process if not already running."""
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+    
+    def wake(self):
+        """Run the task now instead of waiting for the interval to elapse."""
+        self._wake.set()
+    
+    def stop(self, timeout=None):
+        """Signal the task to stop and wait for the current run to finish."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread and self._pid == os.getpid():
+            self._thread.join(timeout)
+    
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            with self.app.app_context():
+                try:
+                    self.func()
+                except Exception as e:
+                    self.app.logger.error(f"Background task {self.name} failed: {str(e)}")
@@ -0,0 +1,145 @@
+import random
+import statistics
+import time
+
+BENCHMARK_EMAILS = {'inline': 'blob-benchmark-inline@example.com', 'blobs': 'blob-benchmark-blobs@example.com'}
+
+def synthetic_results(index, count=10):
+    """A deterministic result set shaped like the AI service's, distinct per `index`."""
+    rng = random.Random(index)
+    return [{
+        'id': position + 1,
+        'name': f"Resource {index}-{position}",
+        'description': ' '.join(rng.choice(('learn', 'build', 'python', 'course', 'tutorial', 'guide',
+                                            'advanced', 'projects', 'free', 'interactive'))
+                                for _ in range(30)),
+        'type': rng.choice(('tool', 'youtube', 'course', 'website')),
+        'url': f"https://example.com/resources/{index}/{position}",
+        'difficulty': rng.choice(('beginner', 'intermediate', 'advanced')),
+        'pricing': rng.choice(('free', 'freemium', 'paid')),
+        'rating': round(rng.uniform(3, 5), 1),
+        'tags': rng.sample(('python', 'web', 'data', 'devops', 'design', 'career'), 3),
+        'popularity': rng.choice(('low', 'medium', 'high'))
+    } for position in range(count)]
+
+def run_blob_benchmark(app, rows=2000, distinct=100, results_per_search=10, reads=300, page_size=20):
+    """
+    Compare inline and content-addressed storage of search results.
+    
+    Writes the same `rows` searches (drawn from `distinct` result sets, the
+    way popular queries repeat) for two benchmark users: one with results
+    inline in search_history, one through ResultBlobStore. Then reads them
+    back through the API: GET /api/search/history/<id> for random rows and
+    pages of GET /api/search/favorites, which include results. The users,
+    their rows and their blobs are deleted afterwards.
+    
+    Args:
+        app: Application to run against (its database is used)
+        rows: Searches written per layout
+        distinct: Distinct result sets among them
+        results_per_search: Resources per result set
+        reads: Requests timed per read kind and layout
+        page_size: Rows per favorites page
+    
+    Returns:
+        dict mapping 'inline' and 'blobs' to stored_bytes, write_seconds and
+        p50/p95 latencies in ms of 'detail' and 'page' reads
+    
+    Raises:
+        RuntimeError: If a read request fails
+    """
+    from flask_jwt_extended import create_access_token
+    
+    from app import db
+    from app.models.search_history import SearchHistory
+    from app.models.search_result_blob import SearchResultBlob
+    from app.models.user import User
+    from app.services.result_blobs import ResultBlobStore
+    
+    table = SearchHistory.__table__
+    result_sets = [synthetic_results(index, results_per_search) for index in range(distinct)]
+    rng = random.Random(0)
+    picks = [rng.randrange(distinct) for _ in range(rows)]
+    report = {}
+    
+    try:
+        with app.app_context():
+            for layout, email in BENCHMARK_EMAILS.items():
+                user = User.query.filter_by(email=email).first() or User(email=email, name='Blob benchmark')
+                db.session.add(user)
+                db.session.commit()
+                
+                values = [{'user_id': user.id, 'query': f"blob benchmark {pick}", 'filters': {},
+                           'results': result_sets[pick], 'result_count': results_per_search,
+                           'is_favorite': True}
+                          for pick in picks]
+                began = time.perf_counter()
+                for start in range(0, rows, 500):
+                    batch = values[start:start + 500]
+                    if layout == 'blobs':
+                        ResultBlobStore().store_rows(batch)
+                    db.session.execute(table.insert(), batch)
+                    db.session.commit()
+                write_seconds = time.perf_counter() - began
+                
+                if layout == 'inline':
+                    stored = db.session.query(db.func.sum(db.func.length(
+                        db.cast(SearchHistory.results_inline, db.Text)
+                    ))).filter(SearchHistory.user_id == user.id).scalar()
+                else:
+                    hashes = db.session.query(SearchHistory.results_hash)\
+                        .filter(SearchHistory.user_id == user.id)
+                    stored = db.session.query(db.func.sum(db.func.length(SearchResultBlob.data)))\
+                        .filter(SearchResultBlob.hash.in_(hashes.distinct())).scalar()
+                    # Every row also stores the 64-character hash
+                    stored += rows * 64
+                
+                report[layout] = {
+                    'stored_bytes': int(stored or 0), 'write_seconds': write_seconds,
+                    'token': create_access_token(identity=user.id),
+                    'ids': [row.id for row in db.session.query(SearchHistory.id)
+                            .filter(SearchHistory.user_id == user.id)]
+                }
+        
+        for layout, stats in report.items():
+            client = app.test_client()
+            headers = {'Authorization': f"Bearer {stats.pop('token')}"}
+            ids = stats.pop('ids')
+            latencies = {'detail': [], 'page': []}
+            for _ in range(reads):
+                began = time.perf_counter()
+                response = client.get(f"/api/search/history/{rng.choice(ids)}", headers=headers)
+                latencies['detail'].append((time.perf_counter() - began) * 1000)
+                if response.status_code != 200:
+                    raise RuntimeError(f"Reading a search failed with {response.status_code}")
+            
+            cursor = None
+            for _ in range(reads):
+                query = {'limit': page_size}
+                if cursor:
+                    query['cursor'] = cursor
+                began = time.perf_counter()
+                response = client.get('/api/search/favorites', query_string=query, headers=headers)
+                latencies['page'].append((time.perf_counter() - began) * 1000)
+                if response.status_code != 200:
+                    raise RuntimeError(f"Reading favorites failed with {response.status_code}")
+                cursor = response.json['pagination'].get('next_cursor')
+            
+            for kind, values in latencies.items():
+                stats[f"{kind}_p50_ms"] = statistics.median(values)
+                stats[f"{kind}_p95_ms"] = statistics.quantiles(values, n=20)[-1]
+        return report
+    finally:
+        with app.app_context():
+            for email in BENCHMARK_EMAILS.values():
+                user = User.query.filter_by(email=email).first()
+                if user is None:
+                    continue
+                hashes = [row.results_hash for row in db.session.query(SearchHistory.results_hash)
+                          .filter(SearchHistory.user_id == user.id, SearchHistory.results_hash.isnot(None))]
+                db.session.query(SearchHistory).filter(SearchHistory.user_id == user.id)\
+                    .delete(synchronize_session=False)
+                ResultBlobStore().release(hashes)
+                db.session.delete(user)
+                db.session.commit()
+            ResultBlobStore().collect_garbage()
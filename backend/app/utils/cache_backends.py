@@ -0,0 +1,593 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import redis
+from flask import current_app
+
+class CacheBackendError(Exception):
+    """Raised when a cache backend operation fails."""
+
+class CacheBackend:
+    """
+    Key/value cache interface used by RedisHelper.
+    
+    Values are stored and returned as strings. Every backend supports
+    per-key TTLs, atomic increments and size-bounded eviction.
+    """
+    
+    name = 'base'
+    
+    def get(self, key):
+        """Get a value, or None if missing or expired."""
+        raise NotImplementedError
+    
+    def set(self, key, value, ttl=None):
+        """Set a value with an optional TTL in seconds."""
+        raise NotImplementedError
+    
+    def add(self, key, value, ttl=None):
+        """Set a value only if the key does not exist. Returns True if set."""
+        raise NotImplementedError
+    
+    def incr(self, key, amount=1, ttl=None):
+        """Atomically increment an integer value, (re)setting the TTL if given."""
+        raise NotImplementedError
+    
+    def delete(self, *keys):
+        """Delete one or more keys."""
+        raise NotImplementedError
+    
+    def exists(self, key):
+        """Check whether a key exists."""
+        return self.get(key) is not None
+    
+    def ttl(self, key):
+        """Remaining TTL in seconds (-1 if no expiry, -2 if missing)."""
+        raise NotImplementedError
+    
+    def ping(self):
+        """Check backend health."""
+        return True
+    
+    # Sorted sets (used for trending queries)
+    
+    def zincrby(self, key, amount, member, ttl=None):
+        """Increment a member's score in a sorted set, (re)setting the set's TTL if given."""
+        raise NotImplementedError
+    
+    def zincrby_many(self, increments):
+        """
+        Apply several sorted set increments, in one round trip where the backend allows.
+        
+        Args:
+            increments: Iterable of (key, amount, member, ttl) tuples, as `zincrby` takes them
+        """
+        for key, amount, member, ttl in increments:
+            self.zincrby(key, amount, member, ttl=ttl)
+    
+    def zrevrange(self, key, start, stop):
+        """Get (member, score) pairs by descending score, `stop` inclusive (-1 for all)."""
+        raise NotImplementedError
+    
+    def zremrangebyrank(self, key, start, stop):
+        """Remove members by ascending-score rank, `stop` inclusive (negative counts from the end)."""
+        raise NotImplementedError
+    
+    def zcard(self, key):
+        """Number of members in a sorted set."""
+        raise NotImplementedError
+
+class RedisBackend(CacheBackend):
+    """
+    Redis-backed cache.
+    
+    Size-bounded eviction is delegated to the server's maxmemory policy
+    (e.g. allkeys-lru).
+    """
+    
+    name = 'redis'
+    
+    def __init__(self, client):
+        self.client = client
+    
+    def get(self, key):
+        try:
+            value = self.client.get(key)
+        except redis.RedisError as e:
+            raise CacheBackendError(str(e)) from e
+        return value.decode() if isinstance(value, bytes) else value
+    
+    def set(self, key, value, ttl=None):
+        try:
+            if ttl:
+                self.client.setex(key, int(ttl), value)
+            else:
+                self.client.set(key, value)
+        except redis.RedisError as e:
+            raise CacheBackendError(str(e)) from e
+    
+    def add(self, key, value, ttl=None):
+        try:
+            return bool(self.client.set(key, value, nx=True, ex=int(ttl) if ttl else None))
+        except redis.RedisError as e:
+            raise CacheBackendError(str(e)) from e
+    
+    def incr(self, key, amount=1, ttl=None):
+        try:
+            pipe = self.client.pipeline()
+            pipe.incrby(key, amount)
+            if ttl:
+                pipe.expire(key, int(ttl))
+            return pipe.execute()[0]
+        except redis.RedisError as e:
+            raise CacheBackendError(str(e)) from e
+    
+    def delete(self, *keys):
+        if not keys:
+            return
+        try:
+            self.client.delete(*keys)
+        except redis.RedisError as e:
+            raise CacheBackendError(str(e)) from e
+    
+    def exists(self, key):
+        try:
+            return bool(self.client.exists(key))
+        except redis.RedisError as e:
+            raise CacheBackendError(str(e)) from e
+    
+    def ttl(self, key):
+        try:
+            return self.client.ttl(key)
+        except redis.RedisError as e:
+            raise CacheBackendError(str(e)) from e
+    
+    def ping(self):
+        try:
+            return bool(self.client.ping())
+        except redis.RedisError as e:
+            raise CacheBackendError(str(e)) from e
+    
+    def zincrby(self, key, amount, member, ttl=None):
+        try:
+            pipe = self.client.pipeline()
+            pipe.zincrby(key, amount, member)
+            if ttl:
+                pipe.expire(key, int(ttl))
+            return pipe.execute()[0]
+        except redis.RedisError as e:
+            raise CacheBackendError(str(e)) from e
+    
+    def zincrby_many(self, increments):
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key, amount, member, ttl in increments:
+                pipe.zincrby(key, amount, member)
+                if ttl:
+                    pipe.expire(key, int(ttl))
+            pipe.execute()
+        except redis.RedisError as e:
+            raise CacheBackendError(str(e)) from e
+    
+    def zrevrange(self, key, start, stop):
+        try:
+            return [(member.decode(), score) for member, score in
+                    self.client.zrevrange(key, start, stop, withscores=True)]
+        except redis.RedisError as e:
+            raise CacheBackendError(str(e)) from e
+    
+    def zremrangebyrank(self, key, start, stop):
+        try:
+            return self.client.zremrangebyrank(key, start, stop)
+        except redis.RedisError as e:
+            raise CacheBackendError(str(e)) from e
+    
+    def zcard(self, key):
+        try:
+            return self.client.zcard(key)
+        except redis.RedisError as e:
+            raise CacheBackendError(str(e)) from e
+
+class MemoryBackend(CacheBackend):
+    """In-process LRU cache for single-process deployments and tests."""
+    
+    name = 'memory'
+    
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+    
+    def _get_entry(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+    
+    def _store(self, key, value, expires_at):
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._get_entry(key, time.time())
+            return entry[0] if entry else None
+    
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            expires_at = time.time() + ttl if ttl else None
+            self._store(key, str(value), expires_at)
+    
+    def add(self, key, value, ttl=None):
+        with self._lock:
+            now = time.time()
+            if self._get_entry(key, now):
+                return False
+            self._store(key, str(value), now + ttl if ttl else None)
+            return True
+    
+    def incr(self, key, amount=1, ttl=None):
+        with self._lock:
+            now = time.time()
+            entry = self._get_entry(key, now)
+            try:
+                value = int(entry[0]) + amount if entry else amount
+            except ValueError as e:
+                raise CacheBackendError(f"Value at {key} is not an integer") from e
+            if ttl:
+                expires_at = now + ttl
+            else:
+                expires_at = entry[1] if entry else None
+            self._store(key, str(value), expires_at)
+            return value
+    
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+    
+    def ttl(self, key):
+        with self._lock:
+            now = time.time()
+            entry = self._get_entry(key, now)
+            if not entry:
+                return -2
+            if entry[1] is None:
+                return -1
+            return int(entry[1] - now)
+    
+    def _get_zset(self, key, now):
+        entry = self._get_entry(key, now)
+        if entry is None:
+            return None
+        if not isinstance(entry[0], dict):
+            raise CacheBackendError(f"Value at {key} is not a sorted set")
+        return entry[0]
+    
+    def zincrby(self, key, amount, member, ttl=None):
+        with self._lock:
+            now = time.time()
+            entry = self._get_entry(key, now)
+            zset = self._get_zset(key, now) if entry else {}
+            zset[member] = zset.get(member, 0.0) + amount
+            if ttl:
+                expires_at = now + ttl
+            else:
+                expires_at = entry[1] if entry else None
+            self._store(key, zset, expires_at)
+            return zset[member]
+    
+    def _ranked(self, key, reverse):
+        zset = self._get_zset(key, time.time()) or {}
+        return sorted(zset.items(), key=lambda item: (item[1], item[0]), reverse=reverse)
+    
+    def zrevrange(self, key, start, stop):
+        with self._lock:
+            ranked = self._ranked(key, reverse=True)
+            return ranked[start:None if stop == -1 else stop + 1]
+    
+    def zremrangebyrank(self, key, start, stop):
+        with self._lock:
+            ranked = self._ranked(key, reverse=False)
+            removed = ranked[start:None if stop == -1 else stop + 1]
+            zset = self._get_zset(key, time.time()) or {}
+            for member, _ in removed:
+                zset.pop(member, None)
+            return len(removed)
+    
+    def zcard(self, key):
+        with self._lock:
+            return len(self._get_zset(key, time.time()) or {})
+
+class SQLiteBackend(CacheBackend):
+    """
+    Persistent on-disk cache for single-node deployments.
+    
+    Uses WAL mode so readers never block the writer, and IMMEDIATE
+    transactions so increments are atomic across processes sharing the file.
+    Once the table grows past max_entries, the least recently written
+    entries are evicted.
+    """
+    
+    name = 'sqlite'
+    
+    # Check the size bound every N writes rather than on every write
+    EVICTION_CHECK_INTERVAL = 100
+    
+    def __init__(self, path, max_entries=100000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                'expires_at REAL, updated_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_updated_at ON cache(updated_at)')
+            conn.execute('CREATE TABLE IF NOT EXISTS zset_keys (key TEXT PRIMARY KEY, expires_at REAL)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS zset_members ('
+                'key TEXT NOT NULL, member TEXT NOT NULL, score REAL NOT NULL, '
+                'PRIMARY KEY (key, member))'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_zset_members_score ON zset_members(key, score)')
+    
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+    
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+    
+    def _after_write(self):
+        # Request threads share the counter; exactly one of them runs each check
+        with self._writes_lock:
+            self._writes += 1
+            if self._writes % self.EVICTION_CHECK_INTERVAL:
+                return
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),))
+            conn.execute(
+                'DELETE FROM zset_members WHERE key IN '
+                '(SELECT key FROM zset_keys WHERE expires_at IS NOT NULL AND expires_at <= ?)',
+                (time.time(),)
+            )
+            conn.execute('DELETE FROM zset_keys WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),))
+            (count,) = conn.execute('SELECT COUNT(*) FROM cache').fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    'DELETE FROM cache WHERE key IN '
+                    '(SELECT key FROM cache ORDER BY updated_at LIMIT ?)',
+                    (count - self.max_entries,)
+                )
+    
+    def get(self, key):
+        try:
+            row = self._connection().execute(
+                'SELECT value FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+                (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            raise CacheBackendError(str(e)) from e
+        return row[0] if row else None
+    
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        try:
+            with self._transaction() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO cache (key, value, expires_at, updated_at) VALUES (?, ?, ?, ?)',
+                    (key, str(value), now + ttl if ttl else None, now)
+                )
+        except sqlite3.Error as e:
+            raise CacheBackendError(str(e)) from e
+        self._after_write()
+    
+    def add(self, key, value, ttl=None):
+        now = time.time()
+        try:
+            with self._transaction() as conn:
+                conn.execute('DELETE FROM cache WHERE key = ? AND expires_at <= ?', (key, now))
+                cursor = conn.execute(
+                    'INSERT OR IGNORE INTO cache (key, value, expires_at, updated_at) VALUES (?, ?, ?, ?)',
+                    (key, str(value), now + ttl if ttl else None, now)
+                )
+                added = cursor.rowcount == 1
+        except sqlite3.Error as e:
+            raise CacheBackendError(str(e)) from e
+        self._after_write()
+        return added
+    
+    def incr(self, key, amount=1, ttl=None):
+        now = time.time()
+        try:
+            with self._transaction() as conn:
+                row = conn.execute(
+                    'SELECT value, expires_at FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+                    (key, now)
+                ).fetchone()
+                value = int(row[0]) + amount if row else amount
+                if ttl:
+                    expires_at = now + ttl
+                else:
+                    expires_at = row[1] if row else None
+                conn.execute(
+                    'INSERT OR REPLACE INTO cache (key, value, expires_at, updated_at) VALUES (?, ?, ?, ?)',
+                    (key, str(value), expires_at, now)
+                )
+        except ValueError as e:
+            raise CacheBackendError(f"Value at {key} is not an integer") from e
+        except sqlite3.Error as e:
+            raise CacheBackendError(str(e)) from e
+        self._after_write()
+        return value
+    
+    def delete(self, *keys):
+        if not keys:
+            return
+        try:
+            with self._transaction() as conn:
+                conn.executemany('DELETE FROM cache WHERE key = ?', [(key,) for key in keys])
+                conn.executemany('DELETE FROM zset_members WHERE key = ?', [(key,) for key in keys])
+                conn.executemany('DELETE FROM zset_keys WHERE key = ?', [(key,) for key in keys])
+        except sqlite3.Error as e:
+            raise CacheBackendError(str(e)) from e
+    
+    def ttl(self, key):
+        now = time.time()
+        try:
+            row = self._connection().execute(
+                'SELECT expires_at FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+                (key, now)
+            ).fetchone()
+        except sqlite3.Error as e:
+            raise CacheBackendError(str(e)) from e
+        if not row:
+            return -2
+        if row[0] is None:
+            return -1
+        return int(row[0] - now)
+    
+    def ping(self):
+        try:
+            self._connection().execute('SELECT 1')
+            return True
+        except sqlite3.Error as e:
+            raise CacheBackendError(str(e)) from e
+    
+    def zincrby(self, key, amount, member, ttl=None):
+        try:
+            with self._transaction() as conn:
+                self._zincrby(conn, key, amount, member, ttl, time.time())
+                (score,) = conn.execute(
+                    'SELECT score FROM zset_members WHERE key = ? AND member = ?', (key, member)
+                ).fetchone()
+        except sqlite3.Error as e:
+            raise CacheBackendError(str(e)) from e
+        return score
+    
+    def zincrby_many(self, increments):
+        now = time.time()
+        try:
+            with self._transaction() as conn:
+                for key, amount, member, ttl in increments:
+                    self._zincrby(conn, key, amount, member, ttl, now)
+        except sqlite3.Error as e:
+            raise CacheBackendError(str(e)) from e
+    
+    def _zincrby(self, conn, key, amount, member, ttl, now):
+        self._expire_zset(conn, key, now)
+        conn.execute(
+            'INSERT INTO zset_members (key, member, score) VALUES (?, ?, ?) '
+            'ON CONFLICT(key, member) DO UPDATE SET score = score + excluded.score',
+            (key, member, amount)
+        )
+        if ttl:
+            conn.execute('INSERT OR REPLACE INTO zset_keys (key, expires_at) VALUES (?, ?)', (key, now + ttl))
+        else:
+            conn.execute('INSERT OR IGNORE INTO zset_keys (key, expires_at) VALUES (?, NULL)', (key,))
+    
+    def zrevrange(self, key, start, stop):
+        limit = -1 if stop == -1 else stop - start + 1
+        try:
+            return [tuple(row) for row in self._connection().execute(
+                'SELECT m.member, m.score FROM zset_members m JOIN zset_keys k ON k.key = m.key '
+                'WHERE m.key = ? AND (k.expires_at IS NULL OR k.expires_at > ?) '
+                'ORDER BY m.score DESC, m.member DESC LIMIT ? OFFSET ?',
+                (key, time.time(), limit, start)
+            )]
+        except sqlite3.Error as e:
+            raise CacheBackendError(str(e)) from e
+    
+    def zremrangebyrank(self, key, start, stop):
+        try:
+            with self._transaction() as conn:
+                (count,) = conn.execute('SELECT COUNT(*) FROM zset_members WHERE key = ?', (key,)).fetchone()
+                start = start + count if start < 0 else start
+                stop = stop + count if stop < 0 else stop
+                if stop < start:
+                    return 0
+                cursor = conn.execute(
+                    'DELETE FROM zset_members WHERE key = ? AND member IN ('
+                    'SELECT member FROM zset_members WHERE key = ? '
+                    'ORDER BY score, member LIMIT ? OFFSET ?)',
+                    (key, key, stop - start + 1, start)
+                )
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            raise CacheBackendError(str(e)) from e
+    
+    def zcard(self, key):
+        try:
+            self._expire_zset(self._connection(), key, time.time())
+            (count,) = self._connection().execute(
+                'SELECT COUNT(*) FROM zset_members WHERE key = ?', (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            raise CacheBackendError(str(e)) from e
+        return count
+    
+    @staticmethod
+    def _expire_zset(conn, key, now):
+        row = conn.execute('SELECT expires_at FROM zset_keys WHERE key = ?', (key,)).fetchone()
+        if row and row[0] is not None and row[0] <= now:
+            conn.execute('DELETE FROM zset_members WHERE key = ?', (key,))
+            conn.execute('DELETE FROM zset_keys WHERE key = ?', (key,))
+
+def create_cache_backend(config, redis_client=None):
+    """
+    Create the cache backend selected by CACHE_BACKEND.
+    
+    Args:
+        config: Flask application config
+        redis_client: Redis client to use for the 'redis' backend
+    
+    Returns:
+        CacheBackend instance
+    """
+    backend = config.get('CACHE_BACKEND', 'redis')
+    
+    if backend == 'redis':
+        return RedisBackend(redis_client or redis.from_url(config['REDIS_URL']))
+    if backend == 'memory':
+        return MemoryBackend(max_entries=config.get('CACHE_MAX_ENTRIES', 10000))
+    if backend == 'sqlite':
+        return SQLiteBackend(
+            config.get('CACHE_SQLITE_PATH', 'instance/cache.sqlite3'),
+            max_entries=config.get('CACHE_MAX_ENTRIES', 10000)
+        )
+    
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+def get_cache_backend():
+    """Get the cache backend for the current application."""
+    return current_app.extensions['cache_backend']
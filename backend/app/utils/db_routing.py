@@ -0,0 +1,131 @@
+import random
+import time
+from functools import wraps
+
+from flask import current_app, g, has_app_context, request
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text
+from sqlalchemy.sql.selectable import SelectBase
+
+from app.utils.background import PeriodicTask
+from app.utils.cache_backends import CacheBackendError, get_cache_backend
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+def replica_binds(urls):
+    """SQLALCHEMY_BINDS entries for the configured replica URLs."""
+    return {f"{REPLICA_BIND_PREFIX}{index}": url for index, url in enumerate(urls)}
+
+class RoutingSession(Session):
+    """
+    Session that sends reads of read-only views to the replica chosen for the request.
+    
+    Flushes, INSERT/UPDATE/DELETE and textual SQL always go to the primary,
+    and once a request has written, its later reads do too.
+    """
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            replica = g.get('db_replica')
+            if replica is not None:
+                if not self._flushing and (clause is None or isinstance(clause, SelectBase)):
+                    return self._db.engines[replica]
+                g.db_replica = None
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+class ReplicaRouter:
+    """
+    Pick a read replica for read-only requests.
+    
+    Replicas lagging more than REPLICA_MAX_LAG seconds (or failing their lag
+    check) are skipped. A user's requests stay on the primary for
+    REPLICA_STICKY_SECONDS after any write request of theirs, so they read
+    their own writes, including buffered search history.
+    """
+    
+    STICKY_KEY = 'db_sticky:{user_id}'
+    
+    def __init__(self, app):
+        config = app.config
+        self.app = app
+        self.binds = list(replica_binds(config.get('DATABASE_REPLICA_URLS', [])))
+        self.max_lag = config.get('REPLICA_MAX_LAG', 5.0)
+        self.sticky_seconds = config.get('REPLICA_STICKY_SECONDS', 15)
+        self.lag = {}  # bind key -> seconds behind the primary (inf when unreachable)
+        self.task = PeriodicTask(app, 'replica-lag', config.get('REPLICA_LAG_CHECK_INTERVAL', 5.0), self.check_lag)
+    
+    def check_lag(self):
+        """Measure every replica's replication lag."""
+        from app import db
+        lag = {}
+        for bind in self.binds:
+            engine = db.engines[bind]
+            try:
+                with engine.connect() as connection:
+                    if engine.dialect.name == 'postgresql':
+                        # An idle primary leaves the replay timestamp old, so caught-up replicas report 0
+                        lag[bind] = float(connection.execute(text(
+                            "SELECT CASE WHEN NOT pg_is_in_recovery() "
+                            "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                            "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+                        )).scalar())
+                    else:
+                        connection.execute(text("SELECT 1"))
+                        lag[bind] = 0.0
+            except Exception as e:
+                self.app.logger.warning(f"Replica {bind} lag check failed: {str(e)}")
+                lag[bind] = float('inf')
+        self.lag = lag
+        return lag
+    
+    def choose(self, user_id=None):
+        """Get the bind key of a replica to read from, or None for the primary."""
+        if not self.binds:
+            return None
+        if not self.lag:
+            self.check_lag()
+        
+        if user_id is not None:
+            try:
+                if get_cache_backend().get(self.STICKY_KEY.format(user_id=user_id)):
+                    return None
+            except CacheBackendError:
+                return None
+        
+        healthy = [bind for bind in self.binds if self.lag.get(bind, float('inf')) <= self.max_lag]
+        return random.choice(healthy) if healthy else None
+    
+    def record_write(self, user_id):
+        """Keep a user's reads on the primary until replicas have caught up with their write."""
+        if not self.binds or user_id is None:
+            return
+        try:
+            get_cache_backend().set(self.STICKY_KEY.format(user_id=user_id), str(time.time()),
+                                    ttl=self.sticky_seconds)
+        except CacheBackendError:
+            pass
+
+def _current_identity():
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        # No JWT was verified for this request
+        return None
+
+def read_only(view):
+    """Let a view's queries be served by a read replica (below @jwt_required so the user is known)."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        router = current_app.extensions.get('replica_router')
+        if router is not None:
+            g.db_replica = router.choose(_current_identity())
+        return view(*args, **kwargs)
+    return wrapper
+
+def record_user_write(response):
+    """after_request hook: make the user's next reads sticky to the primary after a write request."""
+    router = current_app.extensions.get('replica_router')
+    if router is not None and request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+        router.record_write(_current_identity())
+    return response
@@ -0,0 +1,66 @@
+import importlib
+import os
+import re
+import subprocess
+import sys
+
+# Heavy third-party modules imported on first use rather than at startup
+LAZY_MODULES = ('openai', 'google.auth', 'google.oauth2')
+
+IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+def preload_lazy_modules():
+    """Import the lazily loaded modules now (e.g. in a preforking master, to share them copy-on-write)."""
+    for name in LAZY_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+def profile_imports(config_name='testing', python=None):
+    """
+    Measure importing the app and running `create_app` in a fresh interpreter.
+    
+    Runs `python -X importtime` in a subprocess so nothing is already
+    imported, like a cold worker or CLI start.
+    
+    Returns:
+        dict with total_ms (wall time of the imports plus create_app),
+        modules (name, self_ms, cumulative_ms, depth in import order) and
+        eager_lazy_modules (LAZY_MODULES that were imported anyway)
+    
+    Raises:
+        RuntimeError: If the subprocess fails
+    """
+    code = (
+        "import time\n"
+        "start = time.perf_counter()\n"
+        "from app import create_app\n"
+        f"create_app({config_name!r})\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    result = subprocess.run(
+        [python or sys.executable, '-X', 'importtime', '-c', code],
+        cwd=root, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing the app failed:\n{result.stderr[-2000:]}")
+    
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            modules.append({
+                'name': match.group(4),
+                'self_ms': int(match.group(1)) / 1000,
+                'cumulative_ms': int(match.group(2)) / 1000,
+                'depth': (len(match.group(3)) - 1) // 2
+            })
+    
+    imported = {module['name'] for module in modules}
+    return {
+        'total_ms': float(result.stdout.strip().splitlines()[-1]) * 1000,
+        'modules': modules,
+        'eager_lazy_modules': [name for name in LAZY_MODULES if name in imported]
+    }
@@ -0,0 +1,114 @@
+import statistics
+import threading
+import time
+
+BENCHMARK_EMAIL = 'login-benchmark@example.com'
+BENCHMARK_PASSWORD = 'Benchmark-login-1'
+BENCHMARK_QUERY = 'login benchmark search'
+
+def run_login_benchmark(app, duration=10.0, login_threads=4, search_threads=8, workers=None):
+    """
+    Measure password logins per second while other threads keep searching.
+    
+    Login threads POST /api/auth/login for a benchmark user in a loop while
+    search threads POST /api/search for a query whose results are already
+    cached, all through the app's test client in this process (the threads
+    of one worker). The benchmark user is created first and deleted after.
+    
+    Args:
+        app: Application to run against (its database and cache backend are used)
+        duration: Seconds to run the load
+        login_threads: Threads logging in
+        search_threads: Threads searching
+        workers: PASSWORD_HASH_WORKERS for the run (0 hashes on the request threads;
+            None keeps the configured value)
+    
+    Returns:
+        dict with workers, iterations, logins, logins_per_second,
+        searches, searches_per_second, p50/p95 latencies in ms per kind and
+        errors (responses other than 200, by status code)
+    """
+    from flask_jwt_extended import create_access_token
+    
+    from app import db
+    from app.models.user import User
+    from app.services.password_hasher import PasswordHasher
+    from app.services.search_service import generate_cache_key
+    from app.utils.redis_helper import RedisHelper
+    
+    hasher = PasswordHasher(app)
+    if workers is not None:
+        hasher.workers = workers
+    configured_hasher = app.extensions['password_hasher']
+    app.extensions['password_hasher'] = hasher
+    
+    try:
+        with app.app_context():
+            hasher.warm()
+            user = User.query.filter_by(email=BENCHMARK_EMAIL).first()
+            if user is None:
+                user = User(email=BENCHMARK_EMAIL, password=BENCHMARK_PASSWORD, name='Login benchmark')
+                db.session.add(user)
+            else:
+                user.set_password(BENCHMARK_PASSWORD)
+            db.session.commit()
+            user_id = user.id
+            token = create_access_token(identity=user_id)
+            # Shaped like AIService's validated resources
+            results = [{'id': index + 1, 'name': f"Resource {index}", 'description': 'Cached benchmark result',
+                        'type': 'course', 'url': f"https://example.com/{index}", 'difficulty': 'beginner',
+                        'pricing': 'free', 'rating': 4.5, 'tags': ['benchmark'], 'popularity': 'medium'}
+                       for index in range(20)]
+            RedisHelper().cache_search_results(generate_cache_key(BENCHMARK_QUERY, {}), results)
+        
+        latencies = {'login': [], 'search': []}
+        errors = {}
+        record_lock = threading.Lock()
+        start = threading.Event()
+        deadline = [0.0]
+        
+        def run(kind):
+            client = app.test_client()
+            if kind == 'login':
+                request = lambda: client.post('/api/auth/login', json={
+                    'email': BENCHMARK_EMAIL, 'password': BENCHMARK_PASSWORD
+                })
+            else:
+                request = lambda: client.post('/api/search', json={'query': BENCHMARK_QUERY},
+                                              headers={'Authorization': f"Bearer {token}"})
+            start.wait()
+            while time.perf_counter() < deadline[0]:
+                began = time.perf_counter()
+                status = request().status_code
+                elapsed = (time.perf_counter() - began) * 1000
+                with record_lock:
+                    if status == 200:
+                        latencies[kind].append(elapsed)
+                    else:
+                        errors[status] = errors.get(status, 0) + 1
+        
+        threads = [threading.Thread(target=run, args=('login',)) for _ in range(login_threads)]
+        threads += [threading.Thread(target=run, args=('search',)) for _ in range(search_threads)]
+        for thread in threads:
+            thread.start()
+        began = time.perf_counter()
+        deadline[0] = began + duration
+        start.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+        
+        report = {'workers': hasher.workers, 'iterations': hasher.iterations, 'errors': errors}
+        for kind, count_key in (('login', 'logins'), ('search', 'searches')):
+            values = latencies[kind]
+            report[count_key] = len(values)
+            report[f"{count_key}_per_second"] = len(values) / elapsed
+            report[f"{kind}_p50_ms"] = statistics.median(values) if values else None
+            report[f"{kind}_p95_ms"] = statistics.quantiles(values, n=20)[-1] if len(values) > 1 else None
+        return report
+    finally:
+        app.extensions['password_hasher'] = configured_hasher
+        hasher.shutdown()
+        with app.app_context():
+            User.query.filter_by(email=BENCHMARK_EMAIL).delete()
+            db.session.commit()
@@ -0,0 +1,25 @@
+import base64
+import json
+from datetime import datetime
+
+def encode_cursor(timestamp, row_id):
+    """Encode a (timestamp, id) position as an opaque cursor string."""
+    payload = json.dumps([timestamp.isoformat(), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by `encode_cursor`.
+    
+    Returns:
+        tuple: (timestamp, id)
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception as e:
+        raise ValueError('Invalid cursor') from e
@@ -0,0 +1,190 @@
+import threading
+import time
+
+import redis
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+
+# Pool name -> PoolStats for every instrumented pool in this process
+_pool_stats = {}
+
+class PoolStats:
+    """Thread-safe counters for one connection pool."""
+    
+    def __init__(self, name, pool_size=None):
+        self.name = name
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.peak_overflow = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.overflow = None  # Callable returning current overflow, for QueuePool
+    
+    def waited(self, seconds, timed_out=False):
+        with self._lock:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.checkout_timeouts += 1
+    
+    def checked_out(self):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            if self.overflow is not None:
+                self.peak_overflow = max(self.peak_overflow, self.overflow())
+    
+    def checked_in(self):
+        with self._lock:
+            self.in_use = max(self.in_use - 1, 0)
+    
+    def connected(self):
+        with self._lock:
+            self.connects += 1
+    
+    def invalidated(self):
+        with self._lock:
+            self.invalidations += 1
+    
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pool_size': self.pool_size,
+                'checkouts': self.checkouts,
+                'checkout_wait_avg_ms': round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'checkout_wait_max_ms': round(self.wait_max * 1000, 3),
+                'checkout_timeouts': self.checkout_timeouts,
+                'in_use': self.in_use,
+                'peak_in_use': self.peak_in_use,
+                'overflow': max(self.overflow(), 0) if self.overflow is not None else None,
+                'peak_overflow': max(self.peak_overflow, 0),
+                'connects': self.connects,
+                'invalidations': self.invalidations
+            }
+
+def get_pool_stats():
+    """Snapshot of every instrumented pool in this worker process."""
+    return {name: stats.snapshot() for name, stats in _pool_stats.items()}
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a connection."""
+    
+    stats = None
+    
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            if self.stats:
+                self.stats.waited(time.perf_counter() - start, timed_out=True)
+            raise
+        if self.stats:
+            self.stats.waited(time.perf_counter() - start)
+        return connection
+    
+    def recreate(self):
+        # engine.dispose() replaces the pool; keep recording into the same stats
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+def engine_options(config, url):
+    """
+    SQLAlchemy engine options for a database URL from the DB_POOL_* settings.
+    
+    SQLite keeps Flask-SQLAlchemy's defaults. With DB_PGBOUNCER, connections
+    go through PgBouncer in transaction pooling mode, which does the pooling:
+    the app opens a connection per checkout (NullPool) and skips pre-ping.
+    Nothing here relies on session state across transactions (no session
+    SETs, advisory locks or LISTEN; server-side cursors live inside one
+    transaction), and psycopg2 does not use server-side prepared statements.
+    """
+    if make_url(url).get_backend_name() == 'sqlite':
+        return {}
+    if config.get('DB_PGBOUNCER'):
+        return {'poolclass': NullPool, 'pool_pre_ping': False}
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': config.get('DB_POOL_SIZE', 5),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': config.get('DB_POOL_PRE_PING', True)
+    }
+
+def instrument_engine(engine, name):
+    """Record checkouts, in-use connections, overflow and connection churn of an engine's pool."""
+    pool = engine.pool
+    stats = PoolStats(f"db:{name}", pool_size=pool.size() if isinstance(pool, QueuePool) else None)
+    if isinstance(pool, QueuePool):
+        stats.overflow = lambda: engine.pool.overflow()
+    if isinstance(pool, InstrumentedQueuePool):
+        pool.stats = stats
+    
+    event.listen(engine, 'connect', lambda dbapi_connection, record: stats.connected())
+    event.listen(engine, 'checkout', lambda dbapi_connection, record, proxy: stats.checked_out())
+    event.listen(engine, 'checkin', lambda dbapi_connection, record: stats.checked_in())
+    event.listen(engine, 'invalidate', lambda dbapi_connection, record, exception: stats.invalidated())
+    _pool_stats[stats.name] = stats
+    return stats
+
+class InstrumentedBlockingConnectionPool(redis.BlockingConnectionPool):
+    """
+    BlockingConnectionPool recording checkout waits, in-use connections and reconnects.
+    
+    Unlike the default ConnectionPool, which opens connections without
+    bound, it waits up to `timeout` seconds for a free connection and then
+    raises ConnectionError, so a saturated pool shows up as wait time.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        self.stats = PoolStats('redis', pool_size=kwargs.get('max_connections', 50))
+        kwargs['redis_connect_func'] = self._on_connect
+        super().__init__(*args, **kwargs)
+        _pool_stats[self.stats.name] = self.stats
+    
+    def _on_connect(self, connection):
+        self.stats.connected()
+        connection.on_connect()
+    
+    def get_connection(self, command_name, *keys, **options):
+        start = time.perf_counter()
+        try:
+            connection = super().get_connection(command_name, *keys, **options)
+        except redis.ConnectionError as e:
+            # The pool raises this exact error when no connection frees up within `timeout`
+            self.stats.waited(time.perf_counter() - start, timed_out=str(e) == 'No connection available.')
+            raise
+        self.stats.waited(time.perf_counter() - start)
+        self.stats.checked_out()
+        connection._instrumented_checkout = True
+        return connection
+    
+    def release(self, connection):
+        # Connections that failed to connect are released before they were counted
+        if getattr(connection, '_instrumented_checkout', False):
+            connection._instrumented_checkout = False
+            self.stats.checked_in()
+        super().release(connection)
+
+def redis_pool(config):
+    """Connection pool for REDIS_URL from the REDIS_* pool settings."""
+    return InstrumentedBlockingConnectionPool.from_url(
+        config['REDIS_URL'],
+        max_connections=config.get('REDIS_MAX_CONNECTIONS', 50),
+        timeout=config.get('REDIS_POOL_TIMEOUT', 5),
+        socket_timeout=config.get('REDIS_SOCKET_TIMEOUT'),
+        socket_connect_timeout=config.get('REDIS_SOCKET_CONNECT_TIMEOUT', 5),
+        socket_keepalive=True,
+        health_check_interval=config.get('REDIS_HEALTH_CHECK_INTERVAL', 30)
+    )
@@ -1,81 +1,154 @@
 import json
-import redis
+import time
 from flask import current_app
-from app import redis_client
+from app.utils.cache_backends import CacheBackendError, get_cache_backend
 
 class RedisHelper:
-    """Helper class for Redis operations."""
+    """Helper class for cache operations (Redis, in-memory or on-disk backend)."""
+    
+    PROVENANCES = ('ai', 'empty', 'parse_error', 'fallback')
     
     def __init__(self):
-        self.redis = redis_client
+        self.cache = get_cache_backend()
         self.cache_ttl = current_app.config.get('CACHE_TTL', 3600)  # 1 hour default
+        self.negative_cache_ttl = current_app.config.get('NEGATIVE_CACHE_TTL', 300)
+        self.fallback_cache_ttl = current_app.config.get('FALLBACK_CACHE_TTL', 60)
     
     def get_search_count(self, session_id):
         """Get search count for a session."""
         try:
             key = f"search_count:{session_id}"
-            count = self.redis.get(key)
+            count = self.cache.get(key)
             return int(count) if count else 0
-        except (redis.RedisError, ValueError):
+        except (CacheBackendError, ValueError):
             return 0
     
     def increment_search_count(self, session_id):
         """Increment search count for a session."""
         try:
             key = f"search_count:{session_id}"
-            pipe = self.redis.pipeline()
-            pipe.incr(key)
-            pipe.expire(key, 86400)  # Expire after 24 hours
-            pipe.execute()
-        except redis.RedisError:
+            self.cache.incr(key, ttl=86400)  # Expire after 24 hours
+        except CacheBackendError:
             current_app.logger.error(f"Failed to increment search count for session {session_id}")
     
     def reset_search_count(self, session_id):
         """Reset search count for a session."""
         try:
             key = f"search_count:{session_id}"
-            self.redis.delete(key)
-        except redis.RedisError:
+            self.cache.delete(key)
+        except CacheBackendError:
             current_app.logger.error(f"Failed to reset search count for session {session_id}")
     
-    def cache_search_results(self, cache_key, results):
-        """Cache search results."""
+    def cache_search_results(self, cache_key, results, provenance='ai'):
+        """
+        Cache search results together with their provenance.
+        
+        Real AI results live for CACHE_TTL, while empty/unparseable results
+        (negative cache) and fallback results get short TTLs so that real
+        results replace them quickly.
+        """
         try:
             key = f"search_cache:{cache_key}"
-            self.redis.setex(
-                key,
-                self.cache_ttl,
-                json.dumps(results)
-            )
-        except (redis.RedisError, TypeError):
+            entry = {
+                'results': results,
+                'provenance': provenance,
+                'cached_at': time.time()
+            }
+            self.cache.set(key, json.dumps(entry), ttl=self._ttl_for_provenance(provenance))
+        except (CacheBackendError, TypeError):
             current_app.logger.error(f"Failed to cache search results for key {cache_key}")
     
-    def get_cached_search(self, cache_key):
-        """Get cached search results."""
+    def get_cached_search(self, cache_key, record_lookup=True):
+        """
+        Get cached search entry.
+        
+        Returns:
+            dict with 'results' and 'provenance', or None on a miss
+        """
         try:
             key = f"search_cache:{cache_key}"
-            cached_data = self.redis.get(key)
+            cached_data = self.cache.get(key)
             if cached_data:
-                return json.loads(cached_data)
+                entry = json.loads(cached_data)
+                if isinstance(entry, list):
+                    # Entries written before provenance was recorded
+                    entry = {'results': entry, 'provenance': 'ai'}
+                if record_lookup:
+                    self.record_cache_lookup(entry.get('provenance', 'ai'))
+                return entry
+            if record_lookup:
+                self.record_cache_lookup(None)
             return None
-        except (redis.RedisError, json.JSONDecodeError):
+        except (CacheBackendError, json.JSONDecodeError):
             return None
     
+    def get_search_cache_ttl(self, cache_key):
+        """Get the remaining TTL of a cached search (-2 if not cached)."""
+        try:
+            return self.cache.ttl(f"search_cache:{cache_key}")
+        except CacheBackendError:
+            return -2
+    
+    def record_cache_lookup(self, provenance):
+        """Count a search cache hit per provenance (None counts a miss)."""
+        try:
+            field = f"hits:{provenance}" if provenance else "misses"
+            self.cache.incr(f"search_cache_stats:{field}")
+        except CacheBackendError:
+            pass
+    
+    def get_cache_stats(self):
+        """Get search cache hit counts per provenance and misses."""
+        stats = {}
+        try:
+            for provenance in self.PROVENANCES:
+                count = self.cache.get(f"search_cache_stats:hits:{provenance}")
+                stats[provenance] = int(count) if count else 0
+            misses = self.cache.get("search_cache_stats:misses")
+            stats['misses'] = int(misses) if misses else 0
+        except (CacheBackendError, ValueError):
+            pass
+        return stats
+    
+    def _ttl_for_provenance(self, provenance):
+        """Get the cache TTL for a result provenance."""
+        if provenance == 'fallback':
+            return self.fallback_cache_ttl
+        if provenance in ('empty', 'parse_error'):
+            return self.negative_cache_ttl
+        return self.cache_ttl
+    
     def blacklist_token(self, jti):
         """Blacklist a JWT token."""
         try:
             key = f"blacklist:{jti}"
             # Set expiration to match token expiration
-            self.redis.setex(key, 86400, "blacklisted")  # 24 hours
-        except redis.RedisError:
+            self.cache.set(key, "blacklisted", ttl=86400)  # 24 hours
+        except CacheBackendError:
             current_app.logger.error(f"Failed to blacklist token {jti}")
     
     def is_token_blacklisted(self, jti):
         """Check if a JWT token is blacklisted."""
         try:
             key = f"blacklist:{jti}"
-            return self.redis.exists(key)
-        except redis.RedisError:
+            return self.cache.exists(key)
+        except CacheBackendError:
+            return False
+    
+    def revoke_user_tokens(self, user_id, ttl):
+        """Revoke every token issued to a user up to now (for `ttl` seconds, the longest token lifetime)."""
+        try:
+            key = f"tokens_revoked_before:{user_id}"
+            self.cache.set(key, int(time.time()), ttl=ttl)
+        except CacheBackendError:
+            current_app.logger.error(f"Failed to revoke tokens for user {user_id}")
+    
+    def are_user_tokens_revoked(self, user_id, issued_at):
+        """Check if a token issued at `issued_at` (epoch seconds) was revoked with all of its user's tokens."""
+        try:
+            revoked_before = self.cache.get(f"tokens_revoked_before:{user_id}")
+            return revoked_before is not None and issued_at <= int(revoked_before)
+        except (CacheBackendError, ValueError):
             return False
     
     def set_user_session(self, user_id, session_data, ttl=None):
@@ -83,60 +156,52 @@ class RedisHelper:
         try:
             key = f"user_session:{user_id}"
             ttl = ttl or self.cache_ttl
-            self.redis.setex(
-                key,
-                ttl,
-                json.dumps(session_data)
-            )
-        except (redis.RedisError, TypeError):
+            self.cache.set(key, json.dumps(session_data), ttl=ttl)
+        except (CacheBackendError, TypeError):
             current_app.logger.error(f"Failed to set session for user {user_id}")
     
     def get_user_session(self, user_id):
         """Get user session data."""
         try:
             key = f"user_session:{user_id}"
-            session_data = self.redis.get(key)
+            session_data = self.cache.get(key)
             if session_data:
                 return json.loads(session_data)
             return None
-        except (redis.RedisError, json.JSONDecodeError):
+        except (CacheBackendError, json.JSONDecodeError):
             return None
     
     def delete_user_session(self, user_id):
         """Delete user session data."""
         try:
             key = f"user_session:{user_id}"
-            self.redis.delete(key)
-        except redis.RedisError:
+            self.cache.delete(key)
+        except CacheBackendError:
             current_app.logger.error(f"Failed to delete session for user {user_id}")
     
     def cache_popular_searches(self, searches):
         """Cache popular search terms."""
         try:
             key = "popular_searches"
-            self.redis.setex(
-                key,
-                self.cache_ttl,
-                json.dumps(searches)
-            )
-        except (redis.RedisError, TypeError):
+            self.cache.set(key, json.dumps(searches), ttl=self.cache_ttl)
+        except (CacheBackendError, TypeError):
             current_app.logger.error("Failed to cache popular searches")
     
     def get_popular_searches(self):
         """Get cached popular search terms."""
         try:
             key = "popular_searches"
-            cached_data = self.redis.get(key)
+            cached_data = self.cache.get(key)
             if cached_data:
                 return json.loads(cached_data)
             return []
-        except (redis.RedisError, json.JSONDecodeError):
+        except (CacheBackendError, json.JSONDecodeError):
             return []
     
     def health_check(self):
         """Check Redis connection health."""
         try:
-            self.redis.ping()
+            self.cache.ping()
             return True
-        except redis.RedisError:
+        except CacheBackendError:
             return False 
\ No newline at end of file
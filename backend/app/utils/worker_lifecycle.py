@@ -0,0 +1,94 @@
+from sqlalchemy import text
+
+def reset_after_fork(app):
+    """
+    Drop connections inherited from a preloading master.
+    
+    Pooled SQLAlchemy connections must not be shared across processes; they
+    are discarded without closing the parent's sockets. The Redis pool
+    resets itself when it notices the PID changed.
+    """
+    from app import db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+def warm_up(app):
+    """
+    Prepare a freshly forked worker before it accepts requests.
+    
+    Opens WORKER_WARMUP_DB_CONNECTIONS pooled connections per database
+    engine and one Redis connection, measures replica lag, starts the
+    password hashing processes, fetches Google's signing certs (when Google
+    login is configured), loads the in-process autocomplete index and starts
+    the background tasks, so the first requests don't pay for connection
+    setup or cold caches.
+    """
+    from app import db, redis_client
+    with app.app_context():
+        for key, engine in db.engines.items():
+            connections = []
+            try:
+                for _ in range(app.config.get('WORKER_WARMUP_DB_CONNECTIONS', 2)):
+                    connection = engine.connect()
+                    connections.append(connection)
+                    connection.execute(text("SELECT 1"))
+            except Exception as e:
+                app.logger.warning(f"Database warm-up failed for {key or 'primary'}: {str(e)}")
+            finally:
+                for connection in connections:
+                    connection.close()
+        
+        try:
+            redis_client.ping()
+        except Exception as e:
+            app.logger.warning(f"Redis warm-up failed: {str(e)}")
+        
+        router = app.extensions.get('replica_router')
+        if router is not None and router.binds:
+            router.check_lag()
+        
+        try:
+            app.extensions['password_hasher'].warm()
+        except Exception as e:
+            app.logger.warning(f"Password hasher warm-up failed: {str(e)}")
+        
+        if app.config.get('GOOGLE_CLIENT_ID'):
+            try:
+                app.extensions['google_verifier'].get_certs()
+            except Exception as e:
+                app.logger.warning(f"Google certs warm-up failed: {str(e)}")
+        
+        try:
+            app.extensions['autocomplete'].refresh()
+        except Exception as e:
+            app.logger.warning(f"Autocomplete warm-up failed: {str(e)}")
+        
+        for task in app.extensions['background_tasks'].values():
+            task.ensure_started()
+
+def drain(app, timeout):
+    """
+    Finish a worker's outstanding work before it exits.
+    
+    Waits up to `timeout` seconds for in-flight OpenAI calls (request
+    threads are already drained by the server; this covers background work
+    such as cache warm-up), stops the background tasks, flushes buffered
+    search history and stops the password hashing processes.
+    """
+    from app import db
+    from app.services.ai_service import in_flight_calls
+    
+    if not in_flight_calls.wait_idle(timeout):
+        app.logger.warning(f"Exiting with {in_flight_calls.count} OpenAI calls still in flight")
+    
+    tasks = app.extensions['background_tasks']
+    for name, task in tasks.items():
+        if name != 'history_writer':
+            task.stop(timeout)
+    app.extensions['history_writer'].shutdown(timeout)
+    app.extensions['password_hasher'].shutdown()
+    
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
@@ -0,0 +1,65 @@
+"""
+Gunicorn configuration for the Sankat Mochan API.
+
+The app is created once in the master (preload_app) so the heavy imports
+(openai, google.auth, SQLAlchemy models) are shared copy-on-write by the
+workers; each worker then drops the inherited connections, warms its own
+pools and caches, and drains in-flight work on shutdown.
+
+    gunicorn -c gunicorn.conf.py
+"""
+
+import multiprocessing
+import os
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')  # 'gthread' or 'gevent'
+
+if worker_class == 'gevent':
+    # Patch before the preloaded app creates locks, sockets and threads
+    from gevent import monkey
+    monkey.patch_all()
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+preload_app = True
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))  # gthread only
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 200))  # gevent only
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 0))
+
+# In-flight requests may wait on OpenAI for up to OPENAI_REQUEST_TIMEOUT; worker_exit
+# then gets DRAIN_TIMEOUT for background calls and the history flush
+DRAIN_TIMEOUT = 10
+graceful_timeout = int(os.environ.get('OPENAI_REQUEST_TIMEOUT', 60)) + DRAIN_TIMEOUT + 5
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+def post_fork(server, worker):
+    from wsgi import app
+    from app.utils.worker_lifecycle import reset_after_fork
+    
+    if worker_class == 'gevent':
+        try:
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()
+        except ImportError:
+            server.log.warning('psycogreen is not installed; database calls will block gevent workers')
+    reset_after_fork(app)
+
+def post_worker_init(worker):
+    from wsgi import app
+    from app.utils.worker_lifecycle import warm_up
+    
+    warm_up(app)
+    worker.log.info(f"Worker {worker.pid} warmed up")
+
+def worker_exit(server, worker):
+    from wsgi import app
+    from app.utils.worker_lifecycle import drain
+    
+    drain(app, timeout=DRAIN_TIMEOUT)
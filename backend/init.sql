@@ -5,6 +5,7 @@
 
 -- Create extensions
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 -- Users table
 CREATE TABLE IF NOT EXISTS users (
@@ -18,17 +19,71 @@ CREATE TABLE IF NOT EXISTS users (
     is_verified BOOLEAN DEFAULT FALSE NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
-    last_login TIMESTAMP
+    last_login TIMESTAMP,
+    search_count INTEGER DEFAULT 0 NOT NULL,
+    favorites_count INTEGER DEFAULT 0 NOT NULL,
+    last_search_at TIMESTAMP,
+    deletion_requested_at TIMESTAMP,
+    deletion_id VARCHAR(32) UNIQUE
 );
 
--- Search history table
+-- Search results stored once per distinct content (sha256 of canonical JSON)
+CREATE TABLE IF NOT EXISTS search_result_blobs (
+    hash VARCHAR(64) PRIMARY KEY,
+    data BYTEA NOT NULL,
+    compression VARCHAR(10) DEFAULT 'none' NOT NULL,
+    size INTEGER NOT NULL,
+    refcount INTEGER DEFAULT 0 NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+-- Search history table, range partitioned by month on created_at.
+-- Monthly partitions are created ahead of time and archived by the app
+-- (HistoryPartitionManager); the default partition only catches stragglers.
 CREATE TABLE IF NOT EXISTS search_history (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
     query TEXT NOT NULL,
     filters JSONB DEFAULT '{}',
-    results_count INTEGER DEFAULT 0,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
+    results JSONB,
+    results_hash VARCHAR(64) REFERENCES search_result_blobs(hash),
+    result_count INTEGER DEFAULT 0,
+    search_type VARCHAR(50) DEFAULT 'ai_powered',
+    execution_time DOUBLE PRECISION,
+    session_id VARCHAR(100),
+    ip_address VARCHAR(45),
+    is_favorite BOOLEAN DEFAULT FALSE,
+    dedupe_key VARCHAR(64),
+    run_count INTEGER DEFAULT 1 NOT NULL,
+    last_run_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    search_vector TSVECTOR GENERATED ALWAYS AS (to_tsvector('simple', query)) STORED,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS search_history_default PARTITION OF search_history DEFAULT;
+
+DO $$
+DECLARE
+    month_start DATE := date_trunc('month', CURRENT_DATE);
+BEGIN
+    FOR i IN 0..3 LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF search_history FOR VALUES FROM (%L) TO (%L)',
+            'search_history_p' || to_char(month_start + make_interval(months => i), 'YYYY_MM'),
+            month_start + make_interval(months => i),
+            month_start + make_interval(months => i + 1)
+        );
+    END LOOP;
+END $$;
+
+-- Per-user search statistics rollup
+CREATE TABLE IF NOT EXISTS user_search_stats (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    daily_counts JSON NOT NULL DEFAULT '{}',
+    type_counts JSON NOT NULL DEFAULT '{}',
+    top_queries JSON NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
 );
 
 -- Resources table (for storing AI tools, courses, etc.)
@@ -61,7 +116,17 @@ CREATE TABLE IF NOT EXISTS user_favorites (
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 CREATE INDEX IF NOT EXISTS idx_users_google_id ON users(google_id);
-CREATE INDEX IF NOT EXISTS idx_search_history_user_id ON search_history(user_id);
+CREATE INDEX IF NOT EXISTS ix_search_history_user_created ON search_history(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_search_history_user_favorites ON search_history(user_id, created_at DESC, id DESC) WHERE is_favorite;
+-- History ordered by when a search last ran (HISTORY_DEDUPE)
+CREATE INDEX IF NOT EXISTS ix_search_history_user_last_run ON search_history(user_id, COALESCE(last_run_at, created_at) DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_search_history_user_favorites_last_run ON search_history(user_id, COALESCE(last_run_at, created_at) DESC, id DESC) WHERE is_favorite;
+-- History search (?q=): word prefixes via the tsvector, typos via trigrams
+CREATE INDEX IF NOT EXISTS ix_search_history_search_vector ON search_history USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS ix_search_history_query_trgm ON search_history USING GIN (query gin_trgm_ops);
+-- Not unique: a unique index on a partitioned table must include created_at
+CREATE INDEX IF NOT EXISTS ux_search_history_dedupe ON search_history(user_id, dedupe_key) WHERE dedupe_key IS NOT NULL;
+CREATE INDEX IF NOT EXISTS ix_search_history_results_hash ON search_history(results_hash);
 CREATE INDEX IF NOT EXISTS idx_search_history_created_at ON search_history(created_at);
 CREATE INDEX IF NOT EXISTS idx_resources_type ON resources(type);
 CREATE INDEX IF NOT EXISTS idx_resources_category ON resources(category);
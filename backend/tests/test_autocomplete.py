@@ -0,0 +1,33 @@
+"""Autocomplete popularity from searches and their results."""
+import pytest
+
+from app import create_app
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+
+def test_resource_names_are_suggested(app):
+    from app.services.ai_service import AIService
+    from app.services.autocomplete import get_autocomplete
+    
+    resources = AIService()._get_fallback_results('learn to code')
+    autocomplete = get_autocomplete()
+    autocomplete.record_resources(resources)
+    autocomplete.refresh()
+    
+    name = resources[0]['name'].lower()
+    assert name in [suggestion['text'] for suggestion in autocomplete.suggest(name[:4])]
+
+def test_queries_rank_above_resource_names(app):
+    from app.services.autocomplete import get_autocomplete
+    
+    autocomplete = get_autocomplete()
+    autocomplete.record_resources([{'name': 'Python Crash Course'}])
+    autocomplete.record_query('Python  decorators')
+    autocomplete.refresh()
+    
+    assert [suggestion['text'] for suggestion in autocomplete.suggest('pyth')][:2] == \
+        ['python decorators', 'python crash course']
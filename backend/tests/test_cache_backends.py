@@ -0,0 +1,180 @@
+"""Shared behaviour tests run against every cache backend."""
+import threading
+import time
+
+import pytest
+
+from app.utils import cache_backends
+from app.utils.cache_backends import MemoryBackend, RedisBackend, SQLiteBackend
+
+BACKENDS = ('redis', 'memory', 'sqlite')
+
+class FakeClock:
+    """Stands in for the `time` module inside cache_backends so TTLs expire without sleeping."""
+    
+    def __init__(self):
+        self.now = time.time()
+    
+    def time(self):
+        return self.now
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, tmp_path):
+    if request.param == 'redis':
+        fakeredis = pytest.importorskip('fakeredis')
+        return RedisBackend(fakeredis.FakeRedis())
+    if request.param == 'memory':
+        return MemoryBackend(max_entries=10)
+    return SQLiteBackend(str(tmp_path / 'cache.sqlite3'), max_entries=10)
+
+@pytest.fixture
+def advance(backend, monkeypatch):
+    """Move a backend's clock forward by some seconds."""
+    if isinstance(backend, RedisBackend):
+        # fakeredis expires keys on the wall clock
+        return time.sleep
+    
+    clock = FakeClock()
+    monkeypatch.setattr(cache_backends, 'time', clock)
+    
+    def advance(seconds):
+        clock.now += seconds
+    return advance
+
+def test_get_set_delete(backend):
+    assert backend.get('missing') is None
+    backend.set('key', 'value')
+    assert backend.get('key') == 'value'
+    assert backend.exists('key')
+    backend.delete('key')
+    assert backend.get('key') is None
+    assert not backend.exists('key')
+
+def test_values_are_strings(backend):
+    backend.set('number', 42)
+    assert backend.get('number') == '42'
+
+def test_ttl_expiry(backend, advance):
+    backend.set('short', 'value', ttl=1)
+    backend.set('forever', 'value')
+    assert backend.ttl('short') in (0, 1)
+    assert backend.ttl('forever') == -1
+    assert backend.ttl('missing') == -2
+    
+    advance(1.1)
+    assert backend.get('short') is None
+    assert backend.ttl('short') == -2
+    assert backend.get('forever') == 'value'
+
+def test_add_only_sets_missing_keys(backend):
+    assert backend.add('lock', 'first', ttl=30)
+    assert not backend.add('lock', 'second', ttl=30)
+    assert backend.get('lock') == 'first'
+    backend.delete('lock')
+    assert backend.add('lock', 'third')
+
+def test_add_replaces_expired_key(backend, advance):
+    assert backend.add('lock', 'first', ttl=1)
+    advance(1.1)
+    assert backend.add('lock', 'second', ttl=30)
+    assert backend.get('lock') == 'second'
+
+def test_incr(backend):
+    assert backend.incr('counter') == 1
+    assert backend.incr('counter', 5) == 6
+    assert backend.get('counter') == '6'
+
+def test_incr_sets_and_keeps_ttl(backend, advance):
+    backend.incr('window', ttl=1)
+    backend.incr('window')
+    assert backend.ttl('window') in (0, 1)
+    advance(1.1)
+    assert backend.incr('window') == 1
+
+def test_incr_is_atomic_across_threads(backend):
+    threads_count, increments = 8, 50
+    
+    def work():
+        for _ in range(increments):
+            backend.incr('shared')
+    
+    threads = [threading.Thread(target=work) for _ in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert backend.get('shared') == str(threads_count * increments)
+
+def test_size_bounded_eviction(backend):
+    if isinstance(backend, RedisBackend):
+        pytest.skip("Redis evicts through the server's maxmemory policy")
+    if isinstance(backend, SQLiteBackend):
+        backend.EVICTION_CHECK_INTERVAL = 1
+    
+    for index in range(15):
+        backend.set(f"key:{index}", index)
+        if isinstance(backend, SQLiteBackend):
+            # updated_at orders the SQLite eviction; keep writes distinguishable
+            time.sleep(0.002)
+    
+    assert backend.get('key:0') is None
+    assert backend.get('key:4') is None
+    assert backend.get('key:5') == '5'
+    assert backend.get('key:14') == '14'
+
+def test_memory_eviction_is_least_recently_used():
+    backend = MemoryBackend(max_entries=3)
+    for key in ('a', 'b', 'c'):
+        backend.set(key, key)
+    backend.get('a')
+    backend.set('d', 'd')
+    assert backend.get('b') is None
+    assert backend.get('a') == 'a'
+
+def test_zset_ranking(backend):
+    backend.zincrby('trending', 1, 'python')
+    backend.zincrby('trending', 3, 'rust')
+    assert backend.zincrby('trending', 1.5, 'python') == 2.5
+    backend.zincrby('trending', 0.5, 'go')
+    
+    assert backend.zcard('trending') == 3
+    assert backend.zrevrange('trending', 0, -1) == [('rust', 3.0), ('python', 2.5), ('go', 0.5)]
+    assert backend.zrevrange('trending', 0, 1) == [('rust', 3.0), ('python', 2.5)]
+    assert backend.zrevrange('trending', 1, 1) == [('python', 2.5)]
+    assert backend.zrevrange('missing', 0, -1) == []
+
+def test_zremrangebyrank_trims_lowest_scores(backend):
+    for score, member in enumerate(('a', 'b', 'c', 'd', 'e'), start=1):
+        backend.zincrby('scores', score, member)
+    
+    # Keep the top 3, as TrendingTracker does
+    assert backend.zremrangebyrank('scores', 0, -4) == 2
+    assert [member for member, _ in backend.zrevrange('scores', 0, -1)] == ['e', 'd', 'c']
+    assert backend.zremrangebyrank('scores', 0, -4) == 0
+    assert backend.zcard('scores') == 3
+
+def test_zset_ttl(backend, advance):
+    backend.zincrby('window', 1, 'python', ttl=1)
+    assert backend.zcard('window') == 1
+    advance(1.1)
+    assert backend.zcard('window') == 0
+    assert backend.zrevrange('window', 0, -1) == []
+
+def test_delete_removes_zsets(backend):
+    backend.zincrby('trending', 1, 'python')
+    backend.delete('trending')
+    assert backend.zcard('trending') == 0
+
+def test_zincrby_many(backend, advance):
+    backend.zincrby('trending', 1, 'python')
+    backend.zincrby_many([
+        ('trending', 2, 'python', None),
+        ('trending', 1, 'rust', None),
+        ('window', 1, 'python', 1),
+    ])
+    assert backend.zrevrange('trending', 0, -1) == [('python', 3.0), ('rust', 1.0)]
+    assert backend.zcard('window') == 1
+    advance(1.1)
+    assert backend.zcard('window') == 0
+    
+    backend.zincrby_many([])
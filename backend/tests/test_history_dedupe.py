@@ -0,0 +1,75 @@
+"""Compacting repeated searches into one history row."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import create_app, db
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        import app.models
+        db.create_all()
+        yield app
+        db.session.remove()
+
+def _insert(user_id, runs):
+    """Insert history rows of (query, results, as_blob) runs a minute apart."""
+    from app.models.search_history import SearchHistory
+    from app.services.result_blobs import ResultBlobStore
+    
+    start = datetime(2024, 3, 1)
+    for minute, (query, results, as_blob) in enumerate(runs):
+        row = {'user_id': user_id, 'query': query, 'filters': {}, 'results': results,
+               'result_count': len(results), 'execution_time': float(minute),
+               'created_at': start + timedelta(minutes=minute)}
+        if as_blob:
+            ResultBlobStore().store_rows([row])
+        db.session.execute(SearchHistory.__table__.insert(), [row])
+    db.session.commit()
+
+def _history(user_id):
+    from app.models.search_history import SearchHistory
+    
+    db.session.expire_all()
+    return {row.query: row for row in db.session.query(SearchHistory).filter_by(user_id=user_id)}
+
+def test_compact_merges_inline_and_blob_results(app):
+    from app.models.search_result_blob import SearchResultBlob
+    from app.models.user import User
+    from app.services.history_dedupe import HistoryDeduper
+    
+    user = User(email='dedupe@example.com')
+    db.session.add(user)
+    db.session.commit()
+    _insert(user.id, [
+        # Inline first run, blob latest run
+        ('python', [{'name': 'old'}], False),
+        ('Python', [{'name': 'new'}, {'name': 'newer'}], True),
+        # Blob first run, inline latest run
+        ('rust', [{'name': 'old'}, {'name': 'older'}], True),
+        ('rust ', [{'name': 'new'}], False),
+        # A single inline row is only keyed
+        ('go', [{'name': 'go'}], False),
+    ])
+    
+    report = HistoryDeduper().compact()
+    assert report == {'users': 1, 'rows_keyed': 3, 'rows_removed': 2}
+    
+    history = _history(user.id)
+    python, rust, go = history['python'], history['rust'], history['go']
+    
+    assert python.results == [{'name': 'new'}, {'name': 'newer'}]
+    assert python.results_hash is not None and python.results_inline is None
+    assert (python.run_count, python.result_count, python.execution_time) == (2, 2, 1.0)
+    
+    assert rust.results == [{'name': 'new'}]
+    assert rust.results_hash is None
+    assert (rust.run_count, rust.result_count, rust.execution_time) == (2, 1, 3.0)
+    
+    assert go.results == [{'name': 'go'}] and go.dedupe_key is not None
+    
+    # The replaced blob lost its only reference
+    refcounts = {blob.get_results()[0]['name']: blob.refcount for blob in db.session.query(SearchResultBlob)}
+    assert refcounts == {'new': 1, 'old': 0}
@@ -0,0 +1,15 @@
+"""Startup cost of importing the app and running create_app."""
+from app.utils.import_profile import profile_imports
+from config import Config
+
+def test_create_app_within_import_budget():
+    report = profile_imports('testing')
+    slowest = sorted((module for module in report['modules'] if module['depth'] == 0),
+                     key=lambda module: -module['cumulative_ms'])[:10]
+    summary = ', '.join(f"{module['name']} {module['cumulative_ms']:.0f} ms" for module in slowest)
+    
+    assert report['total_ms'] <= Config.IMPORT_TIME_BUDGET_MS, \
+        f"create_app took {report['total_ms']:.0f} ms (budget {Config.IMPORT_TIME_BUDGET_MS} ms): {summary}"
+
+def test_heavy_modules_stay_lazy():
+    assert profile_imports('testing')['eager_lazy_modules'] == []
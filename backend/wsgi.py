@@ -0,0 +1,13 @@
+"""
+Sankat Mochan - AI Resource Discovery Platform
+WSGI entry point for production servers: gunicorn -c gunicorn.conf.py
+"""
+
+import os
+from app import create_app
+from app.utils.import_profile import preload_lazy_modules
+
+app = create_app(os.getenv('FLASK_CONFIG', 'production'))
+
+# Workers would import these on first use; with preload_app they are shared copy-on-write instead
+preload_lazy_modules()